@@ -1,15 +1,181 @@
+import argparse
+import os
+import random
 import sys
+import time
+from pathlib import Path
+from typing import Optional
 
 from rich.panel import Panel
 from rich.text import Text
 
-from src.handler.game_handler import ResistanceCoupGameHandler
-from src.utils.print import console, print_blank, print_confirm, print_text
+from src import CHECKPOINT_PATH, clear_player_notes
+from src.handler.checkpoint import CheckpointError, load_checkpoint, save_checkpoint
+from src.handler.game_handler import ResistanceCoupGameHandler, generate_player_names
+from src.handler.simulation import (
+    generate_summary_table,
+    run_headless_games,
+    run_vectorized_games,
+)
+from src.handler.tournament import run_tournament
+from src.utils.print import console, print_blank, print_confirm, print_table, print_text
+from src.utils.replay import SEED_RANGE
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="The Resistance: Coup")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Play bot-vs-bot games without any console output and print a summary at the end",
+    )
+    parser.add_argument(
+        "--games", type=int, default=1000, help="Number of games to play in headless mode"
+    )
+    parser.add_argument("--players", type=int, default=4, help="Number of players per game")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes for headless games (0 to use every core)",
+    )
+    parser.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="Play headless games with random bots on the vectorized NumPy engine",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Seed for reproducible headless games"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Host games for remote players over WebSocket and HTTP instead of playing one",
+    )
+    parser.add_argument(
+        "--port", type=int, default=None, help="Port to serve games on (8765 by default)"
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        default=None,
+        help="Write every headless game to a binary replay file (single worker only)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        type=Path,
+        default=CHECKPOINT_PATH,
+        help="Save the game to this file after every turn, to resume it if the game is interrupted",
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record-llm",
+        metavar="PATH",
+        type=Path,
+        default=None,
+        help="Play one game and record every LLM response it gets to a cassette file",
+    )
+    cassette.add_argument(
+        "--replay-llm",
+        metavar="PATH",
+        type=Path,
+        default=None,
+        help="Play a recorded game again offline, with the LLM responses from its cassette",
+    )
+
+    args = parser.parse_args()
+    if args.seed is not None and args.seed not in SEED_RANGE:
+        parser.error(f"--seed must be between {SEED_RANGE.start} and {SEED_RANGE.stop - 1}")
+    if args.replay and (args.vectorized or args.workers != 1):
+        parser.error("--replay is only supported for headless games with a single worker")
+
+    return args
+
+
+def headless(
+    number_of_games: int,
+    number_of_players: int,
+    workers: int,
+    seed: Optional[int],
+    vectorized: bool,
+    replay_path: Optional[str],
+):
+    if vectorized:
+        summary = run_vectorized_games(number_of_games, number_of_players, seed=seed)
+    elif replay_path:
+        summary = run_headless_games(
+            number_of_games, number_of_players, seed=seed, replay_path=replay_path
+        )
+    else:
+        summary = run_tournament(number_of_games, number_of_players, seed=seed, workers=workers)
+    print_table(generate_summary_table(summary))
+
+
+def resume_game(handler: ResistanceCoupGameHandler, checkpoint_path: Path) -> bool:
+    """Load the game that was interrupted, if there is one and the player wants to carry on"""
+    if not checkpoint_path.exists() or not print_confirm("Resume the interrupted game?"):
+        return False
+
+    try:
+        return load_checkpoint(handler, checkpoint_path)
+    except CheckpointError as error:
+        print_text(f"Could not resume the game: {error}")
+        return False
+
+
+def play_game(handler: ResistanceCoupGameHandler, checkpoint_path: Optional[Path]) -> None:
+    """Take turns until we have a winner, checkpointing the game before every turn"""
+    end_state = False
+    while not end_state:
+        if checkpoint_path is not None:
+            save_checkpoint(handler, checkpoint_path)
+        handler.print_game_state()
+
+        console.print()
+        panel = Panel(Text(f"Turn {handler.turns}", style="bold", justify="left"), expand=False)
+        console.print(panel)
+
+        end_state = handler.handle_turn()
+        print_text(f"==========Round history: {handler._round_history}=========")
+
+    if checkpoint_path is not None:
+        checkpoint_path.unlink(missing_ok=True)
 
-console.clear()
 
+def play_cassette(path: Path, record: bool) -> None:
+    """Play one game while recording its LLM responses to a cassette, or replay one"""
+    from src.models.players.gpt.cassette import Cassette, use_cassette
+
+    if record:
+        cassette = Cassette.record(path, random.randrange(2**32), generate_player_names(4))
+    else:
+        cassette = Cassette.load(path)
+
+    # Answers from the response cache would never reach the cassette
+    os.environ["LLM_CACHE_PATH"] = ""
+    clear_player_notes()
+    handler = ResistanceCoupGameHandler(
+        len(cassette.player_names), seed=cassette.seed, player_names=cassette.player_names
+    )
+
+    start = time.perf_counter()
+    with use_cassette(cassette):
+        handler.setup_game()
+        play_game(handler, None)
+        # Polls still running would ask for responses once the cassette is closed
+        handler.close()
+
+    print_blank()
+    print_text(
+        f"{cassette.requests} LLM responses {'recorded' if record else 'replayed'} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
+def main(checkpoint_path: Path):
+    console.clear()
 
-def main():
     text = Text(
         """
         In the not too distant future, the government is run for profit by a new 'royal class' of multinational CEOs.
@@ -40,40 +206,49 @@ def main():
 
     console.print()
     handler = ResistanceCoupGameHandler(4)
+    resumed = resume_game(handler, checkpoint_path)
+    if not resumed:
+        clear_player_notes()
 
     console.print()
     console.print("Starting game...")
     game_ready = True
 
     # Play the game
-    while game_ready:
-        handler.setup_game()
-
-        # Take turns until we have a winner
-        end_state = False
-        turn_count = 1
-        while not end_state:
-            handler.print_game_state()
+    with handler:
+        while game_ready:
+            if not resumed:
+                handler.setup_game()
+            resumed = False
+            play_game(handler, checkpoint_path)
 
             console.print()
-            panel = Panel(Text(f"Turn {turn_count}", style="bold", justify="left"), expand=False)
-            console.print(panel)
-
-            end_state = handler.handle_turn()
-            print_text(f"==========Round history: {handler._round_history}=========")
-
-            turn_count += 1
-
-        console.print()
-        game_ready = print_confirm("Want to play again?")
+            game_ready = print_confirm("Want to play again?")
 
     print_blank()
     print_text("GAME OVER", rainbow=True)
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    # The server and the GPT players' modules are only imported when they're used, autogen is
+    # slow to import and bot games don't need it
+    if args.serve:
+        from src.server.server import DEFAULT_PORT, GameServer, serve
+
+        serve(GameServer(port=DEFAULT_PORT if args.port is None else args.port, seed=args.seed))
+        sys.exit(0)
+
+    if args.headless:
+        headless(args.games, args.players, args.workers, args.seed, args.vectorized, args.replay)
+        sys.exit(0)
+
+    if args.record_llm or args.replay_llm:
+        play_cassette(args.record_llm or args.replay_llm, record=args.record_llm is not None)
+        sys.exit(0)
+
     try:
-        main()
+        main(args.checkpoint)
     except KeyboardInterrupt:
         print_blank()
         print_text("GAME OVER", rainbow=True)
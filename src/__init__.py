@@ -7,11 +7,14 @@ load_dotenv()
 
 SRC_DIR = Path(__file__).parent
 PLAYER_NOTES_DIR = SRC_DIR.parent / "player_notes"
-
-# clear the player notes directory
-if PLAYER_NOTES_DIR.exists():
-    for file in PLAYER_NOTES_DIR.iterdir():
-        file.unlink()
-    PLAYER_NOTES_DIR.rmdir()
+# The game being played in the terminal, to resume it after a crash or Ctrl-C
+CHECKPOINT_PATH = SRC_DIR.parent / "coup_checkpoint.bin"
 
 PLAYER_NOTES_DIR.mkdir(exist_ok=True)
+
+
+def clear_player_notes() -> None:
+    """Delete the notes written during previous games. Only done when a new game starts, as a
+    resumed game carries on with its notes"""
+    for file in PLAYER_NOTES_DIR.glob("*_notes.txt"):
+        file.unlink()
@@ -0,0 +1,479 @@
+"""Monte Carlo counterfactual regret minimization over an abstracted Coup.
+
+Games are played on the compact engine, so the rules are the handler's, and every decision is
+mapped to an information set of a small abstraction of what the deciding player knows:
+
+    action:             hand, coin bucket, number of opponents, richest opponent's coin bucket
+    challenge:          hand, claimed action, whether we're the target, whether the claimant made
+                        the same claim before, the claimant's influence
+    counter:            hand, action, whether we're the target
+    counter challenge:  hand, countered action, whether we're the actor, whether the counterer
+                        made the same claim before, the counterer's influence
+    discard:            hand, coin bucket
+
+The coin buckets follow the thresholds of the rules (3 to assassinate, 7 to coup, 10 to have to
+coup), so the legal actions of an information set only differ by whether there's anyone to steal
+from. Targets are picked by a fixed rule (the opponent with the most cards, then the most coins)
+and exchanges are random, they aren't learned.
+
+Training is outcome sampling MCCFR: every episode samples a single game, exploring the moves of
+one traverser, and updates the regrets and average strategy of the traverser's information
+sets. The regrets and strategy sums are NumPy tables with one row per information set and one
+column per move slot (action code, PASS/ACCEPT or card code).
+
+    python -m src.engine.cfr --iterations 1000000 --workers 0 --checkpoint cfr.npz --export cfr.npy
+"""
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from enum import IntEnum
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.engine.compact import (
+    ASSASSINATE,
+    CLAIMED_CARD,
+    COUNTER_CARD,
+    EXCHANGE,
+    FOREIGN_AID,
+    NO_CARD,
+    NUMBER_OF_CARD_TYPES,
+    STEAL,
+    TAX,
+    CompactGame,
+    Phase,
+    decode_action,
+)
+from src.models.card import NUMBER_OF_HANDS, hand_index
+from src.models.legal_actions import ACCEPT
+
+# Coins 0-2, 3-6, 7-9 and 10+
+COIN_BUCKETS: Tuple[int, ...] = (0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 3)
+NUMBER_OF_COIN_BUCKETS = 4
+# 1, 2 or 3+ opponents
+MAX_OPPONENTS = 3
+
+MAX_SLOTS = 7
+
+# Games still going after this many turns are scored as shared
+MAX_TURNS = 200
+
+CHALLENGEABLE_ACTIONS: Tuple[int, ...] = (TAX, ASSASSINATE, STEAL, EXCHANGE)
+COUNTERABLE_ACTIONS: Tuple[int, ...] = (FOREIGN_AID, ASSASSINATE, STEAL)
+
+
+class Decision(IntEnum):
+    action = 0
+    challenge = 1
+    counter = 2
+    counter_challenge = 3
+    discard = 4
+
+
+# Number of information sets per decision type
+_SIZES = {
+    Decision.action: NUMBER_OF_HANDS * NUMBER_OF_COIN_BUCKETS**2 * MAX_OPPONENTS,
+    Decision.challenge: NUMBER_OF_HANDS * len(CHALLENGEABLE_ACTIONS) * 2 * 2 * 2,
+    Decision.counter: NUMBER_OF_HANDS * len(COUNTERABLE_ACTIONS) * 2,
+    Decision.counter_challenge: NUMBER_OF_HANDS * len(COUNTERABLE_ACTIONS) * 2 * 2 * 2,
+    Decision.discard: NUMBER_OF_HANDS * NUMBER_OF_COIN_BUCKETS,
+}
+_OFFSETS = {
+    decision: sum(_SIZES[earlier] for earlier in Decision if earlier < decision)
+    for decision in Decision
+}
+NUMBER_OF_INFORMATION_SETS = sum(_SIZES.values())
+
+
+def coin_bucket(coins: int) -> int:
+    return COIN_BUCKETS[min(coins, len(COIN_BUCKETS) - 1)]
+
+
+def action_information_set(
+    hand: Sequence[int], coins: int, opponents: int, richest_opponent_coins: int
+) -> int:
+    index = hand_index(hand)
+    index = index * NUMBER_OF_COIN_BUCKETS + coin_bucket(coins)
+    index = index * MAX_OPPONENTS + min(opponents, MAX_OPPONENTS) - 1
+    index = index * NUMBER_OF_COIN_BUCKETS + coin_bucket(richest_opponent_coins)
+    return _OFFSETS[Decision.action] + index
+
+
+def challenge_information_set(
+    hand: Sequence[int], action: int, is_target: bool, repeated_claim: bool, influence: int
+) -> int:
+    index = hand_index(hand) * len(CHALLENGEABLE_ACTIONS) + CHALLENGEABLE_ACTIONS.index(action)
+    index = (index * 2 + is_target) * 2 + repeated_claim
+    index = index * 2 + (influence > 1)
+    return _OFFSETS[Decision.challenge] + index
+
+
+def counter_information_set(hand: Sequence[int], action: int, is_target: bool) -> int:
+    index = hand_index(hand) * len(COUNTERABLE_ACTIONS) + COUNTERABLE_ACTIONS.index(action)
+    return _OFFSETS[Decision.counter] + index * 2 + is_target
+
+
+def counter_challenge_information_set(
+    hand: Sequence[int], action: int, is_actor: bool, repeated_claim: bool, influence: int
+) -> int:
+    index = hand_index(hand) * len(COUNTERABLE_ACTIONS) + COUNTERABLE_ACTIONS.index(action)
+    index = (index * 2 + is_actor) * 2 + repeated_claim
+    index = index * 2 + (influence > 1)
+    return _OFFSETS[Decision.counter_challenge] + index
+
+
+def discard_information_set(hand: Sequence[int], coins: int) -> int:
+    index = hand_index(hand) * NUMBER_OF_COIN_BUCKETS + coin_bucket(coins)
+    return _OFFSETS[Decision.discard] + index
+
+
+def pick_target(candidates: Sequence[Tuple[int, int, int]]) -> int:
+    """The target of an action among (seat, cards, coins) candidates: the opponent with the most
+    cards, then the most coins, then the first listed"""
+    return max(candidates, key=lambda candidate: (candidate[1], candidate[2]))[0]
+
+
+def regret_matching(regrets: np.ndarray) -> np.ndarray:
+    """The current strategy of an information set's legal moves"""
+    positive = np.maximum(regrets, 0.0)
+    total = positive.sum()
+    if total > 0.0:
+        return positive / total
+    return np.full(len(regrets), 1.0 / len(regrets))
+
+
+def _sample(probabilities: np.ndarray, rng: random.Random) -> int:
+    draw = rng.random()
+    for index, probability in enumerate(probabilities):
+        draw -= probability
+        if draw < 0.0:
+            return index
+    return len(probabilities) - 1
+
+
+def game_decision(
+    game: CompactGame, claims: List[int], moves: List[int]
+) -> Optional[Tuple[int, List[int], List[int]]]:
+    """Information set, move slots and moves of a decision of the compact engine. None for
+    decisions that aren't learned (exchanges)"""
+    seat = game.to_move
+    phase = game.phase
+    hand = game.hands[seat]
+
+    if phase == Phase.action:
+        opponents = game.other_active_seats(seat)
+        information_set = action_information_set(
+            hand,
+            game.coins[seat],
+            len(opponents),
+            max(game.coins[opponent] for opponent in opponents),
+        )
+
+        targets = {}
+        for move in moves:
+            action_code, target = decode_action(move)
+            targets.setdefault(action_code, []).append(target)
+
+        slots = sorted(targets)
+        chosen = []
+        for action_code in slots:
+            candidates = targets[action_code]
+            if len(candidates) > 1:
+                target = pick_target(
+                    [
+                        (candidate, len(game.hands[candidate]), game.coins[candidate])
+                        for candidate in candidates
+                    ]
+                )
+            else:
+                target = candidates[0]
+            chosen.append(action_code * 8 + target)
+        return information_set, slots, chosen
+
+    if phase == Phase.discard:
+        return discard_information_set(hand, game.coins[seat]), moves, moves
+
+    if phase == Phase.challenge:
+        claimant = game.current
+        information_set = challenge_information_set(
+            hand,
+            game.action,
+            game.target == seat,
+            claims[claimant * NUMBER_OF_CARD_TYPES + CLAIMED_CARD[game.action]] > 1,
+            len(game.hands[claimant]),
+        )
+    elif phase == Phase.counter:
+        information_set = counter_information_set(hand, game.action, game.target == seat)
+    elif phase == Phase.counter_challenge:
+        counterer = game.counterer
+        information_set = counter_challenge_information_set(
+            hand,
+            game.action,
+            game.current == seat,
+            claims[counterer * NUMBER_OF_CARD_TYPES + COUNTER_CARD[game.action]] > 1,
+            len(game.hands[counterer]),
+        )
+    else:
+        return None
+
+    return information_set, moves, moves
+
+
+def _record_claim(game: CompactGame, claims: List[int], move: int) -> None:
+    """Count the claims made by a move, before it's applied"""
+    seat = game.to_move
+    if game.phase == Phase.action:
+        card = CLAIMED_CARD[move >> 3]
+    elif game.phase == Phase.counter and move == ACCEPT:
+        card = COUNTER_CARD[game.action]
+    else:
+        return
+
+    if card != NO_CARD:
+        claims[seat * NUMBER_OF_CARD_TYPES + card] += 1
+
+
+def run_episode(
+    regrets: np.ndarray,
+    strategy_sums: np.ndarray,
+    number_of_players: int,
+    traverser: int,
+    rng: random.Random,
+    exploration: float = 0.6,
+) -> None:
+    """Sample a game and update the traverser's regrets and average strategy in place"""
+    game = CompactGame.new_game(number_of_players, rng)
+    claims = [0] * (number_of_players * NUMBER_OF_CARD_TYPES)
+
+    # (information set, slots, strategy, sampled index, sampling probability, own reach,
+    #  opponents' reach, sampling reach) of the traverser's decisions
+    path = []
+    tail = []
+    my_reach = opponents_reach = sample_reach = 1.0
+
+    while not game.is_over and game.turns < MAX_TURNS and game.active[traverser]:
+        moves = game.legal_moves()
+        decision = game_decision(game, claims, moves) if len(moves) > 1 else None
+        if decision is None:
+            game.apply(moves[rng.randrange(len(moves))], rng)
+            continue
+
+        information_set, slots, slot_moves = decision
+        if len(slots) == 1:
+            _record_claim(game, claims, slot_moves[0])
+            game.apply(slot_moves[0], rng)
+            continue
+
+        strategy = regret_matching(regrets[information_set, slots])
+        if game.to_move == traverser:
+            sampling = exploration / len(slots) + (1.0 - exploration) * strategy
+            index = _sample(sampling, rng)
+
+            # Opponents play on-policy, only the traverser's own sampling needs correcting in
+            # the value of the rest of the game after each earlier decision
+            correction = strategy[index] / sampling[index]
+            for position in range(len(tail)):
+                tail[position] *= correction
+
+            path.append(
+                (
+                    information_set,
+                    slots,
+                    strategy,
+                    index,
+                    sampling[index],
+                    my_reach,
+                    opponents_reach,
+                    sample_reach,
+                )
+            )
+            tail.append(1.0)
+            my_reach *= strategy[index]
+            sample_reach *= sampling[index]
+        else:
+            index = _sample(strategy, rng)
+            opponents_reach *= strategy[index]
+            sample_reach *= strategy[index]
+
+        _record_claim(game, claims, slot_moves[index])
+        game.apply(slot_moves[index], rng)
+
+    if game.is_over:
+        utility = 1.0 if game.winner == traverser else 0.0
+    elif game.active[traverser]:
+        utility = 1.0 / game.active.count(True)
+    else:
+        utility = 0.0
+
+    for (
+        information_set,
+        slots,
+        strategy,
+        index,
+        probability,
+        my_reach,
+        opponents_reach,
+        sample_reach,
+    ), tail_probability in zip(path, tail):
+        # Sampled value of playing the sampled move, and of playing the strategy
+        weight = utility * opponents_reach * tail_probability / (sample_reach * probability)
+        action_values = np.zeros(len(slots))
+        action_values[index] = weight
+        regrets[information_set, slots] += action_values - weight * strategy[index]
+        strategy_sums[information_set, slots] += my_reach * strategy / sample_reach
+
+
+class CFRTables:
+    """Regrets and strategy sums of every information set"""
+
+    def __init__(
+        self,
+        regrets: Optional[np.ndarray] = None,
+        strategy_sums: Optional[np.ndarray] = None,
+        iterations: int = 0,
+    ):
+        shape = (NUMBER_OF_INFORMATION_SETS, MAX_SLOTS)
+        self.regrets = regrets if regrets is not None else np.zeros(shape)
+        self.strategy_sums = strategy_sums if strategy_sums is not None else np.zeros(shape)
+        self.iterations = iterations
+
+    def average_strategy(self) -> np.ndarray:
+        """The average strategy, the policy that converges to an equilibrium. Information sets
+        never reached are left at 0 and played uniformly"""
+        totals = self.strategy_sums.sum(axis=1, keepdims=True)
+        return np.divide(
+            self.strategy_sums,
+            totals,
+            out=np.zeros_like(self.strategy_sums),
+            where=totals > 0,
+        ).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        """Write a checkpoint, atomically so an interrupted run never leaves a broken file"""
+        temporary_path = f"{path}.tmp.npz"
+        np.savez(
+            temporary_path,
+            regrets=self.regrets,
+            strategy_sums=self.strategy_sums,
+            iterations=self.iterations,
+        )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CFRTables":
+        with np.load(path) as checkpoint:
+            return cls(
+                checkpoint["regrets"], checkpoint["strategy_sums"], int(checkpoint["iterations"])
+            )
+
+
+def _train_chunk(
+    regrets: np.ndarray,
+    strategy_sums: np.ndarray,
+    number_of_players: int,
+    seed: int,
+    start: int,
+    stop: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Run episodes from the given tables and return the updates"""
+    rng = random.Random(seed * 1_000_003 + start)
+    new_regrets = regrets.copy()
+    new_strategy_sums = strategy_sums.copy()
+    for iteration in range(start, stop):
+        run_episode(
+            new_regrets, new_strategy_sums, number_of_players, iteration % number_of_players, rng
+        )
+    return new_regrets - regrets, new_strategy_sums - strategy_sums
+
+
+def train(
+    iterations: int,
+    number_of_players: int = 4,
+    workers: Optional[int] = 1,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_every: int = 100_000,
+    seed: int = 0,
+) -> CFRTables:
+    """Train for a number of episodes, resuming from the checkpoint if there is one.
+
+    The workers run their share of every round of `checkpoint_every` episodes from the same
+    tables, and the round's updates are summed before the checkpoint is written.
+    """
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        tables = CFRTables.load(checkpoint_path)
+    else:
+        tables = CFRTables()
+
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while tables.iterations < iterations:
+            start = tables.iterations
+            stop = min(start + checkpoint_every, iterations)
+            bounds = [start + (stop - start) * index // workers for index in range(workers + 1)]
+            chunks = [
+                (tables.regrets, tables.strategy_sums, number_of_players, seed, low, high)
+                for low, high in zip(bounds, bounds[1:])
+                if high > low
+            ]
+            if executor is None:
+                results = [_train_chunk(*chunk) for chunk in chunks]
+            else:
+                results = list(executor.map(_train_chunk, *zip(*chunks)))
+
+            for regret_updates, strategy_updates in results:
+                tables.regrets += regret_updates
+                tables.strategy_sums += strategy_updates
+            tables.iterations = stop
+
+            if checkpoint_path:
+                tables.save(checkpoint_path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return tables
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Train a CFR policy for Coup")
+    parser.add_argument("--iterations", type=int, default=100_000, help="Number of episodes")
+    parser.add_argument("--players", type=int, default=4, help="Number of players per game")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes (0 uses every core)"
+    )
+    parser.add_argument("--checkpoint", type=str, help="Checkpoint to resume from and write to")
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=100_000, help="Episodes between checkpoints"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the run")
+    parser.add_argument("--export", type=str, help="Write the average strategy to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    tables = train(
+        args.iterations,
+        args.players,
+        args.workers,
+        args.checkpoint,
+        args.checkpoint_every,
+        args.seed,
+    )
+    elapsed = time.perf_counter() - start
+
+    reached = int((tables.strategy_sums.sum(axis=1) > 0).sum())
+    print(f"{tables.iterations:,} episodes, {elapsed:.1f}s")
+    print(f"{reached:,} of {NUMBER_OF_INFORMATION_SETS:,} information sets reached")
+    if args.export:
+        np.save(args.export, tables.average_strategy())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""Compact single game engine with explicit decision points.
+
+The same rules as `ResistanceCoupGameHandler`, but every decision the handler asks a player
+for (action, challenge, counter, challenge of a counter, discard and exchange) is an explicit
+phase of the state, answered with `apply(move)`. The state is a handful of small lists of ints,
+so it can be copied in a few microseconds, which makes it the engine for search based bots.
+
+Moves are ints:
+
+    action:      action code * 8 + target seat (NO_TARGET for untargeted actions)
+    yes/no:      PASS or ACCEPT (challenges, counters and challenges of counters)
+    discard:     code of the card to lose
+    exchange:    the card codes kept, see `encode_kept_cards`
+"""
+
+import random
+from enum import IntEnum
+from itertools import combinations
+from typing import List, Optional, Sequence, Tuple
+
+from src.models.action import ACTION_CODES, Action, get_counter_action
+from src.models.card import CARD_CODES, CARD_TYPES, DECK_COMPOSITION
+from src.models.legal_actions import (
+    ACCEPT,
+    ACTION_BITS,
+    ACTION_MASKS,
+    ACTIONS_BY_MASK,
+    MAX_COIN_BUCKET,
+    PASS,
+    TARGET_MASKS,
+)
+
+NO_CARD = -1
+NO_PLAYER = -1
+NO_TARGET = 7
+
+NUMBER_OF_CARD_TYPES = len(CARD_TYPES)
+CARD_COPIES: Tuple[int, ...] = tuple(DECK_COMPOSITION.count(card_type) for card_type in CARD_TYPES)
+TOTAL_COINS = 50
+
+# The actions indexed by action code
+ACTIONS_BY_CODE: Tuple[Action, ...] = tuple(
+    sorted(ACTIONS_BY_MASK[-1], key=lambda action: ACTION_CODES[action.action_type])
+)
+REQUIRES_TARGET: Tuple[bool, ...] = tuple(action.requires_target for action in ACTIONS_BY_CODE)
+CAN_BE_CHALLENGED: Tuple[bool, ...] = tuple(action.can_be_challenged for action in ACTIONS_BY_CODE)
+CAN_BE_COUNTERED: Tuple[bool, ...] = tuple(action.can_be_countered for action in ACTIONS_BY_CODE)
+CLAIMED_CARD: Tuple[int, ...] = tuple(
+    CARD_CODES[action.associated_card_type] if action.associated_card_type else NO_CARD
+    for action in ACTIONS_BY_CODE
+)
+COUNTER_CARD: Tuple[int, ...] = tuple(
+    (
+        CARD_CODES[get_counter_action(action.action_type).associated_card_type]
+        if action.can_be_countered
+        else NO_CARD
+    )
+    for action in ACTIONS_BY_CODE
+)
+
+INCOME, FOREIGN_AID, COUP, TAX, ASSASSINATE, STEAL, EXCHANGE = (
+    ACTION_CODES[action.action_type] for action in ACTIONS_BY_CODE
+)
+
+# (action code, requires target, bit) of the legal actions per coin bucket, in listing order
+_LEGAL_ACTIONS: Tuple[Tuple[Tuple[int, bool, int], ...], ...] = tuple(
+    tuple(
+        (ACTION_CODES[action.action_type], action.requires_target, ACTION_BITS[action.action_type])
+        for action in ACTIONS_BY_MASK[mask]
+    )
+    for mask in ACTION_MASKS
+)
+
+
+class Phase(IntEnum):
+    action = 0
+    challenge = 1
+    counter = 2
+    counter_challenge = 3
+    discard = 4
+    exchange = 5
+    game_over = 6
+
+
+class AfterDiscard(IntEnum):
+    """What happens once the pending discard is done"""
+
+    end_turn = 0
+    execute = 1
+    execute_countered = 2
+
+
+def encode_action(action_code: int, target: int = NO_TARGET) -> int:
+    return action_code * 8 + target
+
+
+def decode_action(move: int) -> Tuple[int, int]:
+    """Action code and target seat (NO_TARGET if untargeted) of an action move"""
+    return move >> 3, move & 7
+
+
+def encode_kept_cards(cards: Sequence[int]) -> int:
+    """Exchange move keeping the given cards, the same move for any order of the cards"""
+    move = 0
+    for card in sorted(cards, reverse=True):
+        move = move * 6 + card + 1
+    return move
+
+
+def decode_kept_cards(move: int) -> List[int]:
+    cards = []
+    while move:
+        cards.append(move % 6 - 1)
+        move //= 6
+    return cards
+
+
+class CompactGame:
+    """The state of a single game, see the module docstring.
+
+    `to_move` is the seat of the player who has to answer the current phase. Hands are lists of
+    card codes and the court deck is kept as per card type counts: every draw is uniform over
+    the deck, so its order carries no information. `revealed` counts the lost cards of every
+    type.
+    """
+
+    __slots__ = (
+        "number_of_players",
+        "coins",
+        "hands",
+        "active",
+        "deck",
+        "revealed",
+        "treasury",
+        "current",
+        "turns",
+        "phase",
+        "to_move",
+        "action",
+        "target",
+        "counterer",
+        "pollers",
+        "poll_index",
+        "revealed_card",
+        "revealed_by",
+        "after_discard",
+        "exchange_cards",
+        "winner",
+    )
+
+    def __init__(self, number_of_players: int):
+        self.number_of_players = number_of_players
+        self.coins = [0] * number_of_players
+        self.hands: List[List[int]] = [[] for _ in range(number_of_players)]
+        self.active = [False] * number_of_players
+        self.deck = [0] * NUMBER_OF_CARD_TYPES
+        self.revealed = [0] * NUMBER_OF_CARD_TYPES
+        self.treasury = 0
+        self.current = 0
+        self.turns = 0
+        self.phase = Phase.action
+        self.to_move = 0
+        self.action = 0
+        self.target = NO_TARGET
+        self.counterer = NO_PLAYER
+        self.pollers: Tuple[int, ...] = ()
+        self.poll_index = 0
+        # A card revealed to win a challenge, swapped for a new one once the loser has discarded
+        self.revealed_card = NO_CARD
+        self.revealed_by = NO_PLAYER
+        self.after_discard = AfterDiscard.end_turn
+        self.exchange_cards: List[int] = []
+        self.winner = NO_PLAYER
+
+    @classmethod
+    def new_game(cls, number_of_players: int, rng: random.Random) -> "CompactGame":
+        """Set up a game like `ResistanceCoupGameHandler.setup_game`"""
+        game = cls(number_of_players)
+        for card_type in DECK_COMPOSITION:
+            game.deck[CARD_CODES[card_type]] += 1
+
+        for seat in range(number_of_players):
+            game.hands[seat] = [game.draw(rng), game.draw(rng)]
+            game.coins[seat] = 2
+            game.active[seat] = True
+
+        game.treasury = TOTAL_COINS - 2 * number_of_players
+        return game
+
+    def copy(self) -> "CompactGame":
+        game = CompactGame.__new__(CompactGame)
+        game.number_of_players = self.number_of_players
+        game.coins = self.coins.copy()
+        game.hands = [hand.copy() for hand in self.hands]
+        game.active = self.active.copy()
+        game.deck = self.deck.copy()
+        game.revealed = self.revealed.copy()
+        game.treasury = self.treasury
+        game.current = self.current
+        game.turns = self.turns
+        game.phase = self.phase
+        game.to_move = self.to_move
+        game.action = self.action
+        game.target = self.target
+        game.counterer = self.counterer
+        game.pollers = self.pollers
+        game.poll_index = self.poll_index
+        game.revealed_card = self.revealed_card
+        game.revealed_by = self.revealed_by
+        game.after_discard = self.after_discard
+        game.exchange_cards = self.exchange_cards.copy()
+        game.winner = self.winner
+        return game
+
+    @property
+    def is_over(self) -> bool:
+        return self.phase == Phase.game_over
+
+    def other_active_seats(self, seat: int) -> Tuple[int, ...]:
+        return tuple(
+            other for other in range(self.number_of_players) if self.active[other] and other != seat
+        )
+
+    # Deck
+
+    def draw(self, rng: random.Random) -> int:
+        """Draw a uniformly random card from the deck"""
+        deck = self.deck
+        index = rng.randrange(sum(deck))
+        for card, count in enumerate(deck):
+            if index < count:
+                deck[card] -= 1
+                return card
+            index -= count
+
+        raise ValueError("Cannot draw from an empty deck")
+
+    # Decisions
+
+    def legal_moves(self) -> List[int]:
+        phase = self.phase
+        if phase == Phase.action:
+            seat = self.current
+            moves = []
+            for action_code, requires_target, bit in _LEGAL_ACTIONS[
+                min(self.coins[seat], MAX_COIN_BUCKET)
+            ]:
+                if not requires_target:
+                    moves.append(action_code * 8 + NO_TARGET)
+                    continue
+
+                coins = self.coins
+                active = self.active
+                for target in range(self.number_of_players):
+                    if target == seat or not active[target]:
+                        continue
+                    if TARGET_MASKS[coins[target] > 0] & bit:
+                        moves.append(action_code * 8 + target)
+            return moves
+
+        if phase == Phase.discard:
+            return sorted(set(self.hands[self.to_move]))
+
+        if phase == Phase.exchange:
+            cards = self.hands[self.current] + self.exchange_cards
+            return sorted({encode_kept_cards(kept) for kept in combinations(cards, len(cards) - 2)})
+
+        if phase == Phase.game_over:
+            return []
+
+        return [PASS, ACCEPT]
+
+    def apply(self, move: int, rng: random.Random) -> None:  # noqa: C901
+        """Answer the current phase with a move. `rng` is used for the deck draws"""
+        phase = self.phase
+        if phase == Phase.action:
+            self.action, self.target = move >> 3, move & 7
+            if CAN_BE_CHALLENGED[self.action]:
+                self._start_challenge(Phase.challenge, self.current, CLAIMED_CARD[self.action], rng)
+            else:
+                self._after_challenge(rng)
+
+        elif phase == Phase.challenge:
+            if move == ACCEPT:
+                self._resolve_challenge(self.current, CLAIMED_CARD[self.action], rng)
+            else:
+                self._next_poller(rng)
+
+        elif phase == Phase.counter:
+            if move == ACCEPT:
+                self.counterer = self.to_move
+                self._start_challenge(
+                    Phase.counter_challenge, self.counterer, COUNTER_CARD[self.action], rng
+                )
+            else:
+                self._next_poller(rng)
+
+        elif phase == Phase.counter_challenge:
+            if move == ACCEPT:
+                self._resolve_challenge(self.counterer, COUNTER_CARD[self.action], rng)
+            else:
+                self._next_poller(rng)
+
+        elif phase == Phase.discard:
+            self.hands[self.to_move].remove(move)
+            self.revealed[move] += 1
+            self._after_discard(rng)
+
+        elif phase == Phase.exchange:
+            cards = self.hands[self.current] + self.exchange_cards
+            kept = decode_kept_cards(move)
+            for card in kept:
+                cards.remove(card)
+            for card in cards:
+                self.deck[card] += 1
+
+            self.hands[self.current] = kept
+            self.exchange_cards = []
+            self._end_turn()
+
+    # Turn flow, mirroring ResistanceCoupGameHandler.handle_turn
+
+    def _start_challenge(self, phase: Phase, claimant: int, card: int, rng: random.Random) -> None:
+        self.phase = phase
+        # Every copy of the claimed card is revealed: the handler calls the bluff without a poll
+        if self.revealed[card] >= CARD_COPIES[card]:
+            self._bluff_caught(claimant, rng)
+        else:
+            self._start_poll(phase, self.other_active_seats(claimant), rng)
+
+    def _start_poll(self, phase: Phase, pollers: Tuple[int, ...], rng: random.Random) -> None:
+        self.phase = phase
+        self.pollers = pollers
+        self.poll_index = -1
+        self._next_poller(rng)
+
+    def _next_poller(self, rng: random.Random) -> None:
+        # Players who lost their last card earlier this turn are already out of the game
+        pollers = self.pollers
+        index = self.poll_index + 1
+        while index < len(pollers) and not self.hands[pollers[index]]:
+            index += 1
+
+        if index < len(pollers):
+            self.poll_index = index
+            self.to_move = pollers[index]
+            return
+
+        # Nobody said yes
+        if self.phase == Phase.challenge:
+            self._after_challenge(rng)
+        elif self.phase == Phase.counter:
+            self._execute(False, rng)
+        else:
+            self._execute(True, rng)
+
+    def _after_challenge(self, rng: random.Random) -> None:
+        if CAN_BE_COUNTERED[self.action]:
+            self._start_poll(Phase.counter, self.other_active_seats(self.current), rng)
+        else:
+            self._execute(False, rng)
+
+    def _resolve_challenge(self, challenged: int, card: int, rng: random.Random) -> None:
+        challenger = self.to_move
+        is_counter = self.phase == Phase.counter_challenge
+
+        if card in self.hands[challenged]:
+            # Challenge failed: the card is revealed and swapped once the challenger discarded
+            self.hands[challenged].remove(card)
+            self.revealed_card = card
+            self.revealed_by = challenged
+            self._start_discard(
+                challenger,
+                AfterDiscard.execute_countered if is_counter else AfterDiscard.execute,
+                rng,
+            )
+        else:
+            self._bluff_caught(challenged, rng)
+
+    def _bluff_caught(self, challenged: int, rng: random.Random) -> None:
+        """A caught action doesn't happen, a caught counter doesn't block"""
+        is_counter = self.phase == Phase.counter_challenge
+        self._start_discard(
+            challenged, AfterDiscard.execute if is_counter else AfterDiscard.end_turn, rng
+        )
+
+    def _start_discard(self, seat: int, after: AfterDiscard, rng: random.Random) -> None:
+        self.after_discard = after
+        if not self.hands[seat]:
+            self._after_discard(rng)
+            return
+
+        self.phase = Phase.discard
+        self.to_move = seat
+
+    def _after_discard(self, rng: random.Random) -> None:
+        if self.revealed_by != NO_PLAYER:
+            self.deck[self.revealed_card] += 1
+            self.hands[self.revealed_by].append(self.draw(rng))
+            self.revealed_card = NO_CARD
+            self.revealed_by = NO_PLAYER
+
+        after = self.after_discard
+        if after == AfterDiscard.end_turn:
+            self._end_turn()
+        else:
+            self._execute(after == AfterDiscard.execute_countered, rng)
+
+    def _take_coins(self, seat: int, number_of_coins: int) -> None:
+        number_of_coins = min(number_of_coins, self.treasury)
+        self.treasury -= number_of_coins
+        self.coins[seat] += number_of_coins
+
+    def _give_coins(self, seat: int, number_of_coins: int) -> None:
+        self.treasury += number_of_coins
+        self.coins[seat] -= number_of_coins
+
+    def _execute(self, countered: bool, rng: random.Random) -> None:
+        action = self.action
+        current = self.current
+        target = self.target
+
+        if action == INCOME:
+            self._take_coins(current, 1)
+        elif action == FOREIGN_AID:
+            if not countered:
+                self._take_coins(current, 2)
+        elif action == COUP:
+            self._give_coins(current, 7)
+            if self.hands[target]:
+                self._start_discard(target, AfterDiscard.end_turn, rng)
+                return
+        elif action == TAX:
+            self._take_coins(current, 3)
+        elif action == ASSASSINATE:
+            self._give_coins(current, 3)
+            if not countered and self.hands[target]:
+                self._start_discard(target, AfterDiscard.end_turn, rng)
+                return
+        elif action == STEAL:
+            if not countered:
+                steal_amount = min(self.coins[target], 2)
+                self.coins[target] -= steal_amount
+                self.coins[current] += steal_amount
+        elif action == EXCHANGE:
+            self.exchange_cards = [self.draw(rng), self.draw(rng)]
+            self.phase = Phase.exchange
+            self.to_move = current
+            return
+
+        self._end_turn()
+
+    def _end_turn(self) -> None:
+        self.turns += 1
+        self.counterer = NO_PLAYER
+
+        # Is any player out of the game?
+        for seat in range(self.number_of_players):
+            if self.active[seat] and not self.hands[seat]:
+                self.active[seat] = False
+                self._give_coins(seat, self.coins[seat])
+
+        remaining = [seat for seat in range(self.number_of_players) if self.active[seat]]
+        if len(remaining) == 1:
+            self.winner = remaining[0]
+            self.phase = Phase.game_over
+            return
+
+        current = (self.current + 1) % self.number_of_players
+        while not self.active[current]:
+            current = (current + 1) % self.number_of_players
+
+        self.current = current
+        self.phase = Phase.action
+        self.to_move = current
+
+
+def random_move(game: CompactGame, rng: random.Random) -> int:
+    """A move with the same odds as `AIPlayer`: a random legal action and target, challenges 1 in
+    5 and counters 1 in 10 times, random discards and exchanges"""
+    phase = game.phase
+    if phase == Phase.challenge or phase == Phase.counter_challenge:
+        return ACCEPT if rng.random() < 0.2 else PASS
+    if phase == Phase.counter:
+        return ACCEPT if rng.random() < 0.1 else PASS
+
+    moves = game.legal_moves()
+    if phase == Phase.action:
+        # Every untargeted action counts once per opponent, like AIPlayer's (action, target) draw
+        untargeted = [move for move in moves if move & 7 == NO_TARGET]
+        opponents = len(game.other_active_seats(game.current))
+        index = rng.randrange(len(moves) + (opponents - 1) * len(untargeted))
+        if index >= len(moves):
+            return untargeted[(index - len(moves)) % len(untargeted)]
+        return moves[index]
+
+    return moves[rng.randrange(len(moves))]
+
+
+def play_out(game: CompactGame, rng: random.Random, max_turns: Optional[int] = None) -> CompactGame:
+    """Play the game on with random moves, until it's over or `max_turns` more turns were taken"""
+    stop = game.turns + max_turns if max_turns is not None else None
+    while game.phase != Phase.game_over and (stop is None or game.turns < stop):
+        game.apply(random_move(game, rng), rng)
+
+    return game
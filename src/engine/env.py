@@ -0,0 +1,858 @@
+"""Gym style environments over a batch engine with explicit decision points.
+
+`VectorCoupEnv` steps a batch of games at once: every call answers the pending decision of every
+game with one move and plays the opponents (array policies like `RandomPolicy`) until each game
+waits for the learner again. The decisions are the ones `ResistanceCoupGameHandler` asks its
+players for: the action, challenges, counters, challenges of counters, discards and exchanges.
+`CoupEnv` is the same for a single game and `AsyncVectorCoupEnv` spreads the batch over worker
+processes.
+
+Moves index one fixed move space, whatever the phase:
+
+    action:      ACTION_MOVES + action code * MAX_PLAYERS + target offset, the offset of the
+                 target's seat after the player's own (0 for untargeted actions)
+    yes/no:      PASS_MOVE or ACCEPT_MOVE
+    discard:     DISCARD_MOVES + code of the card to lose
+    exchange:    EXCHANGE_MOVES + index in `HANDS` of the cards kept
+
+Observations are float32 vectors of OBSERVATION_SIZE, from the viewpoint of the player to move
+with the seats listed from theirs on, and `info["action_mask"]` holds the legal moves. The
+learner gets a reward of 1 for winning and -1 for losing. Finished games are reset right away,
+so the observation returned for them is the first one of the next game.
+"""
+
+import argparse
+import multiprocessing
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.engine.compact import AfterDiscard, Phase
+from src.engine.policies import RandomPolicy
+from src.engine.vectorized import (
+    ASSASSINATE,
+    CAN_BE_CHALLENGED,
+    CAN_BE_COUNTERED,
+    CARD_COPIES,
+    CLAIMED_CARD,
+    COUNTER_CARD,
+    COUP,
+    EXCHANGE,
+    FOREIGN_AID,
+    INCOME,
+    NO_CARD,
+    NO_PLAYER,
+    NUMBER_OF_ACTION_TYPES,
+    NUMBER_OF_CARD_TYPES,
+    REQUIRES_TARGET,
+    STEAL,
+    TAX,
+    BatchEngine,
+    BatchGameState,
+    BatchPolicy,
+)
+from src.models.card import HANDS, NUMBER_OF_HANDS
+
+MAX_PLAYERS = 6
+MAX_COINS = 12
+
+# The move space
+ACTION_MOVES = 0
+PASS_MOVE = ACTION_MOVES + NUMBER_OF_ACTION_TYPES * MAX_PLAYERS
+ACCEPT_MOVE = PASS_MOVE + 1
+DISCARD_MOVES = ACCEPT_MOVE + 1
+EXCHANGE_MOVES = DISCARD_MOVES + NUMBER_OF_CARD_TYPES
+NUMBER_OF_MOVES = EXCHANGE_MOVES + NUMBER_OF_HANDS
+
+NUMBER_OF_PHASES = len(Phase) - 1  # game_over is never observed
+
+# Offsets of the observation features
+HAND = 0
+EXCHANGE_CARDS = HAND + NUMBER_OF_CARD_TYPES
+COINS = EXCHANGE_CARDS + NUMBER_OF_CARD_TYPES
+INFLUENCE = COINS + MAX_PLAYERS
+ACTIVE = INFLUENCE + MAX_PLAYERS
+REVEALED = ACTIVE + MAX_PLAYERS
+PHASE = REVEALED + NUMBER_OF_CARD_TYPES
+CURRENT = PHASE + NUMBER_OF_PHASES
+DECLARED_ACTION = CURRENT + MAX_PLAYERS
+TARGET = DECLARED_ACTION + NUMBER_OF_ACTION_TYPES
+COUNTERER = TARGET + MAX_PLAYERS
+REVEALED_CARD = COUNTERER + MAX_PLAYERS
+OBSERVATION_SIZE = REVEALED_CARD + NUMBER_OF_CARD_TYPES
+
+# Copies of every card type in every hand of `HANDS`, its size and its cards in hand slots
+HAND_COUNTS = np.array(
+    [np.bincount(hand, minlength=NUMBER_OF_CARD_TYPES) for hand in HANDS], dtype=np.int16
+)
+HAND_SIZES = HAND_COUNTS.sum(axis=1)
+HAND_SLOTS = np.array([hand + (NO_CARD,) * (2 - len(hand)) for hand in HANDS], dtype=np.int8)
+# Index in `HANDS` of a left aligned hand, indexed [first slot + 1, second slot + 1]
+_HAND_LOOKUP = np.full((NUMBER_OF_CARD_TYPES + 1, NUMBER_OF_CARD_TYPES + 1), -1, dtype=np.int64)
+for _index, (_first, _second) in enumerate(HAND_SLOTS.astype(np.int64) + 1):
+    _HAND_LOOKUP[_first, _second] = _HAND_LOOKUP[_second, _first] = _index
+
+
+class BatchDecisionState(BatchGameState):
+    """`BatchGameState` plus the pending decision of every game, like the fields of
+    `CompactGame`"""
+
+    def __init__(self, number_of_games: int, number_of_players: int):
+        super().__init__(number_of_games, number_of_players)
+        self.phase = np.zeros(number_of_games, dtype=np.int8)
+        self.to_move = np.zeros(number_of_games, dtype=np.int64)
+        self.action = np.zeros(number_of_games, dtype=np.int64)
+        self.target = np.full(number_of_games, NO_PLAYER, dtype=np.int64)
+        self.counterer = np.full(number_of_games, NO_PLAYER, dtype=np.int64)
+        # The seat a poll skips (the claimant) and the card revealed to win a challenge, swapped
+        # for a new one once the loser has discarded
+        self.poll_excluded = np.full(number_of_games, NO_PLAYER, dtype=np.int64)
+        self.revealed_card = np.full(number_of_games, NO_CARD, dtype=np.int8)
+        self.revealed_by = np.full(number_of_games, NO_PLAYER, dtype=np.int64)
+        self.after_discard = np.zeros(number_of_games, dtype=np.int8)
+        self.exchange_cards = np.full((number_of_games, 2), NO_CARD, dtype=np.int8)
+
+
+class VectorCoupEnv(BatchEngine):
+    """A batch of games played by a learner against array policies, see the module docstring.
+
+    The learner plays `seat` in every game, or a random seat per game when it's None. Without
+    opponents the learner answers every decision of every seat (self-play); its reward is then
+    the one of the seat that moved and `info["winner"]` tells the others. A game is terminated
+    when the learner loses its last card and truncated after `max_turns` turns.
+
+    The arrays returned by `reset` and `step` are reused by the next call, copy them to keep
+    them.
+    """
+
+    def __init__(
+        self,
+        number_of_envs: int,
+        number_of_players: int = 4,
+        opponents: Optional[Union[BatchPolicy, Sequence[BatchPolicy]]] = RandomPolicy(),
+        seat: Optional[int] = 0,
+        max_turns: int = 200,
+        seed: Optional[Union[int, np.random.SeedSequence]] = None,
+    ):
+        super().__init__(number_of_envs, number_of_players, seed)
+        self.state = BatchDecisionState(number_of_envs, number_of_players)
+
+        if isinstance(opponents, BatchPolicy):
+            opponents = [opponents] * number_of_players
+        if opponents is not None and len(opponents) != number_of_players:
+            raise ValueError("Provide one policy per seat")
+
+        self.number_of_envs = number_of_envs
+        self.number_of_players = number_of_players
+        self.opponents = None if opponents is None else list(opponents)
+        self.seat = seat
+        self.max_turns = max_turns
+        self.learner = np.zeros(number_of_envs, dtype=np.int64)
+
+        self._all = np.arange(number_of_envs)
+        self._observations = np.zeros((number_of_envs, OBSERVATION_SIZE), dtype=np.float32)
+        self._action_mask = np.zeros((number_of_envs, NUMBER_OF_MOVES), dtype=bool)
+        self._rewards = np.zeros(number_of_envs, dtype=np.float32)
+        self._terminated = np.zeros(number_of_envs, dtype=bool)
+        self._truncated = np.zeros(number_of_envs, dtype=bool)
+        self._winners = np.full(number_of_envs, NO_PLAYER, dtype=np.int64)
+
+    # Gym API
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Start a new game in every env"""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        self._new_games(self._all)
+        self._winners[:] = NO_PLAYER
+        return self._observe(), self._info()
+
+    def step(
+        self, moves: Union[Sequence[int], np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Answer the pending decision of every env, returns the observations, rewards,
+        terminated and truncated flags and info of the next decisions"""
+        state = self.state
+        moves = np.asarray(moves, dtype=np.int64)
+        if moves.shape != (self.number_of_envs,):
+            raise ValueError(f"Expected {self.number_of_envs} moves")
+        if not self._action_mask[self._all, moves].all():
+            raise ValueError("Illegal move")
+
+        movers = state.to_move.copy()
+        self._apply(self._all, moves)
+        self._play_opponents()
+
+        # Games the learner won or lost, or that ran for too long
+        if self.opponents is None:
+            learners = movers
+            lost = np.zeros(self.number_of_envs, dtype=bool)
+        else:
+            learners = self.learner
+            lost = (state.hands[self._all, learners, 0] == NO_CARD) & ~state.done
+
+        terminated = np.logical_or(state.done, lost, out=self._terminated)
+        truncated = np.logical_and(state.turns >= self.max_turns, ~terminated, out=self._truncated)
+        self._winners[:] = np.where(state.done, state.winner, NO_PLAYER)
+        self._rewards[:] = np.where(terminated, np.where(self._winners == learners, 1.0, -1.0), 0.0)
+
+        finished = np.flatnonzero(terminated | truncated)
+        if len(finished):
+            self._new_games(finished)
+
+        return self._observe(), self._rewards, terminated, truncated, self._info()
+
+    def close(self) -> None:
+        pass
+
+    # Setting up and advancing the games
+
+    def _new_games(self, games: np.ndarray) -> None:
+        state = self.state
+        self._deal(games)
+        state.phase[games] = Phase.action
+        state.to_move[games] = 0
+        state.counterer[games] = NO_PLAYER
+        state.revealed_by[games] = NO_PLAYER
+        state.revealed_card[games] = NO_CARD
+        state.exchange_cards[games] = NO_CARD
+        if self.seat is None:
+            self.learner[games] = self.rng.integers(0, self.number_of_players, len(games))
+        else:
+            self.learner[games] = self.seat
+
+        # Opponents seated before the learner take the first turns
+        self._play_opponents(games)
+
+    def _waiting_for_opponents(self, games: np.ndarray) -> np.ndarray:
+        state = self.state
+        learners = self.learner[games]
+        playing = ~state.done[games] & (state.turns[games] < self.max_turns)
+        playing &= state.hands[games, learners, 0] != NO_CARD
+        return playing & (state.to_move[games] != learners)
+
+    def _play_opponents(self, games: Optional[np.ndarray] = None) -> None:
+        """Let the opponents move until every game waits for the learner (or is over)"""
+        if self.opponents is None:
+            return
+
+        games = self._all if games is None else games
+        while len(games := games[self._waiting_for_opponents(games)]):
+            self._apply(games, self._opponent_moves(games))
+
+    def _opponent_moves(self, games: np.ndarray) -> np.ndarray:
+        """The moves of the opponents to move, asked from their policies"""
+        state = self.state
+        moves = np.zeros(len(games), dtype=np.int64)
+        phases = state.phase[games]
+        seats = state.to_move[games]
+
+        for seat in np.unique(seats):
+            policy = self.opponents[seat]
+            seat_rows = seats == seat
+
+            rows = np.flatnonzero(seat_rows & (phases == Phase.action))
+            if len(rows):
+                legal, legal_targets = self.legal_actions(games[rows])
+                actions, targets = policy.choose_actions(self, games[rows], legal, legal_targets)
+                offsets = np.where(
+                    targets == NO_PLAYER, 0, (targets - seat) % self.number_of_players
+                )
+                moves[rows] = ACTION_MOVES + actions * MAX_PLAYERS + offsets
+
+            rows = np.flatnonzero(
+                seat_rows & ((phases == Phase.challenge) | (phases == Phase.counter_challenge))
+            )
+            if len(rows):
+                rows_games = games[rows]
+                is_counter = phases[rows] == Phase.counter_challenge
+                actions = state.action[rows_games]
+                claimants = np.where(
+                    is_counter, state.counterer[rows_games], state.current_player[rows_games]
+                )
+                cards = np.where(is_counter, COUNTER_CARD[actions], CLAIMED_CARD[actions])
+                accepts = policy.challenge(self, rows_games, seat, claimants, cards)
+                moves[rows] = np.where(accepts, ACCEPT_MOVE, PASS_MOVE)
+
+            rows = np.flatnonzero(seat_rows & (phases == Phase.counter))
+            if len(rows):
+                rows_games = games[rows]
+                accepts = policy.counter(
+                    self, rows_games, seat, state.action[rows_games], state.target[rows_games]
+                )
+                moves[rows] = np.where(accepts, ACCEPT_MOVE, PASS_MOVE)
+
+            rows = np.flatnonzero(seat_rows & (phases == Phase.discard))
+            if len(rows):
+                rows_games, rows_seats = games[rows], seats[rows]
+                slots = policy.discard(self, rows_games, rows_seats)
+                moves[rows] = DISCARD_MOVES + state.hands[rows_games, rows_seats, slots]
+
+            rows = np.flatnonzero(seat_rows & (phases == Phase.exchange))
+            if len(rows):
+                rows_games, rows_seats = games[rows], seats[rows]
+                cards = np.concatenate(
+                    [state.hands[rows_games, rows_seats], state.exchange_cards[rows_games]], axis=1
+                ).astype(np.int64)
+                returned = policy.exchange(self, rows_games, rows_seats, cards)
+                kept = cards.copy()
+                kept[np.arange(len(rows))[:, None], returned] = NO_CARD
+                # Left align the kept cards
+                kept = np.sort(kept, axis=1)[:, ::-1][:, :2]
+                moves[rows] = EXCHANGE_MOVES + _HAND_LOOKUP[kept[:, 0] + 1, kept[:, 1] + 1]
+
+        return moves
+
+    # Moves, mirroring CompactGame.apply
+
+    def _apply(self, games: np.ndarray, moves: np.ndarray) -> None:
+        phases = self.state.phase[games]
+        accepted = moves == ACCEPT_MOVE
+
+        rows = phases == Phase.action
+        self._declare(games[rows], moves[rows])
+
+        rows = (phases == Phase.challenge) | (phases == Phase.counter_challenge)
+        self._resolve_challenge(games[rows & accepted])
+        self._next_poller(games[rows & ~accepted])
+
+        rows = phases == Phase.counter
+        self._counter(games[rows & accepted])
+        self._next_poller(games[rows & ~accepted])
+
+        rows = phases == Phase.discard
+        self._discard(games[rows], moves[rows] - DISCARD_MOVES)
+
+        rows = phases == Phase.exchange
+        self._exchange(games[rows], moves[rows] - EXCHANGE_MOVES)
+
+    def _declare(self, games: np.ndarray, moves: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        actions, offsets = np.divmod(moves - ACTION_MOVES, MAX_PLAYERS)
+        state.action[games] = actions
+        state.target[games] = np.where(
+            offsets == 0,
+            NO_PLAYER,
+            (state.current_player[games] + offsets) % self.number_of_players,
+        )
+
+        rows = CAN_BE_CHALLENGED[actions]
+        self._start_challenge(
+            games[rows],
+            state.current_player[games[rows]],
+            CLAIMED_CARD[actions[rows]],
+            Phase.challenge,
+        )
+        self._after_challenge(games[~rows])
+
+    def _counter(self, games: np.ndarray) -> None:
+        state = self.state
+        state.counterer[games] = state.to_move[games]
+        self._start_challenge(
+            games,
+            state.counterer[games],
+            COUNTER_CARD[state.action[games]],
+            Phase.counter_challenge,
+        )
+
+    def _discard(self, games: np.ndarray, cards: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        seats = state.to_move[games]
+        slots = (state.hands[games, seats] != cards[:, None]).argmin(axis=1)
+        self._remove_slot(games, seats, slots)
+        state.revealed[games, cards] += 1
+        self._after_discard(games)
+
+    def _exchange(self, games: np.ndarray, kept: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        seats = state.current_player[games]
+        cards = np.concatenate([state.hands[games, seats], state.exchange_cards[games]], axis=1)
+        counts = (cards[:, :, None] == np.arange(NUMBER_OF_CARD_TYPES)).sum(axis=1)
+        state.deck[games] += (counts - HAND_COUNTS[kept]).astype(state.deck.dtype)
+        state.hands[games, seats] = HAND_SLOTS[kept]
+        state.exchange_cards[games] = NO_CARD
+        self._end_turn(games)
+
+    # Turn flow, mirroring CompactGame and ResistanceCoupGameHandler.handle_turn
+
+    def _start_challenge(
+        self, games: np.ndarray, claimants: np.ndarray, cards: np.ndarray, phase: Phase
+    ) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        state.phase[games] = phase
+        # Every copy of the claimed card is revealed: the handler calls the bluff without a poll
+        impossible = state.revealed[games, cards] >= CARD_COPIES[cards]
+        self._bluff_caught(games[impossible])
+        self._start_poll(games[~impossible], phase, claimants[~impossible])
+
+    def _start_poll(self, games: np.ndarray, phase: Phase, excluded: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        state.phase[games] = phase
+        state.poll_excluded[games] = excluded
+        state.to_move[games] = NO_PLAYER
+        self._next_poller(games)
+
+    def _next_poller(self, games: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        # Players who lost their last card earlier this turn are already out of the game
+        state = self.state
+        pollable = state.active[games] & (state.hands[games, :, 0] != NO_CARD)
+        pollable &= self._seats > state.to_move[games, None]
+        pollable &= self._seats != state.poll_excluded[games, None]
+        found = pollable.any(axis=1)
+        state.to_move[games[found]] = pollable[found].argmax(axis=1)
+
+        # Nobody said yes
+        games = games[~found]
+        phases = state.phase[games]
+        self._after_challenge(games[phases == Phase.challenge])
+        self._execute(games[phases == Phase.counter], False)
+        self._execute(games[phases == Phase.counter_challenge], True)
+
+    def _after_challenge(self, games: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        rows = CAN_BE_COUNTERED[state.action[games]]
+        self._start_poll(games[rows], Phase.counter, state.current_player[games[rows]])
+        self._execute(games[~rows], False)
+
+    def _challenged(self, games: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Whether the challenge is against a counter, and the challenged seat and card"""
+        state = self.state
+        is_counter = state.phase[games] == Phase.counter_challenge
+        actions = state.action[games]
+        seats = np.where(is_counter, state.counterer[games], state.current_player[games])
+        cards = np.where(is_counter, COUNTER_CARD[actions], CLAIMED_CARD[actions])
+        return is_counter, seats, cards
+
+    def _resolve_challenge(self, games: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        is_counter, seats, cards = self._challenged(games)
+        hands = state.hands[games, seats]
+        has_card = (hands == cards[:, None]).any(axis=1)
+
+        # Challenge failed: the card is revealed and swapped once the challenger discarded
+        failed = games[has_card]
+        slots = (hands[has_card] != cards[has_card, None]).argmin(axis=1)
+        state.revealed_card[failed] = self._remove_slot(failed, seats[has_card], slots)
+        state.revealed_by[failed] = seats[has_card]
+        self._start_discard(
+            failed,
+            state.to_move[failed],
+            np.where(is_counter[has_card], AfterDiscard.execute_countered, AfterDiscard.execute),
+        )
+
+        self._bluff_caught(games[~has_card])
+
+    def _bluff_caught(self, games: np.ndarray) -> None:
+        """A caught action doesn't happen, a caught counter doesn't block"""
+        if not len(games):
+            return
+
+        is_counter, seats, _ = self._challenged(games)
+        self._start_discard(
+            games, seats, np.where(is_counter, AfterDiscard.execute, AfterDiscard.end_turn)
+        )
+
+    def _start_discard(
+        self, games: np.ndarray, seats: np.ndarray, after: Union[int, np.ndarray]
+    ) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        state.after_discard[games] = after
+        has_cards = state.hands[games, seats, 0] != NO_CARD
+        state.phase[games[has_cards]] = Phase.discard
+        state.to_move[games[has_cards]] = seats[has_cards]
+        self._after_discard(games[~has_cards])
+
+    def _after_discard(self, games: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        swapped = games[state.revealed_by[games] != NO_PLAYER]
+        if len(swapped):
+            self._return_cards(swapped, state.revealed_card[swapped])
+            self._add_card(swapped, state.revealed_by[swapped], self._draw(swapped))
+            state.revealed_card[swapped] = NO_CARD
+            state.revealed_by[swapped] = NO_PLAYER
+
+        after = state.after_discard[games]
+        self._end_turn(games[after == AfterDiscard.end_turn])
+        self._execute(games[after == AfterDiscard.execute], False)
+        self._execute(games[after == AfterDiscard.execute_countered], True)
+
+    def _execute(self, games: np.ndarray, countered: bool) -> None:
+        if not len(games):
+            return
+
+        state = self.state
+        actions = state.action[games]
+        actors = state.current_player[games]
+        targets = state.target[games]
+
+        rows = actions == INCOME
+        self._take_coins_from_treasury(games[rows], actors[rows], 1)
+
+        if not countered:
+            rows = actions == FOREIGN_AID
+            self._take_coins_from_treasury(games[rows], actors[rows], 2)
+
+        rows = actions == TAX
+        self._take_coins_from_treasury(games[rows], actors[rows], 3)
+
+        rows = actions == COUP
+        self._give_coins_to_treasury(games[rows], actors[rows], 7)
+
+        rows = actions == ASSASSINATE
+        self._give_coins_to_treasury(games[rows], actors[rows], 3)
+
+        if not countered:
+            rows = actions == STEAL
+            stealing_games, thieves, victims = games[rows], actors[rows], targets[rows]
+            amounts = np.minimum(state.coins[stealing_games, victims], 2)
+            state.coins[stealing_games, victims] -= amounts
+            state.coins[stealing_games, thieves] += amounts
+
+        rows = actions == EXCHANGE
+        exchanging = games[rows]
+        if len(exchanging):
+            state.exchange_cards[exchanging, 0] = self._draw(exchanging)
+            state.exchange_cards[exchanging, 1] = self._draw(exchanging)
+            state.phase[exchanging] = Phase.exchange
+            state.to_move[exchanging] = actors[rows]
+
+        attacks = (actions == COUP) | ((actions == ASSASSINATE) & (not countered))
+        rows = attacks & (state.hands[games, np.maximum(targets, 0), 0] != NO_CARD)
+        self._start_discard(games[rows], targets[rows], AfterDiscard.end_turn)
+
+        self._end_turn(games[~rows & ~(actions == EXCHANGE)])
+
+    def _end_turn(self, games: np.ndarray) -> None:
+        if not len(games):
+            return
+
+        super()._end_turn(games)
+        state = self.state
+        state.counterer[games] = NO_PLAYER
+        state.phase[games] = np.where(state.done[games], Phase.game_over, Phase.action)
+        state.to_move[games] = state.current_player[games]
+
+    # Observations
+
+    def _info(self) -> Dict[str, np.ndarray]:
+        return {
+            "action_mask": self._legal_moves(),
+            "to_move": self.state.to_move,
+            "winner": self._winners,
+        }
+
+    def _legal_moves(self) -> np.ndarray:
+        state = self.state
+        mask = self._action_mask
+        mask[:] = False
+        phases = state.phase
+
+        games = np.flatnonzero(phases == Phase.action)
+        if len(games):
+            legal, targets = self.legal_actions(games)
+            actors = state.current_player[games]
+            rows = np.arange(len(games))
+            for offset in range(self.number_of_players):
+                # The moves of every action with this target offset
+                first_move = ACTION_MOVES + offset
+                if offset == 0:
+                    mask[games, first_move:PASS_MOVE:MAX_PLAYERS] = legal & ~REQUIRES_TARGET
+                else:
+                    seats = (actors + offset) % self.number_of_players
+                    mask[games, first_move:PASS_MOVE:MAX_PLAYERS] = targets[rows, :, seats]
+
+        yes_no = (phases >= Phase.challenge) & (phases <= Phase.counter_challenge)
+        mask[yes_no, PASS_MOVE] = True
+        mask[yes_no, ACCEPT_MOVE] = True
+
+        games = np.flatnonzero(phases == Phase.discard)
+        hands = state.hands[games, state.to_move[games]]
+        for slot in range(2):
+            held = hands[:, slot] != NO_CARD
+            mask[games[held], DISCARD_MOVES + hands[held, slot]] = True
+
+        games = np.flatnonzero(phases == Phase.exchange)
+        if len(games):
+            seats = state.current_player[games]
+            cards = np.concatenate([state.hands[games, seats], state.exchange_cards[games]], axis=1)
+            counts = (cards[:, :, None] == np.arange(NUMBER_OF_CARD_TYPES)).sum(axis=1)
+            hand_sizes = (state.hands[games, seats] != NO_CARD).sum(axis=1)
+            mask[games, EXCHANGE_MOVES:] = (HAND_COUNTS <= counts[:, None, :]).all(axis=2) & (
+                HAND_SIZES == hand_sizes[:, None]
+            )
+
+        return mask
+
+    def _observe(self) -> np.ndarray:
+        state = self.state
+        observations = self._observations
+        observations[:] = 0.0
+        games = self._all
+        viewers = state.to_move
+        number_of_players = self.number_of_players
+
+        # Seats listed from the viewer's on
+        seats = (viewers[:, None] + np.arange(number_of_players)) % number_of_players
+        rows = games[:, None]
+        hands = state.hands[games, viewers]
+        for slot in range(2):
+            held = hands[:, slot] != NO_CARD
+            np.add.at(observations, (games[held], HAND + hands[held, slot]), 1.0)
+
+        exchanging = np.flatnonzero(state.phase == Phase.exchange)
+        for slot in range(2):
+            np.add.at(
+                observations,
+                (exchanging, EXCHANGE_CARDS + state.exchange_cards[exchanging, slot]),
+                1.0,
+            )
+
+        coins_end = COINS + number_of_players
+        influence_end = INFLUENCE + number_of_players
+        active_end = ACTIVE + number_of_players
+        observations[:, COINS:coins_end] = state.coins[rows, seats] / MAX_COINS
+        observations[:, INFLUENCE:influence_end] = (state.hands[rows, seats] != NO_CARD).sum(
+            axis=2
+        ) / 2
+        observations[:, ACTIVE:active_end] = state.active[rows, seats]
+        observations[:, REVEALED:PHASE] = state.revealed / CARD_COPIES
+
+        playing = np.flatnonzero(state.phase != Phase.game_over)
+        observations[playing, PHASE + state.phase[playing]] = 1.0
+        observations[games, CURRENT + (state.current_player - viewers) % number_of_players] = 1.0
+
+        declared = np.flatnonzero((state.phase != Phase.action) & (state.phase != Phase.game_over))
+        observations[declared, DECLARED_ACTION + state.action[declared]] = 1.0
+        for offset, seat_of in ((TARGET, state.target), (COUNTERER, state.counterer)):
+            rows = declared[seat_of[declared] != NO_PLAYER]
+            observations[rows, offset + (seat_of[rows] - viewers[rows]) % number_of_players] = 1.0
+
+        rows = np.flatnonzero(state.revealed_card != NO_CARD)
+        observations[rows, REVEALED_CARD + state.revealed_card[rows]] = 1.0
+        return observations
+
+
+class CoupEnv:
+    """A single game, the `VectorCoupEnv` API without the batch dimension"""
+
+    def __init__(self, number_of_players: int = 4, **kwargs):
+        self._env = VectorCoupEnv(1, number_of_players, **kwargs)
+
+    @property
+    def state(self) -> BatchDecisionState:
+        return self._env.state
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        observations, info = self._env.reset(seed)
+        return observations[0], _first(info)
+
+    def step(self, move: int) -> Tuple[np.ndarray, float, bool, bool, Dict[str, Any]]:
+        observations, rewards, terminated, truncated, info = self._env.step([move])
+        return (
+            observations[0],
+            float(rewards[0]),
+            bool(terminated[0]),
+            bool(truncated[0]),
+            _first(info),
+        )
+
+    def close(self) -> None:
+        self._env.close()
+
+
+def _first(info: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    return {key: value[0] for key, value in info.items()}
+
+
+def _worker(connection, kwargs: Dict[str, Any]) -> None:
+    env = VectorCoupEnv(**kwargs)
+    while True:
+        command, argument = connection.recv()
+        if command == "reset":
+            observations, info = env.reset(argument)
+            connection.send((observations.copy(), _copy_info(info)))
+        elif command == "step":
+            observations, rewards, terminated, truncated, info = env.step(argument)
+            connection.send(
+                (
+                    observations.copy(),
+                    rewards.copy(),
+                    terminated.copy(),
+                    truncated.copy(),
+                    _copy_info(info),
+                )
+            )
+        else:
+            connection.close()
+            return
+
+
+def _copy_info(info: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {key: value.copy() for key, value in info.items()}
+
+
+class AsyncVectorCoupEnv:
+    """`VectorCoupEnv` split over worker processes, one slice of the envs each.
+
+    `step_async` sends the moves and returns at once, `step_wait` collects the results, so the
+    learner can work while the games are played. Every worker gets its own seed, spawned from
+    `seed`.
+    """
+
+    def __init__(
+        self,
+        number_of_envs: int,
+        number_of_players: int = 4,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        **kwargs,
+    ):
+        workers = min(workers or multiprocessing.cpu_count(), number_of_envs)
+        self.number_of_envs = number_of_envs
+        self._bounds = np.linspace(0, number_of_envs, workers + 1).astype(int)
+        self._connections = []
+        self._processes = []
+        for worker_seed, start, stop in zip(
+            np.random.SeedSequence(seed).spawn(workers), self._bounds[:-1], self._bounds[1:]
+        ):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(
+                    worker_connection,
+                    dict(
+                        number_of_envs=int(stop - start),
+                        number_of_players=number_of_players,
+                        seed=worker_seed,
+                        **kwargs,
+                    ),
+                ),
+                daemon=True,
+            )
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        seeds = (
+            np.random.SeedSequence(seed).spawn(len(self._connections)) if seed is not None else None
+        )
+        for index, connection in enumerate(self._connections):
+            connection.send(("reset", None if seeds is None else seeds[index]))
+
+        results = [connection.recv() for connection in self._connections]
+        return np.concatenate([result[0] for result in results]), _concatenate_info(
+            [result[1] for result in results]
+        )
+
+    def step_async(self, moves: Union[Sequence[int], np.ndarray]) -> None:
+        moves = np.asarray(moves, dtype=np.int64)
+        for connection, start, stop in zip(self._connections, self._bounds[:-1], self._bounds[1:]):
+            connection.send(("step", moves[start:stop]))
+
+    def step_wait(
+        self,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        results = [connection.recv() for connection in self._connections]
+        return (
+            *(np.concatenate([result[index] for result in results]) for index in range(4)),
+            _concatenate_info([result[4] for result in results]),
+        )
+
+    def step(
+        self, moves: Union[Sequence[int], np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        self.step_async(moves)
+        return self.step_wait()
+
+    def close(self) -> None:
+        for connection in self._connections:
+            connection.send(("close", None))
+            connection.close()
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self) -> "AsyncVectorCoupEnv":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _concatenate_info(infos: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {key: np.concatenate([info[key] for info in infos]) for key in infos[0]}
+
+
+def random_moves(rng: np.random.Generator, action_mask: np.ndarray) -> np.ndarray:
+    """A uniformly random legal move per env"""
+    keys = rng.random(action_mask.shape)
+    keys[~action_mask] = -1.0
+    return keys.argmax(axis=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the env's steps per second")
+    parser.add_argument("--envs", type=int, default=4096)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="Use the async env if not 1")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.workers == 1:
+        env = VectorCoupEnv(args.envs, args.players, seed=args.seed)
+    else:
+        env = AsyncVectorCoupEnv(args.envs, args.players, workers=args.workers, seed=args.seed)
+
+    _, info = env.reset()
+    episodes = wins = 0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        _, rewards, terminated, truncated, info = env.step(random_moves(rng, info["action_mask"]))
+        episodes += int((terminated | truncated).sum())
+        wins += int((rewards > 0).sum())
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    print(
+        f"{args.envs * args.steps / elapsed:,.0f} steps/s, {episodes} episodes, "
+        f"{wins / max(episodes, 1):.1%} won by the random learner"
+    )
+
+
+if __name__ == "__main__":
+    main()
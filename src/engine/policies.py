@@ -0,0 +1,154 @@
+import numpy as np
+
+from src.engine.vectorized import (
+    ASSASSINATE,
+    COUNTER_CARD,
+    COUP,
+    EXCHANGE,
+    FOREIGN_AID,
+    INCOME,
+    NO_CARD,
+    NO_PLAYER,
+    STEAL,
+    TAX,
+    BatchPolicy,
+    VectorizedGameEngine,
+)
+from src.models.card import CARD_CODES, CardType
+
+
+def _pick_uniform(rng: np.random.Generator, mask: np.ndarray) -> np.ndarray:
+    """Pick a uniformly random True column per row of a boolean mask (-1 for empty rows)"""
+    keys = rng.random(mask.shape)
+    keys[~mask] = -1.0
+    return np.where(mask.any(axis=1), keys.argmax(axis=1), -1)
+
+
+def _pick_weighted(rng: np.random.Generator, weights: np.ndarray) -> np.ndarray:
+    cumulative = weights.cumsum(axis=1)
+    draws = rng.random(len(weights)) * cumulative[:, -1]
+    return np.minimum((draws[:, None] >= cumulative).sum(axis=1), weights.shape[1] - 1)
+
+
+class RandomPolicy(BatchPolicy):
+    """The AIPlayer bot as an array policy: same action distribution, 20% chance to challenge,
+    10% chance to counter, random discards and random exchanges"""
+
+    def __init__(self, challenge_probability: float = 0.2, counter_probability: float = 0.1):
+        self.challenge_probability = challenge_probability
+        self.counter_probability = counter_probability
+
+    def choose_actions(
+        self,
+        engine: VectorizedGameEngine,
+        games: np.ndarray,
+        legal_actions: np.ndarray,
+        legal_targets: np.ndarray,
+    ):
+        # AIPlayer draws a uniformly random action (and target) until the combination is valid.
+        # Only stealing from a player without coins is invalid, so a steal is weighted by the
+        # fraction of opponents that can be stolen from
+        weights = legal_actions.astype(np.float64)
+        opponents = engine.state.active[games].sum(axis=1) - 1
+        weights[:, STEAL] *= legal_targets[:, STEAL].sum(axis=1) / opponents
+
+        actions = _pick_weighted(engine.rng, weights)
+        targets = _pick_uniform(engine.rng, legal_targets[np.arange(len(games)), actions])
+        return actions, np.where(targets >= 0, targets, NO_PLAYER)
+
+    def challenge(self, engine, games, seat, claimants, claimed_cards):
+        return engine.rng.random(len(games)) < self.challenge_probability
+
+    def counter(self, engine, games, seat, actions, targets):
+        return engine.rng.random(len(games)) < self.counter_probability
+
+    def discard(self, engine, games, seats):
+        return _pick_uniform(engine.rng, engine.state.hands[games, seats] != NO_CARD)
+
+    def exchange(self, engine, games, seats, cards):
+        # Any two of the cards go back, uniformly at random
+        keys = engine.rng.random(cards.shape)
+        keys[cards == NO_CARD] = 2.0
+        return np.argsort(keys, axis=1)[:, :2]
+
+
+# Cards the heuristic bot would rather keep, most valuable first
+CARD_PRIORITY = np.array(
+    [
+        {
+            CardType.duke: 0,
+            CardType.captain: 1,
+            CardType.assassin: 2,
+            CardType.contessa: 3,
+            CardType.ambassador: 4,
+        }[card_type]
+        for card_type in CARD_CODES
+    ]
+)
+
+
+class HeuristicPolicy(BatchPolicy):
+    """A mostly honest bot: it only claims cards it holds, coups as soon as it can, challenges
+    claims of cards it holds two of and blocks with the right card when it is the target"""
+
+    def __init__(self, bluff_block_probability: float = 0.3):
+        # Chance to bluff a block when the bot is attacked and has no matching card
+        self.bluff_block_probability = bluff_block_probability
+
+    @staticmethod
+    def _holds(engine: VectorizedGameEngine, games, seats, card: int) -> np.ndarray:
+        return (engine.state.hands[games, seats] == card).any(axis=1)
+
+    def choose_actions(self, engine, games, legal_actions, legal_targets):
+        state = engine.state
+        actors = state.current_player[games]
+        rows = np.arange(len(games))
+
+        # Prefer (in order): coup, honest assassinate, honest tax, honest steal, foreign aid
+        preferences = np.zeros_like(legal_actions, dtype=np.float64)
+        preferences[:, INCOME] = 1
+        preferences[:, FOREIGN_AID] = 2
+        preferences[:, EXCHANGE] = 1.5 * self._holds(
+            engine, games, actors, CARD_CODES[CardType.ambassador]
+        )
+        preferences[:, STEAL] = 3 * self._holds(engine, games, actors, CARD_CODES[CardType.captain])
+        preferences[:, TAX] = 4 * self._holds(engine, games, actors, CARD_CODES[CardType.duke])
+        preferences[:, ASSASSINATE] = 5 * self._holds(
+            engine, games, actors, CARD_CODES[CardType.assassin]
+        )
+        preferences[:, COUP] = 6
+        preferences[~legal_actions] = -1
+        actions = preferences.argmax(axis=1)
+
+        # Target the richest opponent (ties broken at random)
+        targets_mask = legal_targets[rows, actions]
+        coins = np.where(
+            targets_mask, state.coins[games] + engine.rng.random(targets_mask.shape), -1
+        )
+        targets = np.where(targets_mask.any(axis=1), coins.argmax(axis=1), NO_PLAYER)
+        return actions, targets
+
+    def challenge(self, engine, games, seat, claimants, claimed_cards):
+        # With 3 copies of every card, holding two makes the claim unlikely to be true
+        hands = engine.state.hands[games, seat]
+        return (hands == claimed_cards[:, None]).sum(axis=1) == 2
+
+    def counter(self, engine, games, seat, actions, targets):
+        hands = engine.state.hands[games, seat]
+        holds = (hands == COUNTER_CARD[actions][:, None]).any(axis=1)
+        attacked = (targets == seat) & (actions != FOREIGN_AID)
+
+        # Bluff a block when losing the last card is on the line
+        last_card = hands[:, 1] == NO_CARD
+        bluff = engine.rng.random(len(games)) < self.bluff_block_probability
+        return (holds & ((actions == FOREIGN_AID) | attacked)) | (attacked & last_card & bluff)
+
+    def discard(self, engine, games, seats):
+        hands = engine.state.hands[games, seats]
+        priority = np.where(hands != NO_CARD, CARD_PRIORITY[hands], -1)
+        return priority.argmax(axis=1)
+
+    def exchange(self, engine, games, seats, cards):
+        priority = np.where(cards != NO_CARD, CARD_PRIORITY[cards], -1)
+        # Return the two least valuable cards
+        return np.argsort(-priority, axis=1, kind="stable")[:, :2]
@@ -0,0 +1,356 @@
+"""Two player endgame tablebase.
+
+Exact values of every heads-up endgame of the open hand game: both players know each other's
+hand, so a claim is only ever made with the card to back it (a bluff would be challenged and
+lost) and every block that can be made is made honestly. The game is then deterministic and is
+solved by retrograde analysis: positions are proven won or lost backwards from the eliminations,
+and whatever is never proven is a draw (the players can keep stealing from each other forever).
+Exchanges draw from the deck and are left out of the moves.
+
+A position is seen from the player to move:
+
+    (coins to move, coins waiting, hand to move, hand waiting)
+
+Nobody can hold more than 12 coins (you must coup from 10), and hands are the 20 multisets of
+one or two cards. Hidden hands are handled at lookup time: `action_values` averages the values
+of the actions over a belief about the opponent's hand, see `hand_weights`.
+
+The table is a fixed header followed by one uint16 per position (outcome, best action and the
+number of turns to the end), memory-mapped when opened. Run
+`python -m src.engine.tablebase <file>` to build it.
+"""
+
+import mmap
+import struct
+import sys
+import time
+from array import array
+from math import comb
+from types import TracebackType
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from src.engine.compact import (
+    ASSASSINATE,
+    CLAIMED_CARD,
+    COUNTER_CARD,
+    COUP,
+    FOREIGN_AID,
+    INCOME,
+    NO_CARD,
+    STEAL,
+    TAX,
+)
+from src.models.action import ActionType
+from src.models.card import HAND_INDEX, HANDS, NUMBER_OF_HANDS, hand_index
+from src.models.legal_actions import (
+    ACTION_BITS,
+    ACTION_MASKS,
+    MAX_COIN_BUCKET,
+    TARGET_MASKS,
+)
+
+MAGIC = b"COUPENDG"
+VERSION = 1
+
+HEADER = struct.Struct("<8sHBBI")
+
+MAX_COINS = 12
+
+NUMBER_OF_POSITIONS = (MAX_COINS + 1) ** 2 * NUMBER_OF_HANDS**2
+
+# The actions searched, exchanges are left out
+SEARCHED_ACTIONS: Tuple[int, ...] = (INCOME, FOREIGN_AID, COUP, TAX, ASSASSINATE, STEAL)
+
+# The player waiting was eliminated
+ELIMINATED = NUMBER_OF_POSITIONS
+
+DRAW, WIN, LOSS = 0, 1, 2
+SCORES = {DRAW: 0.5, WIN: 1.0, LOSS: 0.0}
+
+_STEAL_BIT = ACTION_BITS[ActionType.steal]
+
+
+class Entry(NamedTuple):
+    outcome: int
+    # Action code of the best action, see `SEARCHED_ACTIONS`
+    action: int
+    # Number of turns to the end of the game with best play, 0 for draws
+    turns: int
+
+
+def position_index(coins: int, other_coins: int, hand: int, other_hand: int) -> int:
+    """Index of a position, from the player to move. Hands are indexes in `HANDS`"""
+    coins_index = coins * (MAX_COINS + 1) + other_coins
+    return (coins_index * NUMBER_OF_HANDS + hand) * NUMBER_OF_HANDS + other_hand
+
+
+def _losses(hand: Tuple[int, ...]) -> Optional[List[int]]:
+    """The hands left after discarding either card, None if the player is eliminated"""
+    if len(hand) == 1:
+        return None
+    return [HAND_INDEX[(card,)] for card in set(hand)]
+
+
+def action_outcomes(
+    coins: int, other_coins: int, hand: int, other_hand: int, action: int
+) -> Optional[List[int]]:
+    """The positions the action can lead to, None if it can't be played honestly.
+
+    The player waiting picks the outcome: blocking or not, and which card to discard.
+    `ELIMINATED` stands for the player waiting being eliminated.
+    """
+    if not ACTION_MASKS[min(coins, MAX_COIN_BUCKET)] & 1 << action:
+        return None
+    if action == STEAL and not TARGET_MASKS[other_coins > 0] & _STEAL_BIT:
+        return None
+
+    cards = HANDS[hand]
+    other_cards = HANDS[other_hand]
+    if CLAIMED_CARD[action] != NO_CARD and CLAIMED_CARD[action] not in cards:
+        return None
+
+    can_block = COUNTER_CARD[action] != NO_CARD and COUNTER_CARD[action] in other_cards
+
+    def after(new_coins: int, new_other_coins: int, new_other_hand: int = other_hand) -> int:
+        # The player waiting moves next
+        return position_index(
+            min(new_other_coins, MAX_COINS), min(new_coins, MAX_COINS), new_other_hand, hand
+        )
+
+    if action == INCOME:
+        return [after(coins + 1, other_coins)]
+    if action == TAX:
+        return [after(coins + 3, other_coins)]
+    if action == FOREIGN_AID:
+        outcomes = [after(coins + 2, other_coins)]
+        if can_block:
+            outcomes.append(after(coins, other_coins))
+        return outcomes
+    if action == STEAL:
+        amount = min(other_coins, 2)
+        outcomes = [after(coins + amount, other_coins - amount)]
+        if can_block:
+            outcomes.append(after(coins, other_coins))
+        return outcomes
+
+    # Coups and assassinations
+    coins -= 7 if action == COUP else 3
+    remaining_hands = _losses(other_cards)
+    outcomes = (
+        [ELIMINATED]
+        if remaining_hands is None
+        else [after(coins, other_coins, remaining) for remaining in remaining_hands]
+    )
+    if action == ASSASSINATE and can_block:
+        outcomes.append(after(coins, other_coins))
+    return outcomes
+
+
+def _successor_table() -> Tuple[np.ndarray, np.ndarray]:
+    """Successors of every position per searched action, padded with the first successor,
+    and whether the action can be played"""
+    width = 3
+    successors = np.zeros((NUMBER_OF_POSITIONS, len(SEARCHED_ACTIONS), width), dtype=np.int32)
+    legal = np.zeros((NUMBER_OF_POSITIONS, len(SEARCHED_ACTIONS)), dtype=bool)
+
+    for coins in range(MAX_COINS + 1):
+        for other_coins in range(MAX_COINS + 1):
+            for hand in range(NUMBER_OF_HANDS):
+                for other_hand in range(NUMBER_OF_HANDS):
+                    position = position_index(coins, other_coins, hand, other_hand)
+                    for slot, action in enumerate(SEARCHED_ACTIONS):
+                        outcomes = action_outcomes(coins, other_coins, hand, other_hand, action)
+                        if outcomes is None:
+                            continue
+                        legal[position, slot] = True
+                        successors[position, slot] = outcomes + outcomes[:1] * (
+                            width - len(outcomes)
+                        )
+
+    return successors, legal
+
+
+def solve() -> np.ndarray:
+    """Retrograde analysis of every position, packed as in the table file"""
+    successors, legal = _successor_table()
+
+    # Outcome and turns to the end for the player to move, the extra position is the
+    # eliminated player's: lost
+    outcome = np.full(NUMBER_OF_POSITIONS + 1, DRAW, dtype=np.int8)
+    turns = np.zeros(NUMBER_OF_POSITIONS + 1, dtype=np.int32)
+    outcome[ELIMINATED] = LOSS
+
+    depth = 0
+    while True:
+        depth += 1
+        replies = outcome[successors]
+        unknown = outcome[:NUMBER_OF_POSITIONS] == DRAW
+
+        # Won if an action leaves the opponent lost whatever they choose, lost if every
+        # action lets the opponent win
+        winning = legal & (replies == LOSS).all(axis=2)
+        losing = ~legal | (replies == WIN).any(axis=2)
+        won = unknown & winning.any(axis=1)
+        lost = unknown & losing.all(axis=1)
+        if not won.any() and not lost.any():
+            break
+
+        outcome[:NUMBER_OF_POSITIONS][won] = WIN
+        outcome[:NUMBER_OF_POSITIONS][lost] = LOSS
+        turns[:NUMBER_OF_POSITIONS][won | lost] = depth
+
+    # Best action: win fastest, lose slowest, and never let the opponent win from a draw.
+    # The opponent picks the outcome that is worst for us
+    horizon = depth + 1
+    scores = np.where(
+        outcome == LOSS, horizon - turns, np.where(outcome == WIN, turns - horizon, 0)
+    )
+    action_scores = scores[successors].min(axis=2)
+    action_scores[~legal] = -2 * horizon
+    best = np.array(SEARCHED_ACTIONS, dtype=np.uint16)[action_scores.argmax(axis=1)]
+
+    outcome = outcome[:NUMBER_OF_POSITIONS].astype(np.uint16)
+    turns = np.minimum(turns[:NUMBER_OF_POSITIONS], 0x7FF).astype(np.uint16)
+    return outcome | best << 2 | turns << 5
+
+
+def build(path: str) -> None:
+    """Solve every position and write the table"""
+    entries = solve().astype("<u2")
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, MAX_COINS, NUMBER_OF_HANDS, NUMBER_OF_POSITIONS))
+        file.write(entries.tobytes())
+
+
+def hand_weights(unseen: Sequence[int], hand_size: int) -> List[float]:
+    """Probability of every hand in `HANDS` for a hand of `hand_size` cards dealt from the
+    unseen cards, given as counts per card type"""
+    total = comb(sum(unseen), hand_size)
+    weights = [0.0] * NUMBER_OF_HANDS
+    if not total:
+        return weights
+
+    for index, hand in enumerate(HANDS):
+        if len(hand) != hand_size:
+            continue
+        ways = 1
+        for card in set(hand):
+            ways *= comb(unseen[card], hand.count(card))
+        weights[index] = ways / total
+    return weights
+
+
+class Tablebase:
+    """A memory-mapped endgame table. Every lookup is a single read from the mapped file"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, max_coins, number_of_hands, number_of_positions = HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an endgame table")
+        if (version, max_coins, number_of_hands, number_of_positions) != (
+            VERSION,
+            MAX_COINS,
+            NUMBER_OF_HANDS,
+            NUMBER_OF_POSITIONS,
+        ):
+            raise ValueError(f"{path} was built for another version of the game")
+
+        self._view = memoryview(self._mmap)
+        offset = HEADER.size
+        entries = self._view[offset:]
+        if sys.byteorder == "little":
+            self._entries = entries.cast("H")
+        else:
+            self._entries = array("H", entries)
+            self._entries.byteswap()
+
+    def probe(
+        self, coins: int, other_coins: int, cards: Sequence[int], other_cards: Sequence[int]
+    ) -> Entry:
+        """The entry of a position, from the player to move. Cards are card codes"""
+        return self._entry(
+            position_index(
+                min(coins, MAX_COINS),
+                min(other_coins, MAX_COINS),
+                hand_index(cards),
+                hand_index(other_cards),
+            )
+        )
+
+    def action_values(
+        self,
+        coins: int,
+        other_coins: int,
+        cards: Sequence[int],
+        other_hand_weights: Sequence[float],
+    ) -> Dict[int, float]:
+        """Expected score (1 for a win, 0.5 for a draw) of every action we can play honestly,
+        over a belief about the opponent's hand (weights per hand in `HANDS`)"""
+        coins = min(coins, MAX_COINS)
+        other_coins = min(other_coins, MAX_COINS)
+        hand = hand_index(cards)
+
+        values: Dict[int, float] = {}
+        for other_hand, weight in enumerate(other_hand_weights):
+            if not weight:
+                continue
+            for action in SEARCHED_ACTIONS:
+                outcomes = action_outcomes(coins, other_coins, hand, other_hand, action)
+                if outcomes is None:
+                    continue
+                # The opponent picks the outcome that is worst for us
+                score = min(
+                    1.0 if outcome == ELIMINATED else 1.0 - SCORES[self._entry(outcome).outcome]
+                    for outcome in outcomes
+                )
+                values[action] = values.get(action, 0.0) + weight * score
+        return values
+
+    def _entry(self, position: int) -> Entry:
+        packed = self._entries[position]
+        return Entry(packed & 3, packed >> 2 & 7, packed >> 5)
+
+    def close(self) -> None:
+        if isinstance(self._entries, memoryview):
+            self._entries.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "Tablebase":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def main():
+    path = sys.argv[1]
+    start = time.perf_counter()
+    build(path)
+    elapsed = time.perf_counter() - start
+
+    with Tablebase(path) as tablebase:
+        outcomes = [0, 0, 0]
+        for position in range(NUMBER_OF_POSITIONS):
+            outcomes[tablebase._entry(position).outcome] += 1
+
+    print(f"{NUMBER_OF_POSITIONS:,} positions solved in {elapsed:.1f}s")
+    for name, outcome in (("won", WIN), ("lost", LOSS), ("drawn", DRAW)):
+        print(f"{name:<6} {outcomes[outcome]:>8,}")
+
+
+if __name__ == "__main__":
+    main()
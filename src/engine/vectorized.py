@@ -0,0 +1,548 @@
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from src.models.action import (
+    ACTION_CODES,
+    ACTION_TYPES,
+    ActionType,
+    AssassinateAction,
+    CoupAction,
+    ExchangeAction,
+    ForeignAidAction,
+    IncomeAction,
+    StealAction,
+    TaxAction,
+    get_counter_action,
+)
+from src.models.card import CARD_CODES, CARD_TYPES, build_deck
+from src.models.legal_actions import ACTION_MASKS, MAX_COIN_BUCKET, TARGET_MASKS
+
+NO_CARD = -1
+NO_PLAYER = -1
+
+NUMBER_OF_CARD_TYPES = len(CARD_TYPES)
+NUMBER_OF_ACTION_TYPES = len(ACTION_TYPES)
+
+INCOME = ACTION_CODES[ActionType.income]
+FOREIGN_AID = ACTION_CODES[ActionType.foreignaid]
+COUP = ACTION_CODES[ActionType.coup]
+TAX = ACTION_CODES[ActionType.tax]
+ASSASSINATE = ACTION_CODES[ActionType.assassinate]
+STEAL = ACTION_CODES[ActionType.steal]
+EXCHANGE = ACTION_CODES[ActionType.exchange]
+
+# Per action code tables, derived from the action models so the rules can't drift apart
+_ACTIONS = sorted(
+    (
+        IncomeAction(),
+        ForeignAidAction(),
+        CoupAction(),
+        TaxAction(),
+        AssassinateAction(),
+        StealAction(),
+        ExchangeAction(),
+    ),
+    key=lambda action: ACTION_CODES[action.action_type],
+)
+REQUIRES_TARGET = np.array([action.requires_target for action in _ACTIONS])
+CAN_BE_CHALLENGED = np.array([action.can_be_challenged for action in _ACTIONS])
+CAN_BE_COUNTERED = np.array([action.can_be_countered for action in _ACTIONS])
+CLAIMED_CARD = np.array(
+    [
+        CARD_CODES[action.associated_card_type] if action.associated_card_type else NO_CARD
+        for action in _ACTIONS
+    ],
+    dtype=np.int8,
+)
+COUNTER_CARD = np.array(
+    [
+        (
+            CARD_CODES[get_counter_action(action.action_type).associated_card_type]
+            if action.can_be_countered
+            else NO_CARD
+        )
+        for action in _ACTIONS
+    ],
+    dtype=np.int8,
+)
+
+
+def _mask_table(masks) -> np.ndarray:
+    return np.array(
+        [[bool(mask >> code & 1) for code in range(NUMBER_OF_ACTION_TYPES)] for mask in masks]
+    )
+
+
+# The legal move tables as arrays: legal actions per coin bucket, and actions that can be used
+# against a player per "has coins" flag
+ACTION_MASK_TABLE = _mask_table(ACTION_MASKS)
+TARGET_MASK_TABLE = _mask_table(TARGET_MASKS)
+
+DECK_CARDS = np.array([CARD_CODES[card.card_type] for card in build_deck()], dtype=np.int8)
+CARD_COPIES = np.bincount(DECK_CARDS, minlength=NUMBER_OF_CARD_TYPES)
+TOTAL_COINS = 50
+
+# Challenge outcomes, mirroring ChallengeResult in the game handler
+NO_CHALLENGE, CHALLENGE_FAILED, CHALLENGE_SUCCEEDED = 0, 1, 2
+
+
+class BatchGameState:
+    """Struct-of-arrays state of a batch of games, one row per game.
+
+    Hands are stored in two slots per player, filled from the left, with NO_CARD in empty slots.
+    The court deck is only kept as per card type counts: every draw in the game is a uniform draw
+    from the shuffled deck, so the order of the cards carries no information. `revealed` counts
+    the lost cards of every type.
+    """
+
+    def __init__(self, number_of_games: int, number_of_players: int):
+        self.number_of_games = number_of_games
+        self.number_of_players = number_of_players
+
+        self.coins = np.zeros((number_of_games, number_of_players), dtype=np.int16)
+        self.hands = np.full((number_of_games, number_of_players, 2), NO_CARD, dtype=np.int8)
+        self.active = np.zeros((number_of_games, number_of_players), dtype=bool)
+        self.deck = np.zeros((number_of_games, NUMBER_OF_CARD_TYPES), dtype=np.int16)
+        self.revealed = np.zeros((number_of_games, NUMBER_OF_CARD_TYPES), dtype=np.int16)
+        self.treasury = np.zeros(number_of_games, dtype=np.int16)
+        self.current_player = np.zeros(number_of_games, dtype=np.int64)
+        self.turns = np.zeros(number_of_games, dtype=np.int32)
+        self.done = np.zeros(number_of_games, dtype=bool)
+        self.winner = np.full(number_of_games, NO_PLAYER, dtype=np.int64)
+
+    def hand_sizes(self, games: np.ndarray) -> np.ndarray:
+        return (self.hands[games] != NO_CARD).sum(axis=-1)
+
+    def copy(self) -> "BatchGameState":
+        state = BatchGameState.__new__(BatchGameState)
+        for name, value in vars(self).items():
+            setattr(state, name, value.copy() if isinstance(value, np.ndarray) else value)
+        return state
+
+
+class BatchPolicy:
+    """Array valued decision policy for one seat of the vectorized engine.
+
+    Every method decides for many games at once: `games` holds the row indices of the games that
+    need the decision and the return value has one entry per game.
+    """
+
+    def choose_actions(
+        self,
+        engine: "VectorizedGameEngine",
+        games: np.ndarray,
+        legal_actions: np.ndarray,
+        legal_targets: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Pick an action code and a target seat (NO_PLAYER if untargeted) per game.
+        `legal_actions` is (n, actions) and `legal_targets` is (n, actions, players)"""
+        raise NotImplementedError
+
+    def challenge(
+        self,
+        engine: "VectorizedGameEngine",
+        games: np.ndarray,
+        seat: int,
+        claimants: np.ndarray,
+        claimed_cards: np.ndarray,
+    ) -> np.ndarray:
+        """Whether `seat` challenges the claimant's claim of the given card in each game"""
+        raise NotImplementedError
+
+    def counter(
+        self,
+        engine: "VectorizedGameEngine",
+        games: np.ndarray,
+        seat: int,
+        actions: np.ndarray,
+        targets: np.ndarray,
+    ) -> np.ndarray:
+        """Whether `seat` counters the current player's action in each game"""
+        raise NotImplementedError
+
+    def discard(
+        self, engine: "VectorizedGameEngine", games: np.ndarray, seats: np.ndarray
+    ) -> np.ndarray:
+        """Which hand slot each player loses"""
+        raise NotImplementedError
+
+    def exchange(
+        self,
+        engine: "VectorizedGameEngine",
+        games: np.ndarray,
+        seats: np.ndarray,
+        cards: np.ndarray,
+    ) -> np.ndarray:
+        """Which two positions of the (n, 4) hand plus drawn cards go back to the deck.
+        Unused positions hold NO_CARD"""
+        raise NotImplementedError
+
+
+class BatchResult:
+    def __init__(self, winners: np.ndarray, turns: np.ndarray, action_counts: np.ndarray):
+        self.winners = winners
+        self.turns = turns
+        # (games, players, actions) count of every action declared by every seat
+        self.action_counts = action_counts
+
+    @property
+    def number_of_games(self) -> int:
+        return len(self.winners)
+
+    def wins_per_seat(self, number_of_players: int) -> np.ndarray:
+        finished = self.winners[self.winners != NO_PLAYER]
+        return np.bincount(finished, minlength=number_of_players)
+
+
+class BatchEngine:
+    """The state of a batch of games with the helpers shared by the batch engines: dealing,
+    deck and hand updates, coins, legal actions and the end of a turn"""
+
+    def __init__(
+        self,
+        number_of_games: int,
+        number_of_players: int,
+        seed: Optional[Union[int, np.random.SeedSequence]] = None,
+    ):
+        if not 2 <= number_of_players <= 6:
+            raise ValueError("The court deck supports 2 to 6 players")
+
+        self.rng = np.random.default_rng(seed)
+        self.state = BatchGameState(number_of_games, number_of_players)
+        self._seats = np.arange(number_of_players)
+
+    def _deal(self, games: np.ndarray) -> None:
+        """Set up new games in the given rows"""
+        state = self.state
+        number_of_players = state.number_of_players
+
+        # Deal from a shuffled deck: the first 2 cards of every permutation go to each player
+        order = np.argsort(self.rng.random((len(games), len(DECK_CARDS))), axis=1)
+        shuffled = DECK_CARDS[order]
+        dealt = 2 * number_of_players
+        state.hands[games] = shuffled[:, :dealt].reshape(len(games), number_of_players, 2)
+        state.deck[games] = (
+            shuffled[:, dealt:, None] == np.arange(NUMBER_OF_CARD_TYPES, dtype=np.int8)
+        ).sum(axis=1)
+        state.revealed[games] = 0
+
+        state.coins[games] = 2
+        state.treasury[games] = TOTAL_COINS - 2 * number_of_players
+        state.active[games] = True
+        state.current_player[games] = 0
+        state.turns[games] = 0
+        state.done[games] = False
+        state.winner[games] = NO_PLAYER
+
+    # Deck and hand helpers. Every helper takes unique game rows
+
+    def _draw(self, games: np.ndarray) -> np.ndarray:
+        deck = self.state.deck
+        counts = deck[games]
+        draws = self.rng.integers(0, counts.sum(axis=1))
+        cards = (draws[:, None] >= counts.cumsum(axis=1)).sum(axis=1)
+        deck[games, cards] -= 1
+        return cards.astype(np.int8)
+
+    def _return_cards(self, games: np.ndarray, cards: np.ndarray) -> None:
+        self.state.deck[games, cards] += 1
+
+    def _add_card(self, games: np.ndarray, seats: np.ndarray, cards: np.ndarray) -> None:
+        hands = self.state.hands
+        slots = (hands[games, seats] != NO_CARD).sum(axis=1)
+        hands[games, seats, slots] = cards
+
+    def _remove_slot(self, games: np.ndarray, seats: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        hands = self.state.hands
+        removed = hands[games, seats, slots]
+        # Keep the hand left aligned
+        first = slots == 0
+        hands[games[first], seats[first], 0] = hands[games[first], seats[first], 1]
+        hands[games, seats, 1] = NO_CARD
+        return removed
+
+    def _take_coins_from_treasury(self, games: np.ndarray, seats: np.ndarray, amount: int):
+        state = self.state
+        coins = np.minimum(state.treasury[games], amount)
+        state.treasury[games] -= coins
+        state.coins[games, seats] += coins
+
+    def _give_coins_to_treasury(self, games: np.ndarray, seats: np.ndarray, amount):
+        state = self.state
+        state.treasury[games] += amount
+        state.coins[games, seats] -= amount
+
+    # Legal moves
+
+    def legal_actions(self, games: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(n, actions) legal action mask and (n, actions, players) legal target mask"""
+        state = self.state
+        actors = state.current_player[games]
+        legal = ACTION_MASK_TABLE[np.minimum(state.coins[games, actors], MAX_COIN_BUCKET)]
+
+        opponents = state.active[games] & (self._seats != actors[:, None])
+        targets = TARGET_MASK_TABLE[(state.coins[games] > 0).astype(np.int64)].transpose(0, 2, 1)
+        targets &= opponents[:, None, :] & legal[:, :, None]
+
+        legal &= ~REQUIRES_TARGET | targets.any(axis=2)
+        return legal, targets
+
+    # Turn phases
+
+    def _end_turn(self, games: np.ndarray) -> None:
+        state = self.state
+
+        # Remove defeated players, their coins go back to the treasury
+        defeated = state.active[games] & (state.hands[games, :, 0] == NO_CARD)
+        defeated_games, defeated_seats = np.nonzero(defeated)
+        defeated_games = games[defeated_games]
+        state.active[defeated_games, defeated_seats] = False
+        np.add.at(state.treasury, defeated_games, state.coins[defeated_games, defeated_seats])
+        state.coins[defeated_games, defeated_seats] = 0
+
+        state.turns[games] += 1
+
+        won = state.active[games].sum(axis=1) == 1
+        state.done[games[won]] = True
+        state.winner[games[won]] = state.active[games[won]].argmax(axis=1)
+
+        # Next active player after the current one
+        games = games[~won]
+        candidates = (state.current_player[games, None] + 1 + self._seats) % state.number_of_players
+        next_active = state.active[games[:, None], candidates].argmax(axis=1)
+        state.current_player[games] = candidates[np.arange(len(games)), next_active]
+
+
+class VectorizedGameEngine(BatchEngine):
+    """Plays a batch of games in lock-step, one full turn of every unfinished game per step.
+
+    The rules follow ResistanceCoupGameHandler.handle_turn: players are polled for challenges and
+    counters in seat order and the first one to accept wins, a failed challenge lets the action
+    resolve without a counter phase, anyone but the countering player may challenge a counter,
+    and players who lost their last card mid-turn are not polled any more.
+    """
+
+    def __init__(
+        self,
+        number_of_games: int,
+        number_of_players: int,
+        policies: Union[BatchPolicy, Sequence[BatchPolicy]],
+        seed: Optional[Union[int, np.random.SeedSequence]] = None,
+    ):
+        super().__init__(number_of_games, number_of_players, seed)
+
+        if isinstance(policies, BatchPolicy):
+            policies = [policies] * number_of_players
+        if len(policies) != number_of_players:
+            raise ValueError("Provide one policy per seat")
+
+        self.policies = list(policies)
+        self.action_counts = np.zeros(
+            (number_of_games, number_of_players, NUMBER_OF_ACTION_TYPES), dtype=np.int32
+        )
+
+    def reset(self) -> None:
+        self._deal(np.arange(self.state.number_of_games))
+        self.action_counts[:] = 0
+
+    def run(self, max_turns: int = 1000) -> BatchResult:
+        """Play every game of the batch to the end. Games still running after `max_turns` turns
+        are stopped without a winner"""
+        self.reset()
+        while not self.state.done.all():
+            self.step()
+            self.state.done |= self.state.turns >= max_turns
+
+        return BatchResult(
+            self.state.winner.copy(), self.state.turns.copy(), self.action_counts.copy()
+        )
+
+    # Turn phases
+
+    def _lose_influence(self, games: np.ndarray, seats: np.ndarray) -> None:
+        """The players choose a card to lose (if they have any left)"""
+        has_cards = self.state.hands[games, seats, 0] != NO_CARD
+        games, seats = games[has_cards], seats[has_cards]
+        slots = np.zeros(len(games), dtype=np.int64)
+        for seat in np.unique(seats):
+            rows = seats == seat
+            slots[rows] = self.policies[seat].discard(self, games[rows], seats[rows])
+        cards = self._remove_slot(games, seats, slots)
+        self.state.revealed[games, cards] += 1
+
+    def _choose_actions(self, games: np.ndarray, actors: np.ndarray):
+        legal, legal_targets = self.legal_actions(games)
+        actions = np.zeros(len(games), dtype=np.int64)
+        targets = np.full(len(games), NO_PLAYER, dtype=np.int64)
+        for seat in np.unique(actors):
+            rows = actors == seat
+            actions[rows], targets[rows] = self.policies[seat].choose_actions(
+                self, games[rows], legal[rows], legal_targets[rows]
+            )
+        return actions, targets
+
+    def _first_in_seat_order(self, eligible: np.ndarray, decide) -> np.ndarray:
+        """Ask every eligible seat and return the first seat (in seat order) that accepts"""
+        accepts = np.zeros_like(eligible)
+        for seat in range(self.state.number_of_players):
+            rows = eligible[:, seat]
+            if rows.any():
+                accepts[rows, seat] = decide(self.policies[seat], seat, rows)
+
+        return np.where(accepts.any(axis=1), accepts.argmax(axis=1), NO_PLAYER)
+
+    def _pollable(self, games: np.ndarray, excluded: np.ndarray) -> np.ndarray:
+        state = self.state
+        has_cards = state.active[games] & (state.hands[games, :, 0] != NO_CARD)
+        return has_cards & (self._seats != excluded[:, None])
+
+    def _challenge_phase(
+        self, games: np.ndarray, claimants: np.ndarray, claimed_cards: np.ndarray
+    ) -> np.ndarray:
+        # Every copy of the claimed card is revealed: the handler calls the bluff without a poll
+        impossible = self.state.revealed[games, claimed_cards] >= CARD_COPIES[claimed_cards]
+        pollable = self._pollable(games, claimants)
+        pollable[impossible] = False
+        challengers = self._first_in_seat_order(
+            pollable,
+            lambda policy, seat, rows: policy.challenge(
+                self, games[rows], seat, claimants[rows], claimed_cards[rows]
+            ),
+        )
+        results = np.full(len(games), NO_CHALLENGE, dtype=np.int8)
+
+        challenged = impossible | (challengers != NO_PLAYER)
+        games, claimants = games[challenged], claimants[challenged]
+        challengers, claimed_cards = challengers[challenged], claimed_cards[challenged]
+
+        hands = self.state.hands[games, claimants]
+        has_card = (hands == claimed_cards[:, None]).any(axis=1)
+
+        # The claimant reveals the card, the challenger loses influence and the claimant shuffles
+        # the revealed card back into the deck for a new one
+        revealed_slots = (hands[has_card] != claimed_cards[has_card, None]).argmin(axis=1)
+        failed_games, failed_claimants = games[has_card], claimants[has_card]
+        revealed = self._remove_slot(failed_games, failed_claimants, revealed_slots)
+        self._lose_influence(failed_games, challengers[has_card])
+        self._return_cards(failed_games, revealed)
+        self._add_card(failed_games, failed_claimants, self._draw(failed_games))
+
+        # The claimant bluffed and loses influence
+        self._lose_influence(games[~has_card], claimants[~has_card])
+
+        results[np.flatnonzero(challenged)] = np.where(
+            has_card, CHALLENGE_FAILED, CHALLENGE_SUCCEEDED
+        )
+        return results
+
+    def _counter_phase(
+        self, games: np.ndarray, actors: np.ndarray, actions: np.ndarray, targets: np.ndarray
+    ) -> np.ndarray:
+        """Return whether each action ends up countered"""
+        counterers = self._first_in_seat_order(
+            self._pollable(games, actors),
+            lambda policy, seat, rows: policy.counter(
+                self, games[rows], seat, actions[rows], targets[rows]
+            ),
+        )
+        countered = counterers != NO_PLAYER
+
+        # Opportunity to challenge the counter
+        rows = np.flatnonzero(countered)
+        results = self._challenge_phase(games[rows], counterers[rows], COUNTER_CARD[actions[rows]])
+        countered[rows] = results != CHALLENGE_SUCCEEDED
+        return countered
+
+    def _exchange(self, games: np.ndarray, seats: np.ndarray) -> None:
+        hands = self.state.hands
+        cards = np.concatenate(
+            [hands[games, seats], self._draw(games)[:, None], self._draw(games)[:, None]],
+            axis=1,
+        )
+        returned = np.zeros((len(games), 2), dtype=np.int64)
+        for seat in np.unique(seats):
+            rows = seats == seat
+            returned[rows] = self.policies[seat].exchange(
+                self, games[rows], seats[rows], cards[rows]
+            )
+
+        rows = np.arange(len(games))[:, None]
+        self._return_cards(games, cards[rows, returned][:, 0])
+        self._return_cards(games, cards[rows, returned][:, 1])
+
+        kept = cards != NO_CARD
+        kept[rows, returned] = False
+        # Left align the kept cards into the hand slots
+        order = np.argsort(~kept, axis=1, kind="stable")[:, :2]
+        hands[games, seats] = np.where(kept[rows, order], cards[rows, order], NO_CARD)
+
+    def _execute_actions(
+        self,
+        games: np.ndarray,
+        actors: np.ndarray,
+        actions: np.ndarray,
+        targets: np.ndarray,
+        countered: np.ndarray,
+    ) -> None:
+        state = self.state
+
+        rows = actions == INCOME
+        self._take_coins_from_treasury(games[rows], actors[rows], 1)
+
+        rows = (actions == FOREIGN_AID) & ~countered
+        self._take_coins_from_treasury(games[rows], actors[rows], 2)
+
+        rows = actions == TAX
+        self._take_coins_from_treasury(games[rows], actors[rows], 3)
+
+        rows = actions == COUP
+        self._give_coins_to_treasury(games[rows], actors[rows], 7)
+        self._lose_influence(games[rows], targets[rows])
+
+        rows = actions == ASSASSINATE
+        self._give_coins_to_treasury(games[rows], actors[rows], 3)
+        rows &= ~countered
+        self._lose_influence(games[rows], targets[rows])
+
+        rows = (actions == STEAL) & ~countered
+        stealing_games, thieves, victims = games[rows], actors[rows], targets[rows]
+        amounts = np.minimum(state.coins[stealing_games, victims], 2)
+        state.coins[stealing_games, victims] -= amounts
+        state.coins[stealing_games, thieves] += amounts
+
+        rows = actions == EXCHANGE
+        self._exchange(games[rows], actors[rows])
+
+    def step(self) -> None:
+        """Play one turn in every unfinished game"""
+        state = self.state
+        games = np.flatnonzero(~state.done)
+        if not len(games):
+            return
+
+        actors = state.current_player[games]
+        actions, targets = self._choose_actions(games, actors)
+        self.action_counts[games, actors, actions] += 1
+
+        # Opportunity to challenge the action
+        challenge_results = np.full(len(games), NO_CHALLENGE, dtype=np.int8)
+        rows = np.flatnonzero(CAN_BE_CHALLENGED[actions])
+        challenge_results[rows] = self._challenge_phase(
+            games[rows], actors[rows], CLAIMED_CARD[actions[rows]]
+        )
+
+        # Opportunity to counter unchallenged actions
+        countered = np.zeros(len(games), dtype=bool)
+        rows = np.flatnonzero((challenge_results == NO_CHALLENGE) & CAN_BE_COUNTERED[actions])
+        countered[rows] = self._counter_phase(
+            games[rows], actors[rows], actions[rows], targets[rows]
+        )
+
+        # Successfully challenged actions do not take place
+        rows = challenge_results != CHALLENGE_SUCCEEDED
+        self._execute_actions(
+            games[rows], actors[rows], actions[rows], targets[rows], countered[rows]
+        )
+
+        self._end_turn(games)
@@ -0,0 +1,84 @@
+"""Statistical check of the deck's draw distribution.
+
+Run with `python -m src.handler.deck_uniformity [draws]`. Every card of the deck is made
+distinguishable, the deck goes through the same draw and put back sequence as an exchange (the
+drawn cards are returned in the order they were drawn) and the next pairs of draws are counted.
+If draws are uniform whatever the history, every card is equally likely on the first draw and
+every ordered pair of distinct cards is equally likely on two draws in a row, which is the
+distribution of the top 2 cards of a freshly shuffled deck. Both are checked with a chi-squared
+goodness of fit test.
+"""
+
+import math
+import random
+import sys
+from typing import List, Sequence, Tuple
+
+from src.models.card import DECK_COMPOSITION, Card
+from src.models.deck import Deck
+
+SIGNIFICANCE_LEVEL = 0.001
+
+
+def chi_squared(observed: Sequence[int], expected: float) -> Tuple[float, float]:
+    """Chi-squared statistic of counts against a uniform expectation and its p-value, using the
+    Wilson-Hilferty approximation (accurate for the degrees of freedom used here)"""
+    statistic = sum((count - expected) ** 2 / expected for count in observed)
+    dof = len(observed) - 1
+
+    z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    return statistic, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def count_draws(number_of_draws: int, seed: int = 0) -> Tuple[List[int], List[List[int]]]:
+    """Count the first card and the ordered pair of cards drawn after every exchange"""
+    cards = [Card(card_type) for card_type in DECK_COMPOSITION]
+    index_of = {id(card): index for index, card in enumerate(cards)}
+    deck = Deck(random.Random(seed), cards)
+
+    singles = [0] * len(cards)
+    pairs = [[0] * len(cards) for _ in cards]
+    for _ in range(number_of_draws // 4):
+        # Exchange
+        first, second = deck.draw(), deck.draw()
+        deck.put_back(first)
+        deck.put_back(second)
+
+        first, second = deck.draw(), deck.draw()
+        singles[index_of[id(first)]] += 1
+        pairs[index_of[id(first)]][index_of[id(second)]] += 1
+        deck.put_back(first)
+        deck.put_back(second)
+
+    return singles, pairs
+
+
+def main():
+    number_of_draws = int(sys.argv[1]) if len(sys.argv) > 1 else 4_000_000
+    singles, pairs = count_draws(number_of_draws)
+
+    trials = sum(singles)
+    number_of_cards = len(singles)
+    ordered_pairs = [
+        count
+        for first, row in enumerate(pairs)
+        for second, count in enumerate(row)
+        if first != second
+    ]
+    results = [
+        ("first draw", *chi_squared(singles, trials / number_of_cards)),
+        ("pair of draws", *chi_squared(ordered_pairs, trials / len(ordered_pairs))),
+    ]
+
+    print(f"{number_of_draws:,} draws")
+    uniform = True
+    for name, statistic, p_value in results:
+        print(f"{name:<15} chi-squared {statistic:10.2f}  p-value {p_value:.4f}")
+        uniform &= p_value >= SIGNIFICANCE_LEVEL
+
+    print("uniform" if uniform else f"NOT uniform (p < {SIGNIFICANCE_LEVEL})")
+    sys.exit(0 if uniform else 1)
+
+
+if __name__ == "__main__":
+    main()
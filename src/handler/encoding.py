@@ -0,0 +1,142 @@
+"""Fixed-size numeric observations of a game, as seen by one player.
+
+The encoder turns a player's information set into a flat float32 vector: their own cards, the
+coins and the number of cards of every player, the cards revealed so far, the phase of the turn
+and the last `history` events of the typed event log. Seats are listed from the viewer's on, so
+the same vector means the same situation whatever seat the viewer has.
+
+Observations are written into arrays owned by the caller: `encode_batch` fills one row per game
+of a preallocated (games, size) array, so encoding a batch doesn't allocate any arrays.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.handler.game_handler import CARD_COPIES, GamePhase, ResistanceCoupGameHandler
+from src.models.card import CARD_CODES, CARD_TYPES
+from src.utils.event_log import NO_SEAT, EventLog, EventType, decode_fields
+
+NUMBER_OF_CARD_TYPES = len(CARD_TYPES)
+NUMBER_OF_EVENT_TYPES = len(EventType)
+NUMBER_OF_GAME_PHASES = len(GamePhase)
+
+# Events remembered by default, about two turns of a four player game
+HISTORY = 16
+# Event arguments are action codes, card codes or numbers of coins
+MAX_EVENT_ARG = 7
+MAX_COINS = 12
+
+
+class ObservationEncoder:
+    """Encodes games with `number_of_players` players, see the module docstring.
+
+    The layout of a vector, with P players and K remembered events:
+
+        hand:       copies of every card type in the viewer's hand
+        coins:      coins of every player / MAX_COINS, P values
+        influence:  number of cards of every player / 2, P values
+        revealed:   cards of every type lost so far / copies in the deck
+        phase:      one-hot `GamePhase`
+        events:     K events, the most recent first, each a one-hot event type, actor, target and
+                    argument. Missing events (early in the game) are all zeros
+    """
+
+    __slots__ = (
+        "number_of_players",
+        "history",
+        "hand_offset",
+        "coins_offset",
+        "influence_offset",
+        "revealed_offset",
+        "phase_offset",
+        "events_offset",
+        "event_size",
+        "size",
+    )
+
+    def __init__(self, number_of_players: int, history: int = HISTORY):
+        self.number_of_players = number_of_players
+        self.history = history
+
+        self.hand_offset = 0
+        self.coins_offset = self.hand_offset + NUMBER_OF_CARD_TYPES
+        self.influence_offset = self.coins_offset + number_of_players
+        self.revealed_offset = self.influence_offset + number_of_players
+        self.phase_offset = self.revealed_offset + NUMBER_OF_CARD_TYPES
+        self.events_offset = self.phase_offset + NUMBER_OF_GAME_PHASES
+        self.event_size = NUMBER_OF_EVENT_TYPES + 2 * number_of_players + MAX_EVENT_ARG + 1
+        self.size = self.events_offset + history * self.event_size
+
+    def empty(self, number_of_games: Optional[int] = None) -> np.ndarray:
+        """A zeroed array for one observation, or a batch of them"""
+        shape = (self.size,) if number_of_games is None else (number_of_games, self.size)
+        return np.zeros(shape, dtype=np.float32)
+
+    def encode(
+        self,
+        game: ResistanceCoupGameHandler,
+        seat: int,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """The observation of the player in `seat`, written into `out` if given"""
+        if out is None:
+            out = self.empty()
+        else:
+            out.fill(0.0)
+
+        # Setting items through a memoryview is a lot cheaper than through the array
+        values = memoryview(out)
+        players = game.players
+        number_of_players = self.number_of_players
+        for card in players[seat].cards:
+            values[self.hand_offset + CARD_CODES[card.card_type]] += 1.0
+
+        for offset in range(number_of_players):
+            player = players[(seat + offset) % number_of_players]
+            values[self.coins_offset + offset] = player.coins / MAX_COINS
+            values[self.influence_offset + offset] = len(player.cards) / 2
+
+        for code, count in enumerate(game.revealed_cards):
+            if count:
+                values[self.revealed_offset + code] = count / CARD_COPIES[code]
+
+        values[self.phase_offset + game.phase.value] = 1.0
+        self._encode_events(values, seat, game.round_history.log)
+        return out
+
+    def encode_batch(
+        self,
+        games: Sequence[ResistanceCoupGameHandler],
+        seats: Sequence[int],
+        out: np.ndarray,
+    ) -> np.ndarray:
+        """Encode one game per row of `out` (at least as many rows as games), from the
+        viewpoint of the seat given for it"""
+        if len(out) < len(games):
+            raise ValueError(f"Expected an array of at least {len(games)} rows")
+
+        for row, (game, seat) in enumerate(zip(games, seats)):
+            self.encode(game, seat, out[row])
+        return out
+
+    def _encode_events(self, values: memoryview, seat: int, log: EventLog) -> None:
+        number_of_players = self.number_of_players
+        event_size = self.event_size
+        actor_offset = NUMBER_OF_EVENT_TYPES
+        target_offset = actor_offset + number_of_players
+        arg_offset = target_offset + number_of_players
+
+        stop = len(log)
+        start = max(stop - self.history, log.first_sequence)
+        # The most recent event goes first
+        offset = self.events_offset + (stop - start - 1) * event_size
+        for code in log.codes(start, stop):
+            event_type, actor, target, arg = decode_fields(code)
+            values[offset + event_type] = 1.0
+            if actor != NO_SEAT:
+                values[offset + actor_offset + (actor - seat) % number_of_players] = 1.0
+            if target != NO_SEAT:
+                values[offset + target_offset + (target - seat) % number_of_players] = 1.0
+            values[offset + arg_offset + min(arg, MAX_EVENT_ARG)] = 1.0
+            offset -= event_size
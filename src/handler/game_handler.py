@@ -1,14 +1,26 @@
 import random
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
 from enum import Enum
-from typing import List, Optional, Tuple, Union
+from functools import wraps
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type, Union
 
 import names
 
-from src.models.action import Action, ActionType, CounterAction, get_counter_action
-from src.models.card import Card, build_deck
+from src.models.action import ACTION_CODES, Action, ActionType, get_counter_action
+from src.models.card import CARD_CODES, CARD_TYPES, DECK_COMPOSITION, Card, CardType
+from src.models.deck import Deck, DeckSnapshot
+from src.models.legal_actions import (
+    ACTION_BITS,
+    DecisionType,
+    is_legal_against,
+    legal_action_mask,
+)
 from src.models.players.base import BasePlayer
-from src.models.players.gpt import GPTPlayer
+from src.utils.beliefs import BeliefTracker
+from src.utils.event_log import NO_SEAT, EventType
 from src.utils.game_state import generate_players_table, generate_state_panel
+from src.utils.observation import ObservationCache
 from src.utils.print import (
     build_action_report_string,
     build_counter_report_string,
@@ -17,9 +29,14 @@ from src.utils.print import (
     print_table,
     print_text,
     print_texts,
+    quiet,
 )
+from src.utils.replay import ReplayWriter
 from src.utils.round_history import RoundHistory
 
+# Copies of every card type in the deck, indexed by card code
+CARD_COPIES: Tuple[int, ...] = tuple(DECK_COMPOSITION.count(card_type) for card_type in CARD_TYPES)
+
 
 class ChallengeResult(Enum):
     no_challenge = 0
@@ -27,29 +44,358 @@ class ChallengeResult(Enum):
     challenge_succeeded = 2
 
 
+class GamePhase(Enum):
+    action = 0
+    challenge = 1
+    counter = 2
+    counter_challenge = 3
+    resolve = 4
+
+
+class AfterDiscard(Enum):
+    """What happens once the pending discard is done"""
+
+    end_turn = 0
+    execute = 1
+    execute_countered = 2
+
+
+class Decision:
+    """A choice the game is waiting for. It's answered by setting `answer` and passing the
+    decision back to `ResistanceCoupGameHandler.step`.
+
+    The answer depends on the type of decision:
+
+        action:     (Action, target player or None), for `player`'s turn
+        challenge:  True to challenge the claim `opponent` made
+        counter:    True to counter `opponent`'s action
+        discard:    the Card to lose
+        exchange:   the two Cards to put back, out of the hand and the drawn `cards`
+
+    `other_players` and `game_state` are what the matching player callback would be given.
+    """
+
+    __slots__ = (
+        "decision_type",
+        "player",
+        "other_players",
+        "opponent",
+        "cards",
+        "game_state",
+        "answer",
+    )
+
+    def __init__(
+        self,
+        decision_type: DecisionType,
+        player: BasePlayer,
+        game_state: Union[str, Dict[str, str]],
+        other_players: Optional[List[BasePlayer]] = None,
+        opponent: Optional[BasePlayer] = None,
+        cards: Tuple[Card, ...] = (),
+    ):
+        self.decision_type = decision_type
+        self.player = player
+        self.other_players = other_players if other_players is not None else []
+        self.opponent = opponent
+        self.cards = cards
+        self.game_state = game_state
+        self.answer: Any = None
+
+    def __repr__(self):
+        return f"Decision({self.decision_type.name}, player={self.player.name!r}, answer={self.answer!r})"
+
+
+class TurnSnapshot(NamedTuple):
+    # The pending decision, with the seat of the player it's asked to
+    decision_type: DecisionType
+    seat: int
+    action: Optional[Action]
+    target: int
+    counterer: int
+    # Seats of the players polled for a challenge or a counter, and the next one to ask
+    poll: Tuple[int, ...]
+    poll_index: int
+    # The card a challenged player revealed, until it's swapped
+    revealed_card: Optional[Card]
+    after_discard: AfterDiscard
+    exchange_cards: Tuple[Card, ...]
+
+
+class GameSnapshot(NamedTuple):
+    # Coins, cards and active flag of every player
+    players: Tuple[Tuple[int, Tuple[Card, ...], bool], ...]
+    deck: DeckSnapshot
+    revealed_cards: Tuple[int, ...]
+    treasury: int
+    current_player_index: int
+    turns: int
+    phase: GamePhase
+    round_history: Tuple[int, int, Optional[int]]
+    rng_state: Optional[tuple]
+    # The turn being played, None once the game is over
+    turn: Optional[TurnSnapshot] = None
+
+
+def generate_player_names(number_of_players: int) -> List[str]:
+    """Pick unique random first names for the players"""
+    unique_names = []
+    for i in range(number_of_players):
+        gender = random.choice(["male", "female"])
+
+        ai_name = names.get_first_name(gender=gender)
+        while ai_name in unique_names:
+            ai_name = names.get_first_name(gender=gender)
+
+        unique_names.append(ai_name)
+
+    return unique_names
+
+
+def _quiet_if_headless(method: Callable) -> Callable:
+    """Headless handlers print nothing while they play, whoever calls them. The players print
+    through the same helpers from their callbacks, so they're silenced too"""
+
+    @wraps(method)
+    def wrapper(self: "ResistanceCoupGameHandler", *args, **kwargs):
+        if not self._headless:
+            return method(self, *args, **kwargs)
+        with quiet():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class ResistanceCoupGameHandler:
-    _players: List[BasePlayer] = []
-    _current_player_index = 0
-    _deck: List[Card] = []
-    _number_of_players: int = 0
-    _treasury: int = 0
-    _round_history = RoundHistory()
-
-    def __init__(self, number_of_players: int):
+    _players: List[BasePlayer]
+    _seats: Dict[int, int]
+    _current_player_index: int
+    _deck: Deck
+    _number_of_players: int
+    _treasury: int
+    _revealed_cards: List[int]
+    _round_history: RoundHistory
+    _headless: bool
+    _observations: ObservationCache
+    _replay_writer: Optional[ReplayWriter]
+    _turns: int
+    _phase: GamePhase
+    _rng: random.Random
+    # The decision the game is waiting for and the state of the turn being played
+    _pending: Optional[Decision]
+    _action: Optional[Action]
+    _target: Optional[BasePlayer]
+    _counterer: Optional[BasePlayer]
+    _poll: List[BasePlayer]
+    _poll_index: int
+    _revealed_card: Optional[Card]
+    _after_discard: AfterDiscard
+    _exchange_cards: List[Card]
+    _human_defeated: bool
+    _stragglers: List[Future]
+
+    def __init__(
+        self,
+        number_of_players: int,
+        player_class: Optional[Type[BasePlayer]] = None,
+        headless: bool = False,
+        seed: Optional[Union[int, str]] = None,
+        player_names: Optional[List[str]] = None,
+        replay_writer: Optional[ReplayWriter] = None,
+    ):
         self._number_of_players = number_of_players
+        self._current_player_index = 0
+        self._treasury = 0
+        # Lost cards are face up, so how many of every type are out of the game is public
+        self._revealed_cards = [0] * len(CARD_TYPES)
+        self._turns = 0
+        self._phase = GamePhase.action
+        self._reset_turn()
+        self._pending = None
+        self._human_defeated = False
+        # Challenge and counter callbacks of concurrent polls still running after their poll was
+        # over, see `close`
+        self._stragglers = []
+        # What answering every type of decision does, and the player callback answering it in
+        # blocking play
+        self._answers = {
+            DecisionType.action: self._answer_action,
+            DecisionType.challenge: self._answer_challenge,
+            DecisionType.counter: self._answer_counter,
+            DecisionType.discard: self._answer_discard,
+            DecisionType.exchange: self._answer_exchange,
+        }
+        self._callbacks = {
+            DecisionType.action: self._ask_action,
+            DecisionType.challenge: self._ask_challenge,
+            DecisionType.counter: self._ask_counter,
+            DecisionType.discard: self._ask_discard,
+            DecisionType.exchange: self._ask_exchange,
+        }
+
+        # Every finished game is written to the replay file, if there is one
+        self._replay_writer = replay_writer
+
+        # Headless games are played without any console output (not even the players'),
+        # confirmation prompts or game state rendering, which is what we want for bot-vs-bot
+        # simulations
+        self._headless = headless
+
+        # All randomness in a game (shuffles and the players' random choices) is drawn from this
+        # one stream, so a game can be replayed exactly by reseeding it
+        self._rng = random.Random(seed)
+        self._deck = Deck(self._rng)
+
+        # Set up players, GPT players by default. Imported here as autogen is slow to import and
+        # games between bots don't need it
+        if player_class is None:
+            from src.models.players.gpt import GPTPlayer
+
+            player_class = GPTPlayer
+
+        self._players = []
+        for name in player_names or generate_player_names(number_of_players):
+            player = player_class(name=name)
+            player.set_rng(self._rng)
+            self._players.append(player)
+
+        self._seats = {id(player): seat for seat, player in enumerate(self._players)}
+        self._round_history = RoundHistory([player.name for player in self._players])
+        self._observations = ObservationCache(self._players)
+        # Public beliefs about the hands, only brought up to date when they're read
+        self._beliefs = BeliefTracker(len(self._players))
+
+    def snapshot(self, include_rng: bool = False) -> GameSnapshot:
+        """Capture the game state, to roll back to with `restore`.
+
+        Snapshots are immutable tuples, so taking one copies only the players' hands and the deck
+        and a snapshot can be restored any number of times. The random stream is only included
+        when asked for, as its state is comparatively large. Snapshots can be taken between any
+        two decisions, restoring one makes the decision the game was waiting for pending again.
+        """
+        return GameSnapshot(
+            tuple(
+                (player.coins, tuple(player.cards), player.is_active) for player in self._players
+            ),
+            self._deck.snapshot(),
+            tuple(self._revealed_cards),
+            self._treasury,
+            self._current_player_index,
+            self._turns,
+            self._phase,
+            self._round_history.snapshot(),
+            self._rng.getstate() if include_rng else None,
+            self._snapshot_turn(),
+        )
 
-        # Set up players
-        unique_names = set()
-        for i in range(number_of_players):
-            gender = random.choice(["male", "female"])
+    def _seat(self, player: Optional[BasePlayer]) -> int:
+        return NO_SEAT if player is None else self._seats[id(player)]
+
+    def _snapshot_turn(self) -> Optional[TurnSnapshot]:
+        if self._pending is None:
+            return None
+
+        return TurnSnapshot(
+            self._pending.decision_type,
+            self._seat(self._pending.player),
+            self._action,
+            self._seat(self._target),
+            self._seat(self._counterer),
+            tuple(self._seat(player) for player in self._poll),
+            self._poll_index,
+            self._revealed_card,
+            self._after_discard,
+            tuple(self._exchange_cards),
+        )
 
-            ai_name = names.get_first_name(gender=gender)
-            while ai_name in unique_names:
-                ai_name = names.get_first_name(gender=gender)
+    def _restore_turn(self, turn: Optional[TurnSnapshot]) -> None:
+        self._pending = None
+        if turn is None:
+            self._reset_turn()
+            return
+
+        players = self._players
+        self._action = turn.action
+        self._target = None if turn.target == NO_SEAT else players[turn.target]
+        self._counterer = None if turn.counterer == NO_SEAT else players[turn.counterer]
+        self._poll = [players[seat] for seat in turn.poll]
+        self._poll_index = turn.poll_index
+        self._revealed_card = turn.revealed_card
+        self._after_discard = turn.after_discard
+        self._exchange_cards = list(turn.exchange_cards)
+
+        player = players[turn.seat]
+        match turn.decision_type:
+            case DecisionType.action:
+                self._decide_action(player)
+            case DecisionType.discard:
+                self._decide_discard(player)
+            case DecisionType.exchange:
+                self._decide_exchange(player)
+            case _:
+                self._decide_poll(turn.decision_type, player)
+
+    def restore(self, snapshot: GameSnapshot) -> None:
+        """Roll the game back to a snapshot"""
+        for player, (coins, cards, is_active) in zip(self._players, snapshot.players):
+            player.coins = coins
+            player.cards = list(cards)
+            player.is_active = is_active
+
+        self._deck.restore(snapshot.deck)
+        self._revealed_cards = list(snapshot.revealed_cards)
+        self._treasury = snapshot.treasury
+        self._current_player_index = snapshot.current_player_index
+        self._turns = snapshot.turns
+        self._phase = snapshot.phase
+        self._round_history.restore(snapshot.round_history)
+        if snapshot.rng_state is not None:
+            self._rng.setstate(snapshot.rng_state)
+        # Search rolls back far more often than the beliefs are read
+        self._beliefs.invalidate()
+
+        if not self._headless:
+            self._observations.reset()
+        self._restore_turn(snapshot.turn)
+
+    @property
+    def phase(self) -> GamePhase:
+        """The phase of the turn being played, a new turn always starts with the action"""
+        return self._phase
 
-            unique_names.add(ai_name)
+    @property
+    def pending_decision(self) -> Optional[Decision]:
+        """The decision the game is waiting for, None before the game is set up and once it's
+        over"""
+        return self._pending
+
+    def reseed(self, seed: Union[int, str]) -> None:
+        """Reseed the random stream used by the game and its players"""
+        self._rng.seed(seed)
 
-            self._players.append(GPTPlayer(name=ai_name))
+    @property
+    def players(self) -> List[BasePlayer]:
+        return self._players
+
+    @property
+    def turns(self) -> int:
+        """The number of turns started, the turn being played included"""
+        return self._turns
+
+    @property
+    def round_history(self) -> RoundHistory:
+        return self._round_history
+
+    @property
+    def revealed_cards(self) -> Tuple[int, ...]:
+        """The number of lost cards of every type, indexed by card code"""
+        return tuple(self._revealed_cards)
+
+    @property
+    def beliefs(self) -> BeliefTracker:
+        """What the table can infer about every player's hand from the game so far"""
+        self._beliefs.sync(self._round_history.log)
+        return self._beliefs
 
     @property
     def current_player(self) -> BasePlayer:
@@ -60,9 +406,33 @@ class ResistanceCoupGameHandler:
         """Return the only remaining player"""
         return [player for player in self._players if player.is_active][0]
 
+    @_quiet_if_headless
     def print_game_state(self) -> None:
         print_table(generate_players_table(self._players, self._current_player_index))
-        print_panel(generate_state_panel(self._deck, self._treasury, self.current_player))
+        print_panel(
+            generate_state_panel(
+                self._deck,
+                self._treasury,
+                self.current_player,
+                revealed_cards=self._revealed_cards,
+            )
+        )
+
+    def _build_game_state(
+        self, viewer: BasePlayer, challenged_player: Optional[BasePlayer] = None
+    ) -> Dict[str, str]:
+        """Build the game state as seen by the given player"""
+        if self._headless:
+            return {}
+
+        return self._observations.observe(
+            viewer,
+            self._deck,
+            self._treasury,
+            self.current_player,
+            challenged_player=challenged_player,
+            revealed_cards=self._revealed_cards,
+        )
 
     def _players_without_player(self, excluded_player: BasePlayer):
         players_copy = self._players.copy()
@@ -72,21 +442,57 @@ class ResistanceCoupGameHandler:
             if player.is_active and player.name != excluded_player.name
         ]
 
-    def _shuffle_deck(self) -> None:
-        random.shuffle(self._deck)
+    def _record(
+        self,
+        event_type: EventType,
+        actor: BasePlayer,
+        target: Optional[BasePlayer] = None,
+        arg: int = 0,
+    ) -> None:
+        self._round_history.record(
+            event_type,
+            self._seats[id(actor)],
+            NO_SEAT if target is None else self._seats[id(target)],
+            arg,
+        )
+
+    def _wait_for_stragglers(self) -> None:
+        """Wait for the challenge and counter callbacks still running from concurrent polls. Their
+        answers are no longer needed, but they still read the players' hands"""
+        wait(self._stragglers)
+        self._stragglers = []
+
+    def close(self) -> None:
+        """Wait for the callbacks still running and release what the players keep between games
+        (the GPT players' agents)"""
+        self._wait_for_stragglers()
+        for player in self._players:
+            player.close()
+
+    def __enter__(self) -> "ResistanceCoupGameHandler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
+    @_quiet_if_headless
     def setup_game(self) -> None:
-        self._deck = build_deck()
-        self._shuffle_deck()
+        self._wait_for_stragglers()
+        self._deck.reset_full()
 
         self._treasury = 50 - 2 * len(self._players)
+        self._revealed_cards = [0] * len(CARD_TYPES)
+        self._round_history.reset()
+        self._beliefs.invalidate()
+        self._turns = 0
+        self._phase = GamePhase.action
 
         for player in self._players:
             player.reset_player()
 
             # Deal 2 cards to each player
-            player.cards.append(self._deck.pop())
-            player.cards.append(self._deck.pop())
+            player.cards.append(self._deck.draw())
+            player.cards.append(self._deck.draw())
 
             # Gives each player 2 coins
             player.coins = 2
@@ -97,11 +503,14 @@ class ResistanceCoupGameHandler:
         # self._current_player_index = random.randint(0, self._number_of_players - 1)
         # 1st player goes first
         self._current_player_index = 0
+        self._observations.reset()
+        self._human_defeated = False
+        self._start_turn()
 
     def _swap_card(self, player: BasePlayer, card: Card) -> None:
-        self._deck.append(card)
-        self._shuffle_deck()
-        player.cards.append(self._deck.pop())
+        self._deck.put_back(card)
+        player.cards.append(self._deck.draw())
+        self._observations.invalidate(player)
 
     def _take_coin_from_treasury(self, player: BasePlayer, number_of_coins: int):
         if number_of_coins <= self._treasury:
@@ -111,10 +520,12 @@ class ResistanceCoupGameHandler:
             coins = self._treasury
             self._treasury = 0
             player.coins += coins
+        self._observations.invalidate(player)
 
     def _give_coin_to_treasury(self, player: BasePlayer, number_of_coins: int):
         self._treasury += number_of_coins
         player.coins -= number_of_coins
+        self._observations.invalidate(player)
 
     def _next_player(self):
         self._current_player_index = (self._current_player_index + 1) % len(self._players)
@@ -126,6 +537,7 @@ class ResistanceCoupGameHandler:
             if not player.cards and player.is_active:
                 player.is_active = False
                 self._give_coin_to_treasury(player, player.coins)
+                self._observations.invalidate(player)
 
                 return player
         return None
@@ -133,23 +545,117 @@ class ResistanceCoupGameHandler:
     def _determine_win_state(self) -> bool:
         return sum(player.is_active for player in self._players) == 1
 
-    def _action_phase(
-        self, players_without_current: list[BasePlayer]
-    ) -> Tuple[Action, Optional[BasePlayer]]:
-        # Player chooses action
-        current_game_state = {
-            "players": str(
-                generate_players_table(self._players, self._current_player_index, rich=False)
-            ),
-            "game_state": str(
-                generate_state_panel(self._deck, self._treasury, self.current_player, rich=False)
-            ),
-        }
+    # Turn flow. Every decision the turn needs is left pending and the turn carries on from
+    # wherever `step` is called with the answer, so a game never blocks on a player
+
+    @_quiet_if_headless
+    def step(self, decision: Decision) -> Optional[Decision]:
+        """Answer the pending decision and play on until the next decision, which is returned.
+        Returns None once the game is over"""
+        if decision is not self._pending:
+            raise ValueError("The decision isn't the one the game is waiting for")
+        self._check_answer(decision)
+        return self._advance(decision)
+
+    def _advance(self, decision: Decision) -> Optional[Decision]:
+        self._pending = None
+        self._answers[decision.decision_type](decision)
+        return self._pending
+
+    def _check_answer(self, decision: Decision) -> None:
+        player = decision.player
+        answer = decision.answer
+        match decision.decision_type:
+            case DecisionType.action:
+                action, target_player = answer
+                mask = legal_action_mask(
+                    player.coins, (other_player.coins for other_player in decision.other_players)
+                )
+                if not ACTION_BITS[action.action_type] & mask:
+                    raise ValueError(f"{player} can't perform {action}")
+                if action.requires_target:
+                    if target_player not in decision.other_players or not is_legal_against(
+                        action, target_player.coins
+                    ):
+                        raise ValueError(f"{player} can't perform {action} against {target_player}")
+                elif target_player is not None:
+                    raise ValueError(f"{action} doesn't take a target")
+            case DecisionType.challenge | DecisionType.counter:
+                if not isinstance(answer, bool):
+                    raise ValueError(f"Expected True or False, got {answer!r}")
+            case DecisionType.discard:
+                if answer not in player.cards:
+                    raise ValueError(f"{player} doesn't hold a {answer} card")
+            case DecisionType.exchange:
+                cards = player.cards + list(decision.cards)
+                for card in answer:
+                    if card not in cards:
+                        raise ValueError(f"{card} isn't one of the cards to exchange")
+                    cards.remove(card)
+                if len(answer) != 2:
+                    raise ValueError("Exactly 2 cards have to be put back")
+
+    def _reset_turn(self) -> None:
+        self._action = None
+        self._target = None
+        self._counterer = None
+        self._poll = []
+        self._poll_index = 0
+        self._revealed_card = None
+        self._after_discard = AfterDiscard.end_turn
+        self._exchange_cards = []
 
-        target_action, target_player = self.current_player.choose_action(
-            players_without_current, self._round_history, current_game_state
+    @property
+    def _claimant(self) -> BasePlayer:
+        """The player whose claim can be challenged, the counterer once there's a counter"""
+        if self._phase == GamePhase.counter_challenge:
+            return self._counterer
+        return self.current_player
+
+    def _claimed_card_type(self) -> CardType:
+        if self._phase == GamePhase.counter_challenge:
+            return get_counter_action(self._action.action_type).associated_card_type
+        return self._action.associated_card_type
+
+    # Pending decisions, with what the player gets to see for them
+
+    def _decide_action(self, player: BasePlayer) -> None:
+        game_state = self._build_game_state(player)
+        self._pending = Decision(
+            DecisionType.action, player, game_state, self._players_without_player(player)
         )
 
+    def _decide_poll(self, decision_type: DecisionType, player: BasePlayer) -> None:
+        opponent = self._claimant
+        game_state = self._build_game_state(player, challenged_player=opponent)
+        self._pending = Decision(decision_type, player, game_state, self._poll, opponent)
+
+    def _decide_discard(self, player: BasePlayer) -> None:
+        if self._phase == GamePhase.resolve:
+            # Losing a card to a coup or an assassination, seen as by the current player
+            game_state = self._build_game_state(self.current_player)
+            self._pending = Decision(DecisionType.discard, player, game_state)
+        else:
+            opponent = self._claimant
+            game_state = self._build_game_state(player, challenged_player=opponent)
+            self._pending = Decision(DecisionType.discard, player, game_state, None, opponent)
+
+    def _decide_exchange(self, player: BasePlayer) -> None:
+        game_state = self._build_game_state(player)
+        cards = tuple(self._exchange_cards)
+        self._pending = Decision(DecisionType.exchange, player, game_state, None, None, cards)
+
+    def _start_turn(self) -> None:
+        self._turns += 1
+        self._phase = GamePhase.action
+        self._reset_turn()
+        self._decide_action(self.current_player)
+
+    def _answer_action(self, decision: Decision) -> None:
+        target_action, target_player = decision.answer
+        self._action = target_action
+        self._target = target_player
+
         action_report_string = build_action_report_string(
             player=self.current_player,
             action=target_action,
@@ -161,9 +667,89 @@ class ResistanceCoupGameHandler:
             with_markup=True,
         )
 
-        self._round_history.append(action_report_string)
+        self._record(
+            EventType.action,
+            self.current_player,
+            target_player,
+            ACTION_CODES[target_action.action_type],
+        )
 
-        return target_action, target_player
+        # Opportunity to challenge action
+        if target_action.can_be_challenged:
+            self._start_challenge(decision.other_players)
+        elif target_action.can_be_countered:
+            self._start_counter()
+        else:
+            self._execute_action()
+
+    def _start_challenge(self, other_players: List[BasePlayer]) -> None:
+        # Every player can choose to challenge
+        self._phase = (
+            GamePhase.challenge if self._counterer is None else GamePhase.counter_challenge
+        )
+
+        # Every copy of the claimed card is already revealed, so the claim is a bluff whoever
+        # would challenge it and nobody needs to be asked
+        card_type = self._claimed_card_type()
+        if self._revealed_cards[CARD_CODES[card_type]] >= CARD_COPIES[CARD_CODES[card_type]]:
+            print_text(f"Every {card_type.value} card is already revealed!")
+            self._challenge_against_player_succeeded(self._claimant)
+            return
+
+        self._poll = other_players
+        self._poll_index = 0
+        self._poll_next()
+
+    def _start_counter(self) -> None:
+        # Every player can choose to counter
+        self._phase = GamePhase.counter
+        self._poll = self._players_without_player(self.current_player)
+        self._poll_index = 0
+        self._poll_next()
+
+    def _poll_next(self) -> None:
+        """Ask the next player in the poll, or carry on with the turn once everyone declined"""
+        while self._poll_index < len(self._poll):
+            player = self._poll[self._poll_index]
+            # Players who lost their last card earlier this turn are already out of the game
+            if player.cards:
+                self._decide_poll(
+                    DecisionType.counter
+                    if self._phase == GamePhase.counter
+                    else DecisionType.challenge,
+                    player,
+                )
+                return
+            self._poll_index += 1
+
+        if self._phase == GamePhase.challenge and self._action.can_be_countered:
+            # No challenge happened, opportunity to counter
+            self._start_counter()
+        else:
+            # Not challenged and not countered, or a counter nobody challenged
+            self._execute_action(countered=self._counterer is not None)
+
+    def _answer_challenge(self, decision: Decision) -> None:
+        if not decision.answer:
+            self._poll_index += 1
+            self._poll_next()
+            return
+
+        challenger = decision.player
+        player_being_challenged = self._claimant
+        self._record(EventType.challenge, challenger, player_being_challenged)
+        if challenger.is_ai:
+            print_text(f"{challenger} is challenging {player_being_challenged}!")
+
+        # Player being challenged has the card
+        if card := player_being_challenged.find_card(self._claimed_card_type()):
+            # The revealed card is out of the player's hand until it's swapped
+            self._observations.invalidate(player_being_challenged)
+            self._challenge_against_player_failed(player_being_challenged, card, challenger)
+
+        # Player being challenged bluffed
+        else:
+            self._challenge_against_player_succeeded(player_being_challenged)
 
     def _challenge_against_player_failed(
         self, player_being_challenged: BasePlayer, card: Card, challenger: BasePlayer
@@ -174,371 +760,180 @@ class ResistanceCoupGameHandler:
             (f"{card}", card.style),
             " card!",
         )
-        reveal_append_text = f"{player_being_challenged} reveals their {card} card!"
-        self._round_history.append(reveal_append_text)
-
-        lose_text = f"{challenger} loses the challenge"
-        print_text(lose_text)
-        self._round_history.append(lose_text)
-
-        current_game_state = {
-            "players": str(
-                generate_players_table(
-                    self._players,
-                    self._players.index(challenger),
-                    rich=False,
-                    challenged_player=player_being_challenged,
-                )
-            ),
-            "game_state": str(
-                generate_state_panel(
-                    self._deck,
-                    self._treasury,
-                    self.current_player,
-                    rich=False,
-                )
-            ),
-        }
-
-        # Challenge player loses influence (chooses a card to remove)
-        removed_card_text = challenger.remove_card(
-            round_history=self._round_history, current_game_state=current_game_state
+        self._record(
+            EventType.reveal,
+            player_being_challenged,
+            challenger,
+            CARD_CODES[card.card_type],
         )
-        self._round_history.append(removed_card_text)
 
-        # Player puts card into the deck and gets a new card
-        new_card_text = f"{player_being_challenged} gets a new card"
-        print_text(new_card_text)
-        self._round_history.append(new_card_text)
-        self._swap_card(player_being_challenged, card)
+        print_text(f"{challenger} loses the challenge")
+        self._record(EventType.challenge_lost, challenger, player_being_challenged)
+
+        # Challenge player loses influence (chooses a card to remove), then the revealed card is
+        # swapped and the challenged action or counter goes ahead
+        self._revealed_card = card
+        self._after_discard = (
+            AfterDiscard.execute_countered
+            if self._phase == GamePhase.counter_challenge
+            else AfterDiscard.execute
+        )
+        self._decide_discard(challenger)
 
     def _challenge_against_player_succeeded(self, player_being_challenged: BasePlayer):
         print_text(f"{player_being_challenged} bluffed! They do not have the required card!")
-        self._round_history.append(
-            f"{player_being_challenged} bluffed! They do not have the required card!"
+        self._record(EventType.bluff_caught, player_being_challenged)
+
+        # Player being challenged loses influence (chooses a card to remove). A bluffed action
+        # does not take place, a bluffed counter lets the action through
+        self._after_discard = (
+            AfterDiscard.execute
+            if self._phase == GamePhase.counter_challenge
+            else AfterDiscard.end_turn
         )
-
-        current_game_state = {
-            "players": str(
-                generate_players_table(
-                    self._players,
-                    self._players.index(player_being_challenged),
-                    rich=False,
-                    challenged_player=player_being_challenged,
-                )
-            ),
-            "game_state": str(
-                generate_state_panel(
-                    self._deck,
-                    self._treasury,
-                    self.current_player,
-                    rich=False,
-                )
-            ),
-        }
-
-        # Player being challenged loses influence (chooses a card to remove)
-        removed_card_text = player_being_challenged.remove_card(
-            self._round_history, current_game_state
+        self._decide_discard(player_being_challenged)
+
+    def _answer_counter(self, decision: Decision) -> None:
+        if not decision.answer:
+            self._poll_index += 1
+            self._poll_next()
+            return
+
+        countering_player = decision.player
+        target_counter = get_counter_action(self._action.action_type)
+        report_text = build_counter_report_string(
+            target_player=self.current_player,
+            counter=target_counter,
+            countering_player=countering_player,
         )
-        self._round_history.append(removed_card_text)
+        print_text(report_text)
 
-    def _challenge_phase(
-        self,
-        other_players: list[BasePlayer],
-        player_being_challenged: BasePlayer,
-        action_being_challenged: Union[Action, CounterAction],
-    ) -> ChallengeResult:
-        # appended to round history
-        # Every player can choose to challenge
-        for challenger in other_players:
-
-            player_index = self._players.index(challenger)
-            current_game_state = {
-                "players": str(
-                    generate_players_table(
-                        self._players,
-                        player_index,
-                        rich=False,
-                        challenged_player=player_being_challenged,
-                    )
-                ),
-                "game_state": str(
-                    generate_state_panel(
-                        self._deck,
-                        self._treasury,
-                        self.current_player,
-                        rich=False,
-                    )
-                ),
-            }
-            should_challenge = challenger.determine_challenge(
-                player_being_challenged, other_players, self._round_history, current_game_state
-            )
-            if should_challenge:
-                if challenger.is_ai:
-                    text = f"{challenger} is challenging {player_being_challenged}!"
-                    self._round_history.append(text)
-                    print_text(text)
-                # Player being challenged has the card
-                if card := player_being_challenged.find_card(
-                    action_being_challenged.associated_card_type
-                ):
-                    self._challenge_against_player_failed(
-                        player_being_challenged=player_being_challenged,
-                        card=card,
-                        challenger=challenger,
-                    )
-                    return ChallengeResult.challenge_failed
-
-                # Player being challenged bluffed
-                else:
-                    self._challenge_against_player_succeeded(player_being_challenged)
-                    return ChallengeResult.challenge_succeeded
-
-        # No challenge happened
-        return ChallengeResult.no_challenge
-
-    def _counter_phase(
-        self, players_without_current: list[BasePlayer], target_action: Action
-    ) -> Tuple[Optional[BasePlayer], Optional[CounterAction]]:
-        # Every player can choose to counter
-        player_being_challenged = self.current_player
-        for countering_player in players_without_current:
-            player_index = self._players.index(countering_player)
-            current_game_state = {
-                "players": str(
-                    generate_players_table(
-                        self._players,
-                        player_index,
-                        rich=False,
-                        challenged_player=player_being_challenged,
-                    )
-                ),
-                "game_state": str(
-                    generate_state_panel(
-                        self._deck,
-                        self._treasury,
-                        self.current_player,
-                        rich=False,
-                    )
-                ),
-            }
-            should_counter = countering_player.determine_counter(
-                player_being_challenged,
-                players_without_current,
-                self._round_history,
-                current_game_state,
-            )
-            if should_counter:
-                target_counter = get_counter_action(target_action.action_type)
-
-                report_text = build_counter_report_string(
-                    target_player=self.current_player,
-                    counter=target_counter,
-                    countering_player=countering_player,
-                )
-                print_text(report_text)
-
-                self._round_history.append(report_text)
-
-                return countering_player, target_counter
-
-        return None, None
+        self._record(
+            EventType.counter,
+            countering_player,
+            self.current_player,
+            ACTION_CODES[self._action.action_type],
+        )
 
-    def _execute_action(
-        self, action: Action, target_player: BasePlayer, countered: bool = False
-    ) -> None:
+        # Opportunity to challenge counter
+        self._counterer = countering_player
+        self._start_challenge(self._players_without_player(countering_player))
+
+    def _answer_discard(self, decision: Decision) -> None:
+        player = decision.player
+        card = decision.answer
+        player.cards.remove(card)
+        card_code = CARD_CODES[card.card_type]
+        self._revealed_cards[card_code] += 1
+        self._record(EventType.discard, player, arg=card_code)
+        self._observations.invalidate(player)
+
+        if self._revealed_card is not None:
+            # Player puts card into the deck and gets a new card
+            player_being_challenged = self._claimant
+            print_text(f"{player_being_challenged} gets a new card")
+            self._record(EventType.card_swapped, player_being_challenged)
+            self._swap_card(player_being_challenged, self._revealed_card)
+            self._revealed_card = None
+
+        match self._after_discard:
+            case AfterDiscard.execute:
+                self._execute_action()
+            case AfterDiscard.execute_countered:
+                self._execute_action(countered=True)
+            case AfterDiscard.end_turn:
+                self._end_turn()
+
+    def _execute_action(self, countered: bool = False) -> None:  # noqa: C901
         # appends to round history
+        self._phase = GamePhase.resolve
+        action = self._action
+        target_player = self._target
         match action.action_type:
             case ActionType.income:
                 # Player gets 1 coin
                 self._take_coin_from_treasury(self.current_player, 1)
                 print_text(f"{self.current_player}'s coins are increased by 1")
-                self._round_history.append(f"{self.current_player}'s coins are increased by 1")
+                self._record(EventType.coins_gained, self.current_player, arg=1)
             case ActionType.foreignaid:
                 if not countered:
                     # Player gets 2 coin
                     self._take_coin_from_treasury(self.current_player, 2)
                     print_text(f"{self.current_player}'s coins are increased by 2")
-                    self._round_history.append(f"{self.current_player}'s coins are increased by 2")
+                    self._record(EventType.coins_gained, self.current_player, arg=2)
             case ActionType.coup:
                 # Player pays 7 coin
                 self._give_coin_to_treasury(self.current_player, 7)
                 print_text(
                     f"{self.current_player} pays 7 coins and performs the coup against {target_player}"
                 )
-                self._round_history.append(
-                    f"{self.current_player} pays 7 coins and performs the coup against {target_player}"
-                )
+                self._record(EventType.coup, self.current_player, target_player)
 
                 if target_player.cards:
                     # Target player loses influence
-                    current_game_state = {
-                        "players": str(
-                            generate_players_table(
-                                self._players,
-                                self._current_player_index,
-                                rich=False,
-                            )
-                        ),
-                        "game_state": str(
-                            generate_state_panel(
-                                self._deck,
-                                self._treasury,
-                                self.current_player,
-                                rich=False,
-                            )
-                        ),
-                    }
-                    removed_card_text = target_player.remove_card(
-                        self._round_history, current_game_state
-                    )
-                    self._round_history.append(removed_card_text)
+                    self._after_discard = AfterDiscard.end_turn
+                    self._decide_discard(target_player)
+                    return
             case ActionType.tax:
                 # Player gets 3 coins
                 self._take_coin_from_treasury(self.current_player, 3)
                 print_text(f"{self.current_player}'s coins are increased by 3")
-                self._round_history.append(f"{self.current_player}'s coins are increased by 3")
+                self._record(EventType.coins_gained, self.current_player, arg=3)
             case ActionType.assassinate:
                 # Player pays 3 coin
                 self._give_coin_to_treasury(self.current_player, 3)
                 if not countered and target_player.cards:
                     print_text(f"{self.current_player} assassinates {target_player}")
-                    self._round_history.append(
-                        f"{self.current_player} assassinates {target_player}"
-                    )
+                    self._record(EventType.assassination, self.current_player, target_player)
 
-                    current_game_state = {
-                        "players": str(
-                            generate_players_table(
-                                self._players,
-                                self._current_player_index,
-                                rich=False,
-                            )
-                        ),
-                        "game_state": str(
-                            generate_state_panel(
-                                self._deck,
-                                self._treasury,
-                                self.current_player,
-                                rich=False,
-                            )
-                        ),
-                    }
-                    removed_card_text = target_player.remove_card(
-                        self._round_history, current_game_state
-                    )
-                    self._round_history.append(removed_card_text)
+                    self._after_discard = AfterDiscard.end_turn
+                    self._decide_discard(target_player)
+                    return
             case ActionType.steal:
                 if not countered:
                     # Take 2 (or all) coins from a player
                     steal_amount = min(target_player.coins, 2)
                     target_player.coins -= steal_amount
                     self.current_player.coins += steal_amount
+                    self._observations.invalidate(target_player, self.current_player)
                     print_text(
                         f"{self.current_player} steals {steal_amount} coins from {target_player}"
                     )
-                    self._round_history.append(
-                        f"{self.current_player} steals {steal_amount} coins from {target_player}"
-                    )
+                    self._record(EventType.steal, self.current_player, target_player, steal_amount)
             case ActionType.exchange:
                 # Get 2 random cards from deck
-                cards = [self._deck.pop(), self._deck.pop()]
-
-                current_game_state = {
-                    "players": str(
-                        generate_players_table(
-                            self._players,
-                            self._current_player_index,
-                            rich=False,
-                        )
-                    ),
-                    "game_state": str(
-                        generate_state_panel(
-                            self._deck,
-                            self._treasury,
-                            self.current_player,
-                            rich=False,
-                        )
-                    ),
-                }
-
-                first_card, second_card = self.current_player.choose_exchange_cards(
-                    cards, self._round_history, current_game_state
-                )
-                self._round_history.append(f"{self.current_player} exchanges 2 cards")
-                self._deck.append(first_card)
-                self._deck.append(second_card)
-
-    def handle_turn(self) -> bool:  # noqa: C901
-        players_without_current = self._players_without_player(self.current_player)
-
-        # Choose an action to perform
-        # action is appended to round history
-        target_action, target_player = self._action_phase(players_without_current)
-
-        # Opportunity to challenge action
-        # result is appended to round history
-        challenge_result = ChallengeResult.no_challenge
-        if target_action.can_be_challenged:
-            challenge_result = self._challenge_phase(
-                other_players=players_without_current,
-                player_being_challenged=self.current_player,
-                action_being_challenged=target_action,
-            )
-
-        if challenge_result == ChallengeResult.challenge_succeeded:
-            # Challenge succeeded and the action does not take place
-            pass
-        elif challenge_result == ChallengeResult.challenge_failed:
-            # Challenge failed and the action is still resolved
-            self._execute_action(target_action, target_player)
-        elif challenge_result == ChallengeResult.no_challenge:
-            # Action can't be countered
-            if not target_action.can_be_countered:
-                self._execute_action(target_action, target_player)
-
-            # Opportunity to counter
-            else:
-                # appended to round history
-                countering_player, counter = self._counter_phase(
-                    players_without_current, target_action
-                )
-
-                # Opportunity to challenge counter
-                counter_challenge_result = ChallengeResult.no_challenge
-                if countering_player and counter:
-                    players_without_countering_player = self._players_without_player(
-                        countering_player
-                    )
-                    counter_challenge_result = self._challenge_phase(
-                        other_players=players_without_countering_player,
-                        player_being_challenged=countering_player,
-                        action_being_challenged=counter,
-                    )
-
-                # Successfully countered and counter not challenged
-                if counter and counter_challenge_result in [
-                    ChallengeResult.no_challenge,
-                    ChallengeResult.challenge_failed,
-                ]:
-                    self._execute_action(target_action, target_player, countered=True)
-                # No counter occurred
-                else:
-                    self._execute_action(target_action, target_player)
-
+                self._exchange_cards = [self._deck.draw(), self._deck.draw()]
+                self._decide_exchange(self.current_player)
+                return
+
+        self._end_turn()
+
+    def _answer_exchange(self, decision: Decision) -> None:
+        player = decision.player
+        returned_cards = decision.answer
+        cards = player.cards + self._exchange_cards
+        for card in returned_cards:
+            cards.remove(card)
+        player.cards = cards
+        self._exchange_cards = []
+
+        self._record(EventType.exchange, player)
+        first_card, second_card = returned_cards
+        self._deck.put_back(first_card)
+        self._deck.put_back(second_card)
+        self._observations.invalidate(player)
+        self._end_turn()
+
+    def _end_turn(self) -> None:
         # Is any player out of the game?
         while player := self._remove_defeated_player():
-            if player.is_ai:
+            self._record(EventType.elimination, player)
+            if player.is_ai or self._headless:
                 print_text(f"{player} was defeated! :skull: :skull: :skull:", with_markup=True)
-                self._round_history.append(f"{player} was defeated!!!")
             else:
                 # Our human was defeated
                 print_text("You were defeated! :skull: :skull: :skull:", with_markup=True)
-                end_game = print_confirm("Do you want to end the game early?")
-                if end_game:
-                    return True
+                self._human_defeated = True
 
         # Have we reached a winner?
         if self._determine_win_state():
@@ -546,16 +941,152 @@ class ResistanceCoupGameHandler:
                 f":raising_hands: Congratulations {self.remaining_player}! You are the final survivor!",
                 with_markup=True,
             )
-            return True
+            if self._replay_writer:
+                self._replay_writer.write_game(
+                    self._round_history.log, self._turns, self._seats[id(self.remaining_player)]
+                )
+            self._reset_turn()
+            return
 
         # we've completed a round after each player has taken a turn
-        if self.current_player == self.get_last_active_player():
+        if self.current_player is self.get_last_active_player():
             self.conclude_round()
 
         self._next_player()
+        self._start_turn()
+
+    # Blocking play, with the players' own callbacks
+
+    @_quiet_if_headless
+    def ask(self, decision: Decision) -> Decision:
+        """Answer the decision with the callback of the player it's asked to, as `handle_turn`
+        does. The decision still has to be passed to `step`"""
+        self._callbacks[decision.decision_type](decision)
+        return decision
 
-        # No winner yet
-        return False
+    def _ask_action(self, decision: Decision) -> None:
+        decision.answer = decision.player.choose_action(
+            decision.other_players, self._round_history, decision.game_state
+        )
+
+    def _ask_challenge(self, decision: Decision) -> None:
+        decision.answer = decision.player.determine_challenge(
+            decision.opponent, decision.other_players, self._round_history, decision.game_state
+        )
+
+    def _ask_counter(self, decision: Decision) -> None:
+        decision.answer = decision.player.determine_counter(
+            decision.opponent, decision.other_players, self._round_history, decision.game_state
+        )
+
+    def _ask_discard(self, decision: Decision) -> None:
+        # The callbacks take the card out of the hand themselves, answering leaves that to `step`
+        player = decision.player
+        hand = list(player.cards)
+        player.remove_card(self._round_history, decision.game_state)
+        discarded_cards = list(hand)
+        for card in player.cards:
+            discarded_cards.remove(card)
+        player.cards = hand
+        decision.answer = discarded_cards[0] if discarded_cards else None
+
+    def _ask_exchange(self, decision: Decision) -> None:
+        player = decision.player
+        hand = list(player.cards)
+        decision.answer = tuple(
+            player.choose_exchange_cards(
+                list(decision.cards), self._round_history, decision.game_state
+            )
+        )
+        player.cards = hand
+
+    @_quiet_if_headless
+    def handle_turn(self) -> bool:
+        """Play the current turn, asking the players for every decision it needs. Returns
+        whether the game is over"""
+        turns = self._turns
+        while (decision := self._pending) is not None and self._turns == turns:
+            if decision.player.polls_concurrently and decision.decision_type in (
+                DecisionType.challenge,
+                DecisionType.counter,
+            ):
+                self._play_poll_concurrently(decision)
+                continue
+
+            self._callbacks[decision.decision_type](decision)
+            # The players' own callbacks only give legal answers
+            self._advance(decision)
+
+        if self._pending is not None and self._human_defeated:
+            self._human_defeated = False
+            if print_confirm("Do you want to end the game early?"):
+                return True
+
+        return self._pending is None
+
+    def _play_poll_concurrently(self, decision: Decision) -> None:
+        """Ask every player left in the poll at once instead of one after the other. Whether
+        someone challenges or counters doesn't change what the others get to see, so their
+        decisions are the ones sequential polling would ask, and the answers are taken in seat
+        order as they come in: the first player to say yes wins and the other answers are
+        dropped.
+
+        Every poll has its own threads, so callbacks still running once their answer was dropped
+        never hold up the next poll. They're shown a copy of the round history, as the game
+        carries on recording while they run, and `close` waits for them"""
+        self._stragglers = [future for future in self._stragglers if not future.done()]
+
+        decision_type = decision.decision_type
+        opponent = decision.opponent
+        poll = self._poll
+        polled = [decision]
+        start = self._poll_index + 1
+        for player in poll[start:]:
+            if player.cards and player.polls_concurrently:
+                game_state = self._build_game_state(player, challenged_player=opponent)
+                polled.append(Decision(decision_type, player, game_state, poll, opponent))
+
+        round_history = self._round_history.copy()
+        if decision_type is DecisionType.challenge:
+            determine = "determine_challenge"
+        else:
+            determine = "determine_counter"
+
+        def ask(polled_decision: Decision) -> None:
+            polled_decision.answer = getattr(polled_decision.player, determine)(
+                polled_decision.opponent,
+                polled_decision.other_players,
+                round_history,
+                polled_decision.game_state,
+            )
+
+        # The callbacks run in the context of the turn, so they're as quiet as the handler
+        executor = ThreadPoolExecutor(max_workers=len(polled), thread_name_prefix="poll")
+        asked: Dict[int, Tuple[Decision, Future]] = {
+            id(polled_decision.player): (
+                polled_decision,
+                executor.submit(copy_context().run, ask, polled_decision),
+            )
+            for polled_decision in polled
+        }
+        callback = self._callbacks[decision_type]
+        try:
+            while (pending := self._pending) is not None and self._poll is poll:
+                if pending.decision_type is not decision_type:
+                    break
+                if id(pending.player) in asked:
+                    answered, future = asked[id(pending.player)]
+                    future.result()
+                    pending.answer = answered.answer
+                else:
+                    # Players who can't be asked at the same time are asked in their turn
+                    callback(pending)
+                self._advance(pending)
+                if pending.answer:
+                    break
+        finally:
+            executor.shutdown(wait=False)
+            self._stragglers.extend(future for _, future in asked.values() if not future.done())
 
     def get_last_active_player(self) -> BasePlayer:
         active_players = [player for player in self._players if player.is_active]
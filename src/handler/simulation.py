@@ -0,0 +1,183 @@
+import random
+import time
+from typing import Iterable, List, Optional, Type
+
+import numpy as np
+from pydantic import BaseModel
+from rich.table import Table
+
+from src.engine.policies import RandomPolicy
+from src.engine.vectorized import BatchPolicy, VectorizedGameEngine
+from src.handler.game_handler import ResistanceCoupGameHandler, generate_player_names
+from src.models.players.ai import AIPlayer
+from src.models.players.base import BasePlayer
+from src.utils.replay import ReplayWriter
+
+
+class SimulationSummary(BaseModel):
+    seed: Optional[int] = None
+    number_of_games: int = 0
+    player_names: List[str] = []
+    wins_per_seat: List[int] = []
+    total_turns: int = 0
+    min_turns: int = 0
+    max_turns: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def average_turns(self) -> float:
+        return self.total_turns / self.number_of_games if self.number_of_games else 0.0
+
+    @property
+    def games_per_second(self) -> float:
+        return self.number_of_games / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def record_game(self, winner_seat: int, turns: int) -> None:
+        self.wins_per_seat[winner_seat] += 1
+        self.min_turns = min(self.min_turns, turns) if self.number_of_games else turns
+        self.max_turns = max(self.max_turns, turns)
+        self.total_turns += turns
+        self.number_of_games += 1
+
+    def merge(self, other: "SimulationSummary") -> None:
+        """Fold the results of another batch of games (with the same players) into this one"""
+        if not other.number_of_games:
+            return
+
+        self.wins_per_seat = [
+            wins + other_wins for wins, other_wins in zip(self.wins_per_seat, other.wins_per_seat)
+        ]
+        self.min_turns = (
+            min(self.min_turns, other.min_turns) if self.number_of_games else other.min_turns
+        )
+        self.max_turns = max(self.max_turns, other.max_turns)
+        self.total_turns += other.total_turns
+        self.number_of_games += other.number_of_games
+
+
+def game_seed(seed: int, game_index: int) -> str:
+    """The seed of a single game. Depends only on the run seed and the game's index, never on
+    which worker plays the game, so results are identical for any number of workers"""
+    return f"{seed}:{game_index}"
+
+
+def new_run_seed() -> int:
+    return random.SystemRandom().randrange(2**63)
+
+
+def play_headless_game(handler: ResistanceCoupGameHandler) -> int:
+    """Play a full game with an already set up handler and return the number of turns taken"""
+    turns = 1
+    while not handler.handle_turn():
+        turns += 1
+
+    return turns
+
+
+def play_headless_games(
+    handler: ResistanceCoupGameHandler, seed: int, game_indices: Iterable[int]
+) -> SimulationSummary:
+    """Play the games with the given indices of a seeded run on a headless handler"""
+    players = handler.players
+    summary = SimulationSummary(
+        seed=seed,
+        player_names=[player.name for player in players],
+        wins_per_seat=[0] * len(players),
+    )
+
+    for game_index in game_indices:
+        handler.reseed(game_seed(seed, game_index))
+        handler.setup_game()
+        turns = play_headless_game(handler)
+        summary.record_game(players.index(handler.remaining_player), turns)
+
+    return summary
+
+
+def run_headless_games(
+    number_of_games: int,
+    number_of_players: int = 4,
+    player_class: Type[BasePlayer] = AIPlayer,
+    seed: Optional[int] = None,
+    replay_path: Optional[str] = None,
+) -> SimulationSummary:
+    """Play a number of games back to back without any console output, optionally writing
+    every game to a replay file"""
+    if seed is None:
+        seed = new_run_seed()
+
+    player_names = generate_player_names(number_of_players)
+    replay_writer = ReplayWriter(replay_path, player_names, seed) if replay_path else None
+    try:
+        handler = ResistanceCoupGameHandler(
+            number_of_players,
+            player_class=player_class,
+            headless=True,
+            player_names=player_names,
+            replay_writer=replay_writer,
+        )
+
+        start = time.perf_counter()
+        summary = play_headless_games(handler, seed, range(number_of_games))
+        summary.elapsed_seconds = time.perf_counter() - start
+    finally:
+        if replay_writer:
+            replay_writer.close()
+
+    return summary
+
+
+def run_vectorized_games(
+    number_of_games: int,
+    number_of_players: int = 4,
+    policy: Optional[BatchPolicy] = None,
+    seed: Optional[int] = None,
+    batch_size: int = 100_000,
+) -> SimulationSummary:
+    """Play games on the vectorized engine, in lock-step batches of `batch_size` games"""
+    if seed is None:
+        seed = new_run_seed()
+
+    summary = SimulationSummary(
+        seed=seed,
+        player_names=[f"Seat {seat + 1}" for seat in range(number_of_players)],
+        wins_per_seat=[0] * number_of_players,
+    )
+
+    start = time.perf_counter()
+    for batch_index, batch_start in enumerate(range(0, number_of_games, batch_size)):
+        engine = VectorizedGameEngine(
+            min(batch_size, number_of_games - batch_start),
+            number_of_players,
+            policy or RandomPolicy(),
+            seed=np.random.SeedSequence([seed, batch_index]),
+        )
+        result = engine.run()
+        summary.merge(
+            SimulationSummary(
+                number_of_games=result.number_of_games,
+                wins_per_seat=result.wins_per_seat(number_of_players).tolist(),
+                total_turns=int(result.turns.sum()),
+                min_turns=int(result.turns.min()),
+                max_turns=int(result.turns.max()),
+            )
+        )
+    summary.elapsed_seconds = time.perf_counter() - start
+
+    return summary
+
+
+def generate_summary_table(summary: SimulationSummary) -> Table:
+    """Generate a table of the wins per player for a simulation run"""
+    table = Table("Seat", "Player", "Wins", "Win rate", title="Simulation summary")
+    for seat, (name, wins) in enumerate(zip(summary.player_names, summary.wins_per_seat)):
+        win_rate = wins / summary.number_of_games if summary.number_of_games else 0.0
+        table.add_row(str(seat + 1), name, str(wins), f"{win_rate:.1%}")
+
+    table.caption = (
+        f"{summary.number_of_games} games in {summary.elapsed_seconds:.2f}s "
+        f"({summary.games_per_second:.0f} games/s), "
+        f"turns per game: avg {summary.average_turns:.1f}, "
+        f"min {summary.min_turns}, max {summary.max_turns}, seed {summary.seed}"
+    )
+    return table
@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple, Type
+
+from src.handler.game_handler import ResistanceCoupGameHandler, generate_player_names
+from src.handler.simulation import (
+    SimulationSummary,
+    new_run_seed,
+    play_headless_games,
+    run_headless_games,
+)
+from src.models.players.ai import AIPlayer
+from src.models.players.base import BasePlayer
+
+# Each worker process owns a single headless handler, created once by the pool initializer
+_worker_handler: Optional[ResistanceCoupGameHandler] = None
+
+
+def _init_worker(player_class: Type[BasePlayer], player_names: List[str]) -> None:
+    global _worker_handler
+
+    _worker_handler = ResistanceCoupGameHandler(
+        len(player_names), player_class=player_class, headless=True, player_names=player_names
+    )
+
+
+def _play_chunk(seed: int, start: int, stop: int) -> SimulationSummary:
+    return play_headless_games(_worker_handler, seed, range(start, stop))
+
+
+def _chunk_game_indices(number_of_games: int, chunk_size: int) -> List[Tuple[int, int]]:
+    return [
+        (start, min(start + chunk_size, number_of_games))
+        for start in range(0, number_of_games, chunk_size)
+    ]
+
+
+def run_tournament(
+    number_of_games: int,
+    number_of_players: int = 4,
+    player_class: Type[BasePlayer] = AIPlayer,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> SimulationSummary:
+    """Play headless games spread over a pool of worker processes.
+
+    Every game is seeded from the run seed and its own index, so the merged summary is the same
+    for a given seed whatever the number of workers (including a single in-process run).
+    """
+    if seed is None:
+        seed = new_run_seed()
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return run_headless_games(number_of_games, number_of_players, player_class, seed)
+
+    # A few chunks per worker keeps the pool busy when some games run longer than others,
+    # while keeping the number of results sent back small
+    chunk_size = chunk_size or max(1, number_of_games // (workers * 8))
+    player_names = generate_player_names(number_of_players)
+
+    summary = SimulationSummary(
+        seed=seed, player_names=player_names, wins_per_seat=[0] * number_of_players
+    )
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(player_class, player_names)
+    ) as executor:
+        futures = [
+            executor.submit(_play_chunk, seed, start, stop)
+            for start, stop in _chunk_game_indices(number_of_games, chunk_size)
+        ]
+        for future in futures:
+            summary.merge(future.result())
+    summary.elapsed_seconds = time.perf_counter() - start_time
+
+    return summary
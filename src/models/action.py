@@ -1,7 +1,5 @@
 from enum import Enum
-from typing import List, Optional
-
-from pydantic import BaseModel
+from typing import Dict, Optional, Tuple
 
 from src.models.card import CardType
 
@@ -16,91 +14,141 @@ class ActionType(str, Enum):
     exchange = "Exchange"
 
 
+# Compact integer codes for the action types, used by the array based engines
+ACTION_TYPES: Tuple[ActionType, ...] = tuple(ActionType)
+ACTION_CODES: Dict[ActionType, int] = {
+    action_type: code for code, action_type in enumerate(ACTION_TYPES)
+}
+
+
 class CounterActionType(str, Enum):
     block_foreign_aid = "Block Foreign Aid"
     block_assassination = "Block Assassination"
     block_steal = "Block Steal"
 
 
-class Action(BaseModel):
+class Action:
+    """An action a player can declare. Actions carry no per instance state, so every action class
+    has a single shared instance: calling the class returns it"""
+
+    __slots__ = ()
+
     action_type: ActionType
     associated_card_type: Optional[CardType] = None
     requires_target: bool = False
     can_be_challenged: bool = False
     can_be_countered: bool = False
 
+    def __new__(cls):
+        instance = cls.__dict__.get("_instance")
+        if instance is None:
+            instance = super().__new__(cls)
+            cls._instance = instance
+        return instance
+
     def __str__(self):
         return f"{self.action_type.value}"
 
+    def __repr__(self):
+        return f"{self.__class__.__name__}()"
+
 
 class IncomeAction(Action):
-    action_type: ActionType = ActionType.income
+    __slots__ = ()
+    action_type = ActionType.income
 
 
 class ForeignAidAction(Action):
-    action_type: ActionType = ActionType.foreignaid
-    can_be_countered: bool = True
+    __slots__ = ()
+    action_type = ActionType.foreignaid
+    can_be_countered = True
 
 
 class CoupAction(Action):
-    action_type: ActionType = ActionType.coup
-    requires_target: bool = True
+    __slots__ = ()
+    action_type = ActionType.coup
+    requires_target = True
 
 
 class TaxAction(Action):
-    action_type: ActionType = ActionType.tax
-    associated_card_type: CardType = CardType.duke
-    can_be_challenged: bool = True
+    __slots__ = ()
+    action_type = ActionType.tax
+    associated_card_type = CardType.duke
+    can_be_challenged = True
 
 
 class AssassinateAction(Action):
-    action_type: ActionType = ActionType.assassinate
-    associated_card_type: CardType = CardType.assassin
-    requires_target: bool = True
-    can_be_challenged: bool = True
-    can_be_countered: bool = True
+    __slots__ = ()
+    action_type = ActionType.assassinate
+    associated_card_type = CardType.assassin
+    requires_target = True
+    can_be_challenged = True
+    can_be_countered = True
 
 
 class StealAction(Action):
-    action_type: ActionType = ActionType.steal
-    associated_card_type: CardType = CardType.captain
-    requires_target: bool = True
-    can_be_challenged: bool = True
-    can_be_countered: bool = True
+    __slots__ = ()
+    action_type = ActionType.steal
+    associated_card_type = CardType.captain
+    requires_target = True
+    can_be_challenged = True
+    can_be_countered = True
 
 
 class ExchangeAction(Action):
-    action_type: ActionType = ActionType.exchange
-    associated_card_type: CardType = CardType.ambassador
-    can_be_challenged: bool = True
+    __slots__ = ()
+    action_type = ActionType.exchange
+    associated_card_type = CardType.ambassador
+    can_be_challenged = True
 
 
-class CounterAction(BaseModel):
+class CounterAction:
+    """A counter to another player's action. Like actions, every counter action class has a single
+    shared instance"""
+
+    __slots__ = ()
+
     counter_type: CounterActionType
-    associated_card_type: Optional[List[CardType]]
+    associated_card_type: CardType
+
+    def __new__(cls):
+        instance = cls.__dict__.get("_instance")
+        if instance is None:
+            instance = super().__new__(cls)
+            cls._instance = instance
+        return instance
 
     def __str__(self):
         return f"{self.counter_type.value}"
 
+    def __repr__(self):
+        return f"{self.__class__.__name__}()"
+
 
 class BlockForeignAidCounterAction(CounterAction):
-    counter_type: CounterActionType = CounterActionType.block_foreign_aid
-    associated_card_type: CardType = CardType.duke
+    __slots__ = ()
+    counter_type = CounterActionType.block_foreign_aid
+    associated_card_type = CardType.duke
 
 
 class BlockAssassinationCounterAction(CounterAction):
-    counter_type: CounterActionType = CounterActionType.block_assassination
-    associated_card_type: CardType = CardType.contessa
+    __slots__ = ()
+    counter_type = CounterActionType.block_assassination
+    associated_card_type = CardType.contessa
 
 
 class BlockStealCounterAction(CounterAction):
-    counter_type: CounterActionType = CounterActionType.block_steal
-    associated_card_type: CardType = CardType.captain
+    __slots__ = ()
+    counter_type = CounterActionType.block_steal
+    associated_card_type = CardType.captain
+
+
+_COUNTER_ACTIONS: Dict[ActionType, CounterAction] = {
+    ActionType.foreignaid: BlockForeignAidCounterAction(),
+    ActionType.steal: BlockStealCounterAction(),
+    ActionType.assassinate: BlockAssassinationCounterAction(),
+}
 
 
 def get_counter_action(action_type: ActionType) -> CounterAction:
-    return {
-        ActionType.foreignaid: BlockForeignAidCounterAction(),
-        ActionType.steal: BlockStealCounterAction(),
-        ActionType.assassinate: BlockAssassinationCounterAction(),
-    }[action_type]
+    return _COUNTER_ACTIONS[action_type]
@@ -1,7 +1,6 @@
 from enum import Enum
-from typing import Dict, List
-
-from pydantic import BaseModel
+from itertools import combinations_with_replacement
+from typing import Dict, List, Optional, Sequence, Tuple
 
 
 class CardType(str, Enum):
@@ -12,6 +11,23 @@ class CardType(str, Enum):
     ambassador = "Ambassador"
 
 
+# Compact integer codes for the card types, used by the array based engines
+CARD_TYPES: Tuple[CardType, ...] = tuple(CardType)
+CARD_CODES: Dict[CardType, int] = {card_type: code for code, card_type in enumerate(CARD_TYPES)}
+
+# Every hand of one or two cards, as sorted card codes
+HANDS: Tuple[Tuple[int, ...], ...] = tuple(
+    hand for size in (1, 2) for hand in combinations_with_replacement(range(len(CARD_TYPES)), size)
+)
+HAND_INDEX: Dict[Tuple[int, ...], int] = {hand: index for index, hand in enumerate(HANDS)}
+NUMBER_OF_HANDS = len(HANDS)
+
+
+def hand_index(cards: Sequence[int]) -> int:
+    """Index in `HANDS` of a hand given as card codes, in any order"""
+    return HAND_INDEX[tuple(sorted(cards))]
+
+
 CARD_FOREGROUND_COLOR_MAP: Dict[CardType, str] = {
     CardType.contessa: "#6d191c",
     CardType.duke: "#632d55",
@@ -29,10 +45,21 @@ CARD_BACKGROUND_COLOR_MAP: Dict[CardType, str] = {
 }
 
 
-class Card(BaseModel):
-    foreground_color: str
-    background_color: str
-    card_type: CardType
+class Card:
+    """A character card. Cards carry no state beyond their type, so the deck is made up of one
+    shared instance per card type"""
+
+    __slots__ = ("card_type", "foreground_color", "background_color")
+
+    def __init__(
+        self,
+        card_type: CardType,
+        foreground_color: Optional[str] = None,
+        background_color: Optional[str] = None,
+    ):
+        self.card_type = card_type
+        self.foreground_color = foreground_color or CARD_FOREGROUND_COLOR_MAP[card_type]
+        self.background_color = background_color or CARD_BACKGROUND_COLOR_MAP[card_type]
 
     @property
     def style(self) -> str:
@@ -41,29 +68,31 @@ class Card(BaseModel):
     def __str__(self):
         return f"{self.card_type.value}"
 
+    def __repr__(self):
+        return f"Card({self.card_type.value})"
+
+
+CARDS: Dict[CardType, Card] = {card_type: Card(card_type) for card_type in CARD_TYPES}
+
+# Every card type is in the deck 3 times
+DECK_COMPOSITION: Tuple[CardType, ...] = (
+    CardType.contessa,
+    CardType.contessa,
+    CardType.contessa,
+    CardType.duke,
+    CardType.duke,
+    CardType.duke,
+    CardType.assassin,
+    CardType.assassin,
+    CardType.assassin,
+    CardType.ambassador,
+    CardType.ambassador,
+    CardType.ambassador,
+    CardType.captain,
+    CardType.captain,
+    CardType.captain,
+)
+
 
 def build_deck() -> List[Card]:
-    def _create_card(card_type: CardType):
-        return Card(
-            foreground_color=CARD_FOREGROUND_COLOR_MAP.get(card_type),
-            background_color=CARD_BACKGROUND_COLOR_MAP.get(card_type),
-            card_type=card_type,
-        )
-
-    return [
-        _create_card(CardType.contessa),
-        _create_card(CardType.contessa),
-        _create_card(CardType.contessa),
-        _create_card(CardType.duke),
-        _create_card(CardType.duke),
-        _create_card(CardType.duke),
-        _create_card(CardType.assassin),
-        _create_card(CardType.assassin),
-        _create_card(CardType.assassin),
-        _create_card(CardType.ambassador),
-        _create_card(CardType.ambassador),
-        _create_card(CardType.ambassador),
-        _create_card(CardType.captain),
-        _create_card(CardType.captain),
-        _create_card(CardType.captain),
-    ]
+    return [CARDS[card_type] for card_type in DECK_COMPOSITION]
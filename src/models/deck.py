@@ -0,0 +1,81 @@
+import random
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from src.models.card import CARD_TYPES, Card, CardType, build_deck
+
+# The cards in the deck and the number of cards of every type
+DeckSnapshot = Tuple[Tuple[Card, ...], Tuple[int, ...]]
+
+
+class Deck:
+    """The court deck.
+
+    The deck is never looked at in order, only drawn from, so instead of shuffling it every draw
+    picks a uniformly random card (swapped with the last card and popped) and returned cards are
+    simply appended. Every draw is uniform over the cards currently in the deck whatever their
+    order, which is exactly the distribution of drawing the top card of a freshly shuffled deck,
+    and both operations are O(1). The number of cards of each type is kept up to date so card
+    counting queries don't need to scan the deck.
+    """
+
+    __slots__ = ("_cards", "_counts", "_rng")
+
+    def __init__(self, rng: random.Random, cards: Iterable[Card] = ()):
+        self._rng = rng
+        self._cards: List[Card] = []
+        self._counts: Dict[CardType, int] = {}
+        self.reset(cards)
+
+    def reset(self, cards: Iterable[Card]) -> None:
+        self._cards = list(cards)
+        self._counts = dict.fromkeys(CARD_TYPES, 0)
+        for card in self._cards:
+            self._counts[card.card_type] += 1
+
+    def reset_full(self) -> None:
+        """Reset to a full deck, with 3 cards of every type"""
+        self.reset(build_deck())
+
+    def draw(self) -> Card:
+        """Draw a uniformly random card"""
+        cards = self._cards
+        index = self._rng.randrange(len(cards))
+        card = cards[index]
+        cards[index] = cards[-1]
+        cards.pop()
+
+        self._counts[card.card_type] -= 1
+        return card
+
+    def put_back(self, card: Card) -> None:
+        """Return a card to the deck. No shuffle needed, draws don't depend on the order"""
+        self._cards.append(card)
+        self._counts[card.card_type] += 1
+
+    def snapshot(self) -> DeckSnapshot:
+        return tuple(self._cards), tuple(self._counts.values())
+
+    def restore(self, snapshot: DeckSnapshot) -> None:
+        cards, counts = snapshot
+        self._cards = list(cards)
+        self._counts = dict(zip(CARD_TYPES, counts))
+
+    def count(self, card_type: CardType) -> int:
+        """Number of cards of a type left in the deck"""
+        return self._counts[card_type]
+
+    @property
+    def counts(self) -> Dict[CardType, int]:
+        return dict(self._counts)
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def __iter__(self) -> Iterator[Card]:
+        return iter(self._cards)
+
+    def __repr__(self):
+        counts = ", ".join(
+            f"{card_type.value}: {count}" for card_type, count in self._counts.items()
+        )
+        return f"Deck({counts})"
@@ -0,0 +1,145 @@
+"""Precomputed legal move tables for the actions of the game.
+
+Moves are bitmasks. For actions, bit `ACTION_CODES[action_type]` is set when the action is legal.
+Action legality only depends on the player's coins (bucketed, everything from 10 coins up is a
+forced coup) and, for targeted actions, on whether the target has any coins to steal. Every
+challenge or counter the game asks for can be passed or accepted, and any card held can be
+discarded or exchanged, so those decisions need no tables.
+"""
+
+from enum import Enum
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+from src.models.action import (
+    ACTION_CODES,
+    ACTION_TYPES,
+    Action,
+    ActionType,
+    AssassinateAction,
+    CoupAction,
+    ExchangeAction,
+    ForeignAidAction,
+    IncomeAction,
+    StealAction,
+    TaxAction,
+)
+
+
+class DecisionType(str, Enum):
+    action = "action"
+    challenge = "challenge"
+    counter = "counter"
+    discard = "discard"
+    exchange = "exchange"
+
+
+# The order in which available actions are listed to the players
+ACTIONS: Tuple[Action, ...] = (
+    IncomeAction(),
+    ForeignAidAction(),
+    TaxAction(),
+    StealAction(),
+    ExchangeAction(),
+    CoupAction(),
+    AssassinateAction(),
+)
+ACTION_BITS: Dict[ActionType, int] = {
+    action_type: 1 << ACTION_CODES[action_type] for action_type in ACTION_TYPES
+}
+TARGETED_ACTIONS_MASK = sum(
+    ACTION_BITS[action.action_type] for action in ACTIONS if action.requires_target
+)
+
+MAX_COIN_BUCKET = 10
+
+
+def _mask(*actions: Action) -> int:
+    return sum(ACTION_BITS[action.action_type] for action in actions)
+
+
+def _action_mask_for_coins(coins: int) -> int:
+    # You must coup if you have 10 coins or more
+    if coins >= 10:
+        return _mask(CoupAction())
+
+    mask = _mask(IncomeAction(), ForeignAidAction(), TaxAction(), StealAction(), ExchangeAction())
+    if coins >= 7:
+        mask |= _mask(CoupAction())
+
+    if coins >= 3:
+        mask |= _mask(AssassinateAction())
+
+    return mask
+
+
+# Legal actions indexed by coin bucket, before looking at the targets
+ACTION_MASKS: Tuple[int, ...] = tuple(
+    _action_mask_for_coins(coins) for coins in range(MAX_COIN_BUCKET + 1)
+)
+
+# Actions that can target a player, indexed by whether that player has any coins.
+# You can't steal from a player with 0 coins
+TARGET_MASKS: Tuple[int, int] = (
+    TARGETED_ACTIONS_MASK & ~_mask(StealAction()),
+    TARGETED_ACTIONS_MASK,
+)
+
+# The actions of every possible mask, in listing order
+ACTIONS_BY_MASK: Tuple[Tuple[Action, ...], ...] = tuple(
+    tuple(action for action in ACTIONS if mask & ACTION_BITS[action.action_type])
+    for mask in range(1 << len(ACTION_TYPES))
+)
+
+# Answers to yes/no decisions (challenges and counters)
+PASS, ACCEPT = 0, 1
+
+
+def action_mask(coins: int) -> int:
+    return ACTION_MASKS[min(coins, MAX_COIN_BUCKET)]
+
+
+def target_mask(target_coins: int) -> int:
+    return TARGET_MASKS[target_coins > 0]
+
+
+def legal_action_mask(coins: int, opponent_coins: Iterable[int]) -> int:
+    """Legal actions for a player, dropping targeted actions that no opponent can be targeted by"""
+    reachable = 0
+    for target_coins in opponent_coins:
+        reachable |= TARGET_MASKS[target_coins > 0]
+
+    return action_mask(coins) & (~TARGETED_ACTIONS_MASK | reachable)
+
+
+def actions_in_mask(mask: int) -> Tuple[Action, ...]:
+    return ACTIONS_BY_MASK[mask]
+
+
+def is_legal_against(action: Action, target_coins: int) -> bool:
+    return bool(TARGET_MASKS[target_coins > 0] & ACTION_BITS[action.action_type])
+
+
+@lru_cache(maxsize=None)
+def weighted_legal_actions(
+    coins: int, opponents: int, opponents_with_coins: int
+) -> Tuple[Tuple[Action, ...], Tuple[int, ...]]:
+    """Legal actions with cumulative weights, each action weighted by the number of opponents it
+    can be used against (every opponent for untargeted actions)"""
+    actions = []
+    cum_weights = []
+    total = 0
+    for action in actions_in_mask(action_mask(coins)):
+        bit = ACTION_BITS[action.action_type]
+        if action.requires_target:
+            weight = (opponents - opponents_with_coins) * bool(TARGET_MASKS[False] & bit)
+            weight += opponents_with_coins * bool(TARGET_MASKS[True] & bit)
+        else:
+            weight = opponents
+
+        if weight:
+            total += weight
+            actions.append(action)
+            cum_weights.append(total)
+
+    return tuple(actions), tuple(cum_weights)
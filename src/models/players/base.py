@@ -1,66 +1,111 @@
+import random
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Tuple, Union
-
-from pydantic import BaseModel
-
-from src.models.action import (
-    Action,
-    ActionType,
-    AssassinateAction,
-    CounterAction,
-    CoupAction,
-    ExchangeAction,
-    ForeignAidAction,
-    IncomeAction,
-    StealAction,
-    TaxAction,
-)
+from bisect import bisect
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+from src.models.action import Action
 from src.models.card import Card, CardType
+from src.models.legal_actions import (
+    ACTION_BITS,
+    TARGET_MASKS,
+    action_mask,
+    actions_in_mask,
+    is_legal_against,
+    legal_action_mask,
+    weighted_legal_actions,
+)
 
+if TYPE_CHECKING:
+    # The round history renders through the print helpers, which import the players
+    from src.utils.round_history import RoundHistory
+
+
+class BasePlayer(ABC):
+    __slots__ = ("name", "coins", "cards", "is_active", "_rng")
 
-class BasePlayer(BaseModel, ABC):
-    name: str
-    coins: int = 0
-    cards: List[Card] = []
     is_ai: bool
-    is_active: bool = False
+    # Whether the player can be asked about a challenge or a counter at the same time as the
+    # other players. Only for players whose callbacks are slow (waiting on an LLM) and don't
+    # draw from the shared random stream
+    polls_concurrently: bool = False
+
+    def __init__(
+        self,
+        name: str,
+        coins: int = 0,
+        cards: Optional[List[Card]] = None,
+        is_active: bool = False,
+    ):
+        self.name = name
+        self.coins = coins
+        self.cards = cards if cards is not None else []
+        self.is_active = is_active
+
+        # Source of randomness for the player's choices, shared with the game handler
+        self._rng = random.Random()
 
     def __str__(self):
         return f"{self.name}"
 
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(name={self.name!r}, coins={self.coins}, cards={self.cards})"
+        )
+
+    def set_rng(self, rng: random.Random) -> None:
+        self._rng = rng
+
     def reset_player(self):
         self.coins = 0
         self.cards = []
 
+    def close(self) -> None:
+        """Release whatever the player keeps between games, the game handler is done with it"""
+
     def _validate_action(self, action: Action, target_player: Optional["BasePlayer"]):
         if not target_player:
             return True
 
-        # Can't steal from player with 0 coins
-        if action.action_type == ActionType.steal and target_player.coins == 0:
-            return False
-
-        return True
+        # e.g. can't steal from player with 0 coins
+        return is_legal_against(action, target_player.coins)
 
     def available_actions(self) -> List[Action]:
-        # You must coup if you have more than 10 coins
-        if self.coins >= 10:
-            return [CoupAction()]
+        return list(actions_in_mask(action_mask(self.coins)))
+
+    def legal_actions(self, other_players: List["BasePlayer"]) -> List[Action]:
+        """Available actions that can be used against at least one of the other players"""
+        mask = legal_action_mask(self.coins, (player.coins for player in other_players))
+        return list(actions_in_mask(mask))
 
-        actions = [
-            IncomeAction(),
-            ForeignAidAction(),
-            TaxAction(),
-            StealAction(),
-            ExchangeAction(),
-        ]
-        if self.coins >= 7:
-            actions.append(CoupAction())
+    def legal_targets(
+        self, action: Action, other_players: List["BasePlayer"]
+    ) -> List["BasePlayer"]:
+        bit = ACTION_BITS[action.action_type]
+        if bit & TARGET_MASKS[False] & TARGET_MASKS[True]:
+            return list(other_players)
 
-        if self.coins >= 3:
-            actions.append(AssassinateAction())
+        return [player for player in other_players if TARGET_MASKS[player.coins > 0] & bit]
 
-        return actions
+    def _random_legal_action(
+        self, other_players: List["BasePlayer"]
+    ) -> Tuple[Action, Optional["BasePlayer"]]:
+        """Pick a random legal action and target.
+
+        Every action is weighted by the share of opponents it can legally be used against, which
+        is the same distribution as drawing an action and a target at random until the pair is
+        legal, without the loop. The target is uniform over the legal targets.
+        """
+        actions, cum_weights = weighted_legal_actions(
+            self.coins,
+            len(other_players),
+            len([player for player in other_players if player.coins]),
+        )
+        action = actions[bisect(cum_weights, self._rng.random() * cum_weights[-1])]
+
+        if not action.requires_target:
+            return action, None
+
+        return action, self._rng.choice(self.legal_targets(action, other_players))
 
     def find_card(self, card_type: CardType) -> Optional[Card]:
         for ind, card in enumerate(self.cards):
@@ -76,28 +121,47 @@ class BasePlayer(BaseModel, ABC):
     def choose_action(
         self,
         other_players: List["BasePlayer"],
-        round_history: List[str],
+        round_history: "RoundHistory",
         current_game_state: Union[str, Dict[str, str]],
     ) -> Tuple[Action, Optional["BasePlayer"]]:
         """Choose the next action to perform"""
         pass
 
     @abstractmethod
-    def determine_challenge(self, player: "BasePlayer") -> bool:
+    def determine_challenge(
+        self,
+        player_being_challenged: "BasePlayer",
+        other_players: List["BasePlayer"],
+        round_history: "RoundHistory",
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
         """Choose whether to challenge the current player"""
         pass
 
     @abstractmethod
-    def determine_counter(self, player: "BasePlayer") -> CounterAction:
+    def determine_counter(
+        self,
+        player_being_challenged: "BasePlayer",
+        other_players: List["BasePlayer"],
+        round_history: "RoundHistory",
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
         """Choose whether to counter the current player's action"""
         pass
 
     @abstractmethod
-    def remove_card(self) -> None:
+    def remove_card(
+        self, round_history: "RoundHistory", current_game_state: Union[str, Dict[str, str]]
+    ) -> str:
         """Choose a card and remove it from your hand"""
         pass
 
     @abstractmethod
-    def choose_exchange_cards(self, exchange_cards: list[Card]) -> Tuple[Card, Card]:
+    def choose_exchange_cards(
+        self,
+        exchange_cards: List[Card],
+        round_history: "RoundHistory",
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> Tuple[Card, Card]:
         """Perform the exchange action. Pick which 2 cards to send back to the deck"""
         pass
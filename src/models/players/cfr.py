@@ -0,0 +1,184 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.engine.cfr import (
+    MAX_SLOTS,
+    NUMBER_OF_INFORMATION_SETS,
+    action_information_set,
+    challenge_information_set,
+    counter_challenge_information_set,
+    counter_information_set,
+    discard_information_set,
+    pick_target,
+)
+from src.engine.compact import CLAIMED_CARD, COUNTER_CARD
+from src.models.action import ACTION_CODES, Action
+from src.models.card import CARD_CODES
+from src.models.legal_actions import ACCEPT, PASS
+from src.models.players.ai import AIPlayer
+from src.models.players.base import BasePlayer
+from src.utils.event_log import EventType
+from src.utils.print import print_text, print_texts
+from src.utils.round_history import RoundHistory
+
+
+class CFRPlayer(AIPlayer):
+    """Bot playing the average strategy of a policy trained with `src.engine.cfr`.
+
+    The policy is an array of move probabilities per information set, or the path of one saved
+    with `--export` (memory-mapped). Information sets the policy never reached are played
+    uniformly, and exchanges are random like `AIPlayer`'s.
+    """
+
+    __slots__ = ("policy",)
+
+    def __init__(self, name: str, policy: Optional[Union[str, np.ndarray]] = None, **kwargs):
+        super().__init__(name, **kwargs)
+        if isinstance(policy, str):
+            policy = np.load(policy, mmap_mode="r")
+        if policy is None:
+            policy = np.zeros((NUMBER_OF_INFORMATION_SETS, MAX_SLOTS), dtype=np.float32)
+        self.policy = policy
+
+    def choose_action(
+        self,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> Tuple[Action, Optional[BasePlayer]]:
+        """Choose the next action to perform"""
+
+        print_text(f"[bold magenta]{self}[/] is thinking...", with_markup=True)
+
+        information_set = action_information_set(
+            self._hand(),
+            self.coins,
+            len(other_players),
+            max(player.coins for player in other_players),
+        )
+        actions = self.legal_actions(other_players)
+        action = actions[
+            self._choose(information_set, [ACTION_CODES[action.action_type] for action in actions])
+        ]
+
+        target_player = None
+        if action.requires_target:
+            targets = self.legal_targets(action, other_players)
+            target_player = targets[
+                pick_target(
+                    [
+                        (index, len(player.cards), player.coins)
+                        for index, player in enumerate(targets)
+                    ]
+                )
+            ]
+        return action, target_player
+
+    def determine_challenge(
+        self,
+        player_being_challenged: BasePlayer,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
+        """Choose whether to challenge the current player"""
+
+        events = round_history.turn_events()
+        if not events:
+            return super().determine_challenge(
+                player_being_challenged, other_players, round_history, current_game_state
+            )
+
+        action = events[0]
+        last = events[-1]
+        seat = round_history.player_names.index(self.name)
+        influence = len(player_being_challenged.cards)
+        if last.event_type == EventType.counter:
+            information_set = counter_challenge_information_set(
+                self._hand(),
+                action.arg,
+                action.actor == seat,
+                _claims(round_history, last.actor, COUNTER_CARD[action.arg]) > 1,
+                influence,
+            )
+        else:
+            information_set = challenge_information_set(
+                self._hand(),
+                action.arg,
+                action.target == seat,
+                _claims(round_history, action.actor, CLAIMED_CARD[action.arg]) > 1,
+                influence,
+            )
+
+        return self._choose(information_set, (PASS, ACCEPT)) == ACCEPT
+
+    def determine_counter(
+        self,
+        player_being_challenged: BasePlayer,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
+        """Choose whether to counter the current player's action"""
+
+        events = round_history.turn_events()
+        if not events:
+            return super().determine_counter(
+                player_being_challenged, other_players, round_history, current_game_state
+            )
+
+        action = events[0]
+        seat = round_history.player_names.index(self.name)
+        information_set = counter_information_set(self._hand(), action.arg, action.target == seat)
+        return self._choose(information_set, (PASS, ACCEPT)) == ACCEPT
+
+    def remove_card(
+        self, round_history: RoundHistory, current_game_state: Union[str, Dict[str, str]]
+    ) -> str:
+        """Choose a card and remove it from your hand"""
+
+        hand = self._hand()
+        card_codes = sorted(set(hand))
+        if len(card_codes) == 1:
+            return super().remove_card(round_history, current_game_state)
+
+        information_set = discard_information_set(hand, self.coins)
+        card_code = card_codes[self._choose(information_set, card_codes)]
+        discarded_card = self.cards.pop(hand.index(card_code))
+        print_texts(
+            f"{self} discards their ",
+            (f"{discarded_card}", discarded_card.style),
+            " card",
+        )
+        return f"{self} discards their {discarded_card} card"
+
+    def _hand(self) -> List[int]:
+        return [CARD_CODES[card.card_type] for card in self.cards]
+
+    def _choose(self, information_set: int, slots: Sequence[int]) -> int:
+        """Index of the move played, drawn from the policy's probabilities of the slots"""
+        probabilities = self.policy[information_set, list(slots)]
+        total = float(probabilities.sum())
+        if total <= 0.0:
+            return self._rng.randrange(len(slots))
+
+        draw = self._rng.random() * total
+        for index, probability in enumerate(probabilities):
+            draw -= probability
+            if draw < 0.0:
+                return index
+        return len(slots) - 1
+
+
+def _claims(round_history: RoundHistory, seat: int, card: int) -> int:
+    """Number of times a player claimed a card, with actions and counters"""
+    claims = 0
+    for event in round_history.events():
+        if event.actor != seat:
+            continue
+        if event.event_type == EventType.action and CLAIMED_CARD[event.arg] == card:
+            claims += 1
+        elif event.event_type == EventType.counter and COUNTER_CARD[event.arg] == card:
+            claims += 1
+    return claims
@@ -1,12 +1,15 @@
 import os
-from typing import Any, Dict, List, Tuple, Union
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generic, Iterator, List, TypeVar, Union
 
 from autogen import ConversableAgent, GroupChatManager
 from autogen.agentchat.groupchat import GroupChat
 from jinja2 import Template
 
-from .prompts import action_prompt, game_rules, reasoning_prompt, verifier_prompt
+from .prompts import action_prompt, reasoning_prompt, verifier_prompt
 from src.models.action import Action, AssassinateAction, CoupAction
+from src.models.legal_actions import is_legal_against
 from src.models.players.base import BasePlayer
 from src.utils.round_history import RoundHistory
 
@@ -15,8 +18,17 @@ LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-4o")
 
 llm_config = {"model": LLM_MODEL, "api_key": OPENAI_API_KEY}
 
+# Compiled once, a decision only renders them with its context
+agent_templates = {
+    "reasoning_agent": Template(reasoning_prompt),
+    "verifier_agent": Template(verifier_prompt),
+    "action_parser_agent": Template(action_prompt),
+}
 
-def format_actions_for_llm(available_actions: List[Action], player_coins: int) -> str:
+
+def format_actions_for_llm(
+    available_actions: List[Action], player_coins: int, other_players: List[BasePlayer]
+) -> str:
     formatted_actions = {}
     for i, action in enumerate(available_actions, 1):
         formatted_actions[f"action_{i}"] = {
@@ -36,6 +48,10 @@ def format_actions_for_llm(available_actions: List[Action], player_coins: int) -
                 else None
             ),
         }
+        if action.requires_target:
+            formatted_actions[f"action_{i}"]["valid_targets"] = [
+                player.name for player in other_players if is_legal_against(action, player.coins)
+            ]
 
     formatted_actions["metadata"] = {
         "player_coins": player_coins,
@@ -45,8 +61,21 @@ def format_actions_for_llm(available_actions: List[Action], player_coins: int) -
     return str(formatted_actions)
 
 
-def render_template(template_string: str, **kwargs) -> str:
-    template = Template(template_string)
+def describe_actions(
+    available_actions: Union[str, List[Action]],
+    player_coins: int,
+    other_players: List[BasePlayer],
+    format_actions: bool = True,
+) -> str:
+    """The available actions as the agents are shown them"""
+    if format_actions:
+        return format_actions_for_llm(available_actions, player_coins, other_players)
+    return str(available_actions)
+
+
+def render_template(template: Union[str, Template], **kwargs) -> str:
+    if isinstance(template, str):
+        template = Template(template)
     result = template.render(**kwargs)
     return result
 
@@ -66,8 +95,82 @@ def build_agent_base(
     )
 
 
+class DecisionAgents:
+    """The group chat of a decision: the reasoning, verifier and action parser agents, their
+    manager and the player asking them. Built once and reset between decisions, only the system
+    prompts change from one decision to the next"""
+
+    def __init__(self):
+        self.agents = {
+            "reasoning_agent": build_agent_base(name="reasoning_agent", prompt=""),
+            "verifier_agent": build_agent_base(name="verifier_agent", prompt=""),
+            "action_parser_agent": build_agent_base(
+                name="action_parser_agent",
+                prompt="",
+                response_format={"type": "json_object"},
+            ),
+        }
+
+        self.group_chat = GroupChat(
+            agents=list(self.agents.values()),
+            messages=[],
+            max_round=4,  # initial user query + reasoning agent + verifier agent + action parser agent
+            allow_repeat_speaker=False,
+            speaker_selection_method="round_robin",
+        )
+        self.manager = GroupChatManager(groupchat=self.group_chat, llm_config=llm_config)
+
+        self.user_agent = ConversableAgent(
+            name="Player",
+            llm_config=None,
+            human_input_mode="NEVER",
+            code_execution_config=False,
+        )
+
+    def prepare(self, **prompt_kwargs) -> None:
+        """Clear the previous decision's chat and show the agents the context of the next one"""
+        for name, template in agent_templates.items():
+            self.agents[name].update_system_message(render_template(template, **prompt_kwargs))
+
+        self.group_chat.reset()
+        for agent in (*self.agents.values(), self.manager, self.user_agent):
+            agent.reset()
+
+
+T = TypeVar("T")
+
+
+class AgentPool(Generic[T]):
+    """Agents built once and lent out for one chat at a time. A chat never shares its agents,
+    when every set is busy (a poll whose answer was no longer needed still running, say) another
+    one is built and kept for later"""
+
+    def __init__(self, build: Callable[[], T]):
+        self._build = build
+        self._idle: List[T] = []
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        """Drop the idle agents, the agents lent out are kept once they're given back"""
+        with self._lock:
+            self._idle.clear()
+
+    @contextmanager
+    def lend(self) -> Iterator[T]:
+        with self._lock:
+            agents = self._idle.pop() if self._idle else None
+        if agents is None:
+            agents = self._build()
+        try:
+            yield agents
+        finally:
+            with self._lock:
+                self._idle.append(agents)
+
+
+@contextmanager
 def build_agent(
-    name: str,
+    pool: AgentPool[DecisionAgents],
     available_actions: List[Action],
     other_players: List[BasePlayer],
     round_history: RoundHistory,
@@ -75,49 +178,16 @@ def build_agent(
     coins: int,
     notes: str,
     format_actions: bool = True,
-) -> Tuple[GroupChatManager, Dict[str, ConversableAgent]]:
-    formatted_actions = (
-        format_actions_for_llm(available_actions, coins)
-        if format_actions
-        else str(available_actions)
-    )
-
-    common_kwargs = {
-        "GAME_RULES": game_rules,
-        "AVAILABLE_ACTIONS": formatted_actions,
-        "CURRENT_GAME_STATE": str(current_game_state),
-        "PREVIOUS_TURNS": str(round_history),
-        "PLAYER_NOTES": notes,
-    }
-
-    reasoning_agent = build_agent_base(
-        name="reasoning_agent", prompt=render_template(reasoning_prompt, **common_kwargs)
-    )
-
-    verifier_agent = build_agent_base(
-        name="verifier_agent", prompt=render_template(verifier_prompt, **common_kwargs)
-    )
-
-    action_parser_agent = build_agent_base(
-        name="action_parser_agent",
-        prompt=render_template(action_prompt, **common_kwargs),
-        response_format={"type": "json_object"},
-    )
-
-    agents = {
-        "reasoning_agent": reasoning_agent,
-        "verifier_agent": verifier_agent,
-        "action_parser_agent": action_parser_agent,
-    }
-
-    group_chat = GroupChat(
-        agents=list(agents.values()),
-        messages=[],
-        max_round=4,  # initial user query + reasoning agent + verifier agent + action parser agent
-        allow_repeat_speaker=False,
-        speaker_selection_method="round_robin",
-    )
-
-    group_chat_manager = GroupChatManager(groupchat=group_chat, llm_config=llm_config)
-
-    return group_chat_manager, agents
+) -> Iterator[DecisionAgents]:
+    """Decision agents out of the player's pool, set up for this decision and given back once the
+    chat is over"""
+    formatted_actions = describe_actions(available_actions, coins, other_players, format_actions)
+
+    with pool.lend() as agents:
+        agents.prepare(
+            AVAILABLE_ACTIONS=formatted_actions,
+            CURRENT_GAME_STATE=str(current_game_state),
+            PREVIOUS_TURNS=str(round_history),
+            PLAYER_NOTES=notes,
+        )
+        yield agents
@@ -0,0 +1,156 @@
+"""Record the LLM calls of a GPT game to a cassette, and play the game again from it offline.
+
+Every completion the agents ask for goes through autogen's `OpenAIWrapper.create`: the group
+chats of the decisions and the note taker's chats, tool calls included. While a cassette is in
+use that method is swapped out. Recording passes the requests on and appends every response to
+the cassette, replaying answers them from the cassette without touching the network.
+
+A cassette is a JSON lines file. The first line holds the seed and the player names of the game,
+which is all the game handler needs to deal and shuffle the same way again. Every other line is
+a response, keyed on a hash of its request (model, messages, tools and response format).
+Requests are matched on their key rather than on their order, as challenges and counters are
+polled from several threads at once, and identical requests get their responses in the order
+they were recorded.
+
+    python coup.py --record-llm game.jsonl
+    python coup.py --replay-llm game.jsonl
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, TextIO, Union
+
+from autogen import OpenAIWrapper
+from openai.types.chat import ChatCompletion
+
+VERSION = 1
+
+# The parts of a request that decide its response
+_REQUEST_KEYS = ("model", "messages", "tools", "response_format")
+
+
+class CassetteError(RuntimeError):
+    """The game asked for a completion the cassette has no response for"""
+
+
+def request_key(config: Dict[str, Any]) -> str:
+    request = {key: config[key] for key in _REQUEST_KEYS if config.get(key) is not None}
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Cassette:
+    """The LLM responses of one game, see the module docstring"""
+
+    def __init__(self, path: Union[str, Path], seed: int, player_names: List[str], recording: bool):
+        self.path = Path(path)
+        self.seed = seed
+        self.player_names = player_names
+        self.recording = recording
+        self.requests = 0
+        self._responses: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def record(cls, path: Union[str, Path], seed: int, player_names: List[str]) -> "Cassette":
+        """A new cassette to record a game in, replacing the file at `path`"""
+        cassette = cls(path, seed, player_names, recording=True)
+        cassette._file = open(cassette.path, "w")
+        cassette._write({"version": VERSION, "seed": seed, "player_names": player_names})
+        return cassette
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Cassette":
+        """A recorded cassette, to replay"""
+        with open(path) as file:
+            header = json.loads(file.readline())
+            if header.get("version") != VERSION:
+                raise CassetteError(f"{path} isn't a version {VERSION} cassette")
+
+            cassette = cls(path, header["seed"], header["player_names"], recording=False)
+            for line in file:
+                entry = json.loads(line)
+                cassette._responses[entry["key"]].append(entry["response"])
+        return cassette
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        # Flushed line by line, so whatever was recorded before a crash can still be replayed
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def add(self, key: str, response: ChatCompletion) -> None:
+        # Only the fields of the completion, autogen sets a few attributes of its own on it
+        data = response.model_dump(mode="json", include=set(ChatCompletion.model_fields))
+        with self._lock:
+            self.requests += 1
+            self._write({"key": key, "response": data})
+
+    def take(self, key: str) -> ChatCompletion:
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise CassetteError(
+                    f"No recorded response left for request {key[:12]} in {self.path}, "
+                    "the game went differently than when it was recorded"
+                )
+            self.requests += 1
+            return ChatCompletion.model_validate(responses.popleft())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_active: Optional[Cassette] = None
+_original_create = OpenAIWrapper.create
+
+
+def replaying() -> bool:
+    """Whether the game is replayed from a cassette, so there's no API to wait for"""
+    return _active is not None and not _active.recording
+
+
+def _create(self: OpenAIWrapper, **config: Any) -> Any:
+    cassette = _active
+    if cassette is None:
+        return _original_create(self, **config)
+
+    # The agents' llm_config holds most of the request, the call adds the messages
+    key = request_key({**self._config_list[0], **config})
+    if cassette.recording:
+        response = _original_create(self, **config)
+        cassette.add(key, response)
+        return response
+
+    response = cassette.take(key)
+    # What the wrapper sets on the completions it returns
+    response.message_retrieval_function = self._clients[0].message_retrieval
+    response.cost = 0.0
+    response.config_id = 0
+    response.pass_filter = True
+    return response
+
+
+@contextmanager
+def use_cassette(cassette: Cassette) -> Iterator[Cassette]:
+    """Record to or replay from the cassette every completion asked for in the block"""
+    global _active
+
+    if not cassette.recording:
+        # The agents can't be built without a key, replays don't use it
+        os.environ.setdefault("OPENAI_API_KEY", "replayed-from-cassette")
+
+    _active = cassette
+    OpenAIWrapper.create = _create
+    try:
+        yield cassette
+    finally:
+        OpenAIWrapper.create = _original_create
+        _active = None
+        cassette.close()
@@ -1,4 +1,3 @@
-import random
 import time
 from typing import Dict, List, Optional, Tuple, Union
 
@@ -6,15 +5,39 @@ from .gpt_player_utils import build_and_chat, parse_action
 from src.models.action import Action, ActionType
 from src.models.card import Card
 from src.models.players.base import BasePlayer
-from src.models.players.gpt.notes import Notes, take_notes
+from src.models.players.gpt.agents import AgentPool, DecisionAgents
+from src.models.players.gpt.cassette import replaying
+from src.models.players.gpt.notes import Notes, NoteTaker, take_notes
 from src.models.players.gpt.prompts import exchange_cards_prompt, remove_card_prompt
 from src.utils.print import print_text, print_texts
 from src.utils.round_history import RoundHistory
 
+# Seconds to back off before asking the agents again after an invalid answer
+RETRY_DELAY = 5
+
+
+def _wait_before_retry() -> None:
+    # Replayed answers don't come from the API, there's nothing to back off from
+    if not replaying():
+        time.sleep(RETRY_DELAY)
+
 
 class GPTPlayer(BasePlayer):
-    is_ai: bool = True
-    notes: Notes = Notes()
+    __slots__ = ("notes", "_decision_agents", "_note_takers")
+
+    is_ai = True
+    polls_concurrently = True
+
+    def __init__(self, name: str, **kwargs):
+        super().__init__(name, **kwargs)
+        self.notes = Notes()
+        # The player's agents, only built when a chat needs them and reused from then on
+        self._decision_agents: AgentPool[DecisionAgents] = AgentPool(DecisionAgents)
+        self._note_takers: AgentPool[NoteTaker] = AgentPool(NoteTaker)
+
+    def close(self) -> None:
+        self._decision_agents.clear()
+        self._note_takers.clear()
 
     def choose_action(
         self,
@@ -22,13 +45,14 @@ class GPTPlayer(BasePlayer):
         round_history: RoundHistory,
         current_game_state: Union[str, Dict[str, str]],
     ) -> Tuple[Action, Optional[BasePlayer]]:
-        take_notes(self.notes, current_game_state, round_history, self.name)
-        available_actions = self.available_actions()
+        take_notes(self._note_takers, self.notes, current_game_state, round_history, self.name)
+        available_actions = self.legal_actions(other_players)
 
         max_attempts = 5
 
         for _ in range(max_attempts):
             agent_message = build_and_chat(
+                self._decision_agents,
                 self.name,
                 available_actions,
                 other_players,
@@ -45,7 +69,7 @@ class GPTPlayer(BasePlayer):
                     f"Error: Invalid action {agent_message['content']} returned. Trying again...",
                     style="red",
                 )
-                time.sleep(5)
+                _wait_before_retry()
                 continue
 
             try:
@@ -58,7 +82,7 @@ class GPTPlayer(BasePlayer):
                     f"Error: invalid action name, {chosen_action}. Available actions: {available_actions}",
                     style="red",
                 )
-                time.sleep(5)
+                _wait_before_retry()
                 continue
 
             target_player = None
@@ -67,12 +91,12 @@ class GPTPlayer(BasePlayer):
                 target_player = next(
                     (player for player in other_players if player.name == target_player_name), None
                 )
-                if not target_player:
+                if not target_player or not self._validate_action(target_action, target_player):
                     print_text(
                         f"Error: Invalid target player '{target_player_name}'. Trying again...",
                         style="red",
                     )
-                    time.sleep(5)
+                    _wait_before_retry()
                     continue
 
             return target_action, target_player
@@ -81,9 +105,7 @@ class GPTPlayer(BasePlayer):
             f"Error: Failed to choose a valid action after {max_attempts} attempts. Choosing randomly.",
             style="red",
         )
-        return random.choice(available_actions), (
-            random.choice(other_players) if available_actions[0].requires_target else None
-        )
+        return self._random_legal_action(other_players)
 
     def _determine_action(
         self,
@@ -95,6 +117,7 @@ class GPTPlayer(BasePlayer):
     ) -> bool:
         while True:
             agent_message = build_and_chat(
+                self._decision_agents,
                 self.name,
                 f"{action_type.capitalize()} player action: True or False. \nTrue: {action_type} the player's action.\
                 \nFalse: do not {action_type} the player's action.\
@@ -119,7 +142,7 @@ class GPTPlayer(BasePlayer):
                     f"Error: invalid {action_type} action '{action_decision}'. Trying again...",
                     style="red",
                 )
-                time.sleep(5)
+                _wait_before_retry()
 
     def determine_challenge(
         self,
@@ -153,6 +176,7 @@ class GPTPlayer(BasePlayer):
 
         for _ in range(max_attempts):
             agent_message = build_and_chat(
+                self._decision_agents,
                 self.name,
                 remove_card_prompt.replace("{{NUM_CARDS}}", str(len(self.cards))),
                 [],
@@ -177,7 +201,7 @@ class GPTPlayer(BasePlayer):
                 return f"{self} discards their {discarded_card} card"
             else:
                 print_text(f"Error: Invalid index '{index}'. Trying again...", style="red")
-                time.sleep(5)
+                _wait_before_retry()
 
         return f"{self} discards their {self.cards.pop()} card"
 
@@ -191,7 +215,7 @@ class GPTPlayer(BasePlayer):
             raise ValueError("No cards provided for exchange")
 
         self.cards += exchange_cards
-        random.shuffle(self.cards)
+        self._rng.shuffle(self.cards)
 
         formatted_exchange_cards = ", ".join(str(card) for card in exchange_cards)
 
@@ -199,6 +223,7 @@ class GPTPlayer(BasePlayer):
 
         for _ in range(max_attempts):
             agent_message = build_and_chat(
+                self._decision_agents,
                 self.name,
                 exchange_cards_prompt.replace("{{NUM_CARDS}}", str(len(self.cards))),
                 [],
@@ -234,6 +259,6 @@ class GPTPlayer(BasePlayer):
                 return first_card, second_card
             else:
                 print_text(f"Error: Invalid indices '{indices}'. Trying again...", style="red")
-                time.sleep(5)
+                _wait_before_retry()
 
         return self.cards.pop(), self.cards.pop()
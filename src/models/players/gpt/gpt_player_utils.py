@@ -1,19 +1,26 @@
 # gpt_player_utils.py
 
 import json
-from typing import Dict, List, Union
-
-from autogen import ConversableAgent
+from typing import Dict, List, Optional, Union
 
 from src.models.players.base import BasePlayer
-from src.models.players.gpt.agents import build_agent
+from src.models.players.gpt.agents import (
+    LLM_MODEL,
+    AgentPool,
+    DecisionAgents,
+    build_agent,
+    describe_actions,
+)
+from src.models.players.gpt.response_cache import decision_key, get_response_cache
 from src.utils.print import print_text
 from src.utils.round_history import RoundHistory
 
 
-# build a groupchat, query it, then return the json response
+# set up the player's groupchat, query it, then return the json response
 # the json response will always be the last message of the action_parser_agent
+# answers are cached on disk, a decision asked again in the same context isn't sent again
 def build_and_chat(
+    agent_pool: AgentPool[DecisionAgents],
     player_name: str,
     available_actions: Union[str, List],
     other_players: List[BasePlayer],
@@ -24,8 +31,22 @@ def build_and_chat(
     message: str,
     format_actions: bool = True,
 ) -> Dict:
-    group_chat_manager, agents = build_agent(
-        player_name,
+    cache = get_response_cache()
+    if cache is not None:
+        key = decision_key(
+            LLM_MODEL,
+            player_name,
+            describe_actions(available_actions, coins, other_players, format_actions),
+            current_game_state,
+            str(round_history),
+            notes,
+            message,
+        )
+        if (content := cache.get(key)) is not None:
+            return {"content": content, "role": "user", "name": "action_parser_agent"}
+
+    with build_agent(
+        agent_pool,
         available_actions,
         other_players,
         round_history,
@@ -33,19 +54,23 @@ def build_and_chat(
         coins,
         notes=notes,
         format_actions=format_actions,
-    )
+    ) as agents:
+        _ = agents.user_agent.initiate_chat(agents.manager, message=message)
+        print()
 
-    user_agent = ConversableAgent(
-        name="Player",
-        llm_config=None,
-        human_input_mode="NEVER",
-        code_execution_config=False,
-    )
+        agent_message = agents.manager.last_message(agents.agents["action_parser_agent"])
 
-    _ = user_agent.initiate_chat(group_chat_manager, message=message)
-    print()
+    if cache is not None and _is_json_object(agent_message.get("content")):
+        # Only answers that parse are kept, the players ask again after an invalid one
+        cache.put(key, agent_message["content"])
+    return agent_message
 
-    return group_chat_manager.last_message(agents["action_parser_agent"])
+
+def _is_json_object(content: Optional[str]) -> bool:
+    try:
+        return isinstance(json.loads(content), dict)
+    except (TypeError, json.JSONDecodeError):
+        return False
 
 
 # get the action from the agent response, which should always be "content"
@@ -3,11 +3,15 @@ from collections import defaultdict
 from typing import Annotated, Dict, List, Union
 
 from autogen import ConversableAgent, register_function
+from jinja2 import Template
 from pydantic import BaseModel
 
 from src import PLAYER_NOTES_DIR
+from src.models.players.gpt.agents import AgentPool, render_template
 from src.models.players.gpt.prompts import note_prompt
 
+note_template = Template(note_prompt)
+
 
 class Notes(BaseModel):
     notes: Dict[str, List[str]] = {}
@@ -45,80 +49,103 @@ class Notes(BaseModel):
         arbitrary_types_allowed = True
 
 
-def take_notes(
-    player_notes: Notes,
-    current_game_state: Union[str, Dict[str, str]],
-    round_history: List[str],
-    current_player_name: str,
-) -> None:
-    def add_note(
-        character: Annotated[str, "The character to add a note for"],
-        notes: Annotated[
-            List[str], "The note(s) to add. Entries can be just a string, without numbers"
-        ],
-    ) -> str:
-        response = ""
-        for i, note in enumerate(notes):
-            # format this so we know which note was added
-            response += f"{i+1}. {player_notes.add_note(character, note)}\n"
-
-        return response
-
-    def delete_note(
-        character: Annotated[str, "The character to delete a note for"],
-        notes: Annotated[
-            List[str],
-            "The note(s) to delete. Entries should be just a string, without numbers.\
-            The string should match exactly with the note to delete",
-        ],
-    ) -> str:
-        response = ""
-        for i, note in enumerate(notes):
-            # format this so we know which note was deleted
-            response += f"{i+1}. {player_notes.delete_note(character, note)}\n"
+class NoteTaker:
+    """The note taker of a player and the agent running its tools, built once. The tools work on
+    the notes being taken, set for every chat"""
 
-        return response
+    def __init__(self):
+        self.notes = Notes()
 
-    note_take_prompt = note_prompt.replace("{{GAME_STATE}}", str(current_game_state)).replace(
-        "{{ROUND_HISTORY}}", str(round_history).replace("{{PLAYER_NOTES}}", str(player_notes))
-    )
+        def add_note(
+            character: Annotated[str, "The character to add a note for"],
+            notes: Annotated[
+                List[str], "The note(s) to add. Entries can be just a string, without numbers"
+            ],
+        ) -> str:
+            response = ""
+            for i, note in enumerate(notes):
+                # format this so we know which note was added
+                response += f"{i+1}. {self.notes.add_note(character, note)}\n"
 
-    llm_config = {"model": "gpt-4o", "api_key": os.environ.get("OPENAI_API_KEY")}
-    note_taker = ConversableAgent(
-        name="Note Taker",
-        system_message=note_take_prompt,
-        llm_config=llm_config,
-    )
+            return response
 
-    user_proxy = ConversableAgent(
-        name="User",
-        llm_config=False,
-        human_input_mode="NEVER",
-        is_termination_msg=lambda msg: msg.get("content") is not None
-        and "terminate" in msg["content"].lower(),  # noqa
-    )
+        def delete_note(
+            character: Annotated[str, "The character to delete a note for"],
+            notes: Annotated[
+                List[str],
+                "The note(s) to delete. Entries should be just a string, without numbers.\
+            The string should match exactly with the note to delete",
+            ],
+        ) -> str:
+            response = ""
+            for i, note in enumerate(notes):
+                # format this so we know which note was deleted
+                response += f"{i+1}. {self.notes.delete_note(character, note)}\n"
+
+            return response
+
+        llm_config = {"model": "gpt-4o", "api_key": os.environ.get("OPENAI_API_KEY")}
+        self.note_taker = ConversableAgent(
+            name="Note Taker",
+            system_message="",
+            llm_config=llm_config,
+        )
+
+        self.user_proxy = ConversableAgent(
+            name="User",
+            llm_config=False,
+            human_input_mode="NEVER",
+            is_termination_msg=lambda msg: msg.get("content") is not None
+            and "terminate" in msg["content"].lower(),  # noqa
+        )
 
-    register_function(
-        add_note,
-        caller=note_taker,
-        executor=user_proxy,
-        name="add_note",
-        description="Add a note or multiple notes about an opposing character in the game.\
+        register_function(
+            add_note,
+            caller=self.note_taker,
+            executor=self.user_proxy,
+            name="add_note",
+            description="Add a note or multiple notes about an opposing character in the game.\
         Returns a message indicating the success or failure of the addition(s) for the corresponding notes passed in.",
-    )
+        )
 
-    register_function(
-        delete_note,
-        caller=note_taker,
-        executor=user_proxy,
-        name="delete_note",
-        description="Delete a note or multiple notes about an opposing character in the game.\
+        register_function(
+            delete_note,
+            caller=self.note_taker,
+            executor=self.user_proxy,
+            name="delete_note",
+            description="Delete a note or multiple notes about an opposing character in the game.\
         Returns a message indicating the success or failure of the deletion(s) for the corresponding notes passed in.",
-    )
+        )
 
-    _ = user_proxy.initiate_chat(
-        note_taker, message=f"I am currently playing as {current_player_name}.", max_turns=3
+    def prepare(self, player_notes: Notes, system_message: str) -> None:
+        """Clear the previous chat and take the next notes"""
+        self.notes = player_notes
+        self.note_taker.update_system_message(system_message)
+        self.note_taker.reset()
+        self.user_proxy.reset()
+
+
+def take_notes(
+    note_takers: AgentPool[NoteTaker],
+    player_notes: Notes,
+    current_game_state: Union[str, Dict[str, str]],
+    round_history: List[str],
+    current_player_name: str,
+) -> None:
+    note_take_prompt = render_template(
+        note_template,
+        GAME_STATE=str(current_game_state),
+        PREVIOUS_TURNS=str(round_history),
+        PLAYER_NOTES=str(player_notes),
     )
 
+    with note_takers.lend() as note_taker:
+        note_taker.prepare(player_notes, note_take_prompt)
+        _ = note_taker.user_proxy.initiate_chat(
+            note_taker.note_taker,
+            message=f"I am currently playing as {current_player_name}.",
+            max_turns=3,
+        )
+
     with open(PLAYER_NOTES_DIR / f"{current_player_name}_notes.txt", "w") as f:
         f.write(str(player_notes))
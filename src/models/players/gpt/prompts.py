@@ -93,42 +93,42 @@ game_rules = """
     """
 
 
-reasoning_prompt = """
-You are a genius board game player, masterful and wise. Your task is to analyze the current state of a game, including notes on other players, and determine the best next action/move to take in order to win. Follow these instructions carefully:
-
-1. First, review the rules of the game:
+# Every agent but the action parser is shown the rules, so their prompts all open with them, word
+# for word, followed by the agent's instructions. What changes from one call to the next comes
+# last, the turns first as they only grow. Providers cache the beginning prompts share, so the
+# rules and instructions aren't processed again for every call
+rules_preamble = (
+    """
+You are playing The Resistance: Coup, a board game. These are its rules:
 <game_rules>
-{{GAME_RULES}}
+"""
+    + game_rules
+    + """
 </game_rules>
+"""
+)
 
-2. Next, familiarize yourself with the available actions:
-<available_actions>
-{{AVAILABLE_ACTIONS}}
-</available_actions>
-
-3. Now, examine the current state of the game:
-<current_game_state>
-{{CURRENT_GAME_STATE}}
-</current_game_state>
 
-4. Review previous turns in the rounds (if any) to understand the game history:
-<previous_turns>
-{{PREVIOUS_TURNS}}
-</previous_turns>
+reasoning_prompt = (
+    rules_preamble
+    + """
+You are a genius board game player, masterful and wise. Your task is to analyze the current state of a game, including notes on other players, and determine the best next action/move to take in order to win. Follow these instructions carefully:
 
+1. First, review the rules of the game above.
 
-5.Review the notes taken on opposing players:
-<notes>
-{{PLAYER_NOTES}}
-</notes>
+2. Next, review the information on the game given at the end, after these instructions:
+   - The previous turns in the rounds (if any), to understand the game history
+   - The notes taken on opposing players
+   - The current state of the game
+   - The available actions
 
-6. Analyze the situation and determine the best next action:
+3. Analyze the situation and determine the best next action:
    a. Consider the game rules, available actions, current game state, and previous turns (if any).
    b. Think through potential strategies and their outcomes.
    c. Evaluate the pros and cons of each possible action.
    d. Consider how your action might affect other players and their potential responses.
 
-7. Provide your analysis and decision in the following format:
+4. Provide your analysis and decision in the following format:
    <analysis>
    Step-by-step thought process leading to your decision. Include:
    - Key observations about the current game state
@@ -142,41 +142,32 @@ You are a genius board game player, masterful and wise. Your task is to analyze
    </decision>
    
    Remember to not introduce any external information and that if an action requires a targeted player, ensure that player's name is clearly identified in your decision.
-"""
-
-
-verifier_prompt = """
-You are an expert board game analyst tasked with critiquing a proposed plan for a game in progress. You also have a keen eye for any mistakes. You will be provided with the game rules, current game state, previous turns (if any), taken notes about opposing players, and a proposed plan. Your job is to thoroughly analyze a plan for the next action, identify any flaws, and recommend the best course of action. These flaws may include incorrect parameters returned, invalid actions, or illogical decisions.
-
-First, familiarize yourself with the game:
-
-<game_rules>
-{{GAME_RULES}}
-</game_rules>
-
-Now, consider the current state of the game:
-
-<game_state>
-{{GAME_STATE}}
-</game_state>
-
-Review any previous turns in the rounds:
 
 <previous_turns>
 {{PREVIOUS_TURNS}}
 </previous_turns>
 
-Review the notes taken on opposing players:
 <notes>
 {{PLAYER_NOTES}}
 </notes>
 
+<current_game_state>
+{{CURRENT_GAME_STATE}}
+</current_game_state>
 
-Finally, examine the possible actions you can take and make sure we can take ONLY one of the following actions:
 <available_actions>
 {{AVAILABLE_ACTIONS}}
 </available_actions>
+"""
+)
+
 
+verifier_prompt = (
+    rules_preamble
+    + """
+You are an expert board game analyst tasked with critiquing a proposed plan for a game in progress. You also have a keen eye for any mistakes. You will be provided with the game rules, current game state, previous turns (if any), taken notes about opposing players, and a proposed plan. Your job is to thoroughly analyze a plan for the next action, identify any flaws, and recommend the best course of action. These flaws may include incorrect parameters returned, invalid actions, or illogical decisions.
+
+First, familiarize yourself with the game rules above. Then review the information on the game given at the end, after these instructions: the previous turns in the rounds, the notes taken on opposing players and the current state of the game. Finally, examine the possible actions you can take and make sure we can take ONLY one of the available actions.
 
 To analyze this plan, follow these steps:
 
@@ -207,18 +198,34 @@ Final recommended action...
 </response>
 
 Remember to base your analysis and recommendation solely on the information provided in the game rules, game state, previous turns, and proposed plan. Do not introduce any external information or assumptions not included in these inputs. If the action requires a targeted player, ensure that player's name is clearly identified in your recommendation.
+
+<previous_turns>
+{{PREVIOUS_TURNS}}
+</previous_turns>
+
+<notes>
+{{PLAYER_NOTES}}
+</notes>
+
+<game_state>
+{{CURRENT_GAME_STATE}}
+</game_state>
+
+<available_actions>
+{{AVAILABLE_ACTIONS}}
+</available_actions>
 """
+)
 
 
+# Without the rules, as the action parser only matches a recommendation to an action: its prompt
+# is too short to be cached either way
 action_prompt = """
 You are tasked with generating a valid JSON dict based on reasoning steps for a move in a board game and a list of available actions. Follow these instructions carefully:
 
 1. First, review the recommended action provided.
 
-2. Next, examine the list of available actions:
-<available_actions>
-{{AVAILABLE_ACTIONS}}
-</available_actions>
+2. Next, examine the list of available actions given at the end, after these instructions.
 
 3. Match this conclusion with the most appropriate action from the list of available actions.
 
@@ -231,33 +238,19 @@ You are tasked with generating a valid JSON dict based on reasoning steps for a
    - If no player is targeted, omit the "targeted_player" key entirely.
 
 Remember to ensure that the action you choose is valid and present in the list of available actions. If the reasoning steps don't clearly match any available action, choose the closest logical match based on the context provided. Remember to generate valid JSON only.
+
+<available_actions>
+{{AVAILABLE_ACTIONS}}
+</available_actions>
 """
 
 
-note_prompt = """
+note_prompt = (
+    rules_preamble
+    + """
 You are a professional board game player and note taker. Your task is to take detailed notes on what cards you think opposing players have in their hands and what their strategies might be. You will be given the rules of the game, the current state of the game, history of the round, and notes taken already. Based on this information, you will take and adjust notes accordingly.
 
-First, carefully read and internalize the rules of the game:
-<game_rules>
-{{GAME_RULES}}
-</game_rules>
-
-Next, review the current state of the game:
-<game_state>
-{{GAME_STATE}}
-</game_state>
-
-Now, review the previous actions in the rounds:
-
-<previous_turns>
-{{PREVIOUS_TURNS}}
-</previous_turns>
-
-
-Here's the notes that have already been taken:
-<player_notes>
-{{PLAYER_NOTES}}
-</player_notes>
+First, carefully read and internalize the rules of the game above. The previous actions in the rounds, the notes that have already been taken and the current state of the game are given at the end, after these instructions.
 
 To complete your task, follow these steps:
 
@@ -292,10 +285,21 @@ To complete your task, follow these steps:
 
 Remember to think step by step and thoroughly as you analyze the game and take notes. Your goal is to provide accurate and useful information about the opposing players' possible hands and strategies.
 
+<previous_turns>
+{{PREVIOUS_TURNS}}
+</previous_turns>
+
+<player_notes>
+{{PLAYER_NOTES}}
+</player_notes>
+
+<game_state>
+{{GAME_STATE}}
+</game_state>
+
 Begin your analysis and note-taking now.
 """
-
-note_prompt = note_prompt.replace("{{GAME_RULES}}", game_rules)
+)
 
 
 #### ACTION PROMPTS
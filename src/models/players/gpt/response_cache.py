@@ -0,0 +1,199 @@
+"""Persistent cache of the answers the GPT players' group chats come to.
+
+Many decisions are asked in nearly the same words over and over (the forced coup at 10 coins,
+opening moves, the same challenge in the same spot), so the parsed answer of the action parser
+agent is kept on disk, keyed on everything the agents get to see: the prompt templates, the
+player, the available actions, the game state, the rounds shown, the notes, the question and the
+model. Game states and questions are canonicalized first, so differences in whitespace or key
+order don't make a miss.
+
+The cache is a SQLite database, so processes playing at the same time share it, and it's bounded
+in size: past `max_bytes` the least recently used answers are evicted. `LLM_CACHE_PATH` sets the
+file (empty to turn the cache off) and `LLM_CACHE_MAX_BYTES` the bound.
+
+Run `python -m src.models.players.gpt.response_cache` for statistics, `--clear` to empty it.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Union
+
+from src import SRC_DIR
+from src.models.players.gpt.prompts import (
+    action_prompt,
+    game_rules,
+    reasoning_prompt,
+    verifier_prompt,
+)
+
+DEFAULT_PATH = SRC_DIR.parent / "llm_cache.sqlite"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Changes whenever a prompt does, so answers to other prompts are never served
+TEMPLATE_ID = hashlib.sha256(
+    "\0".join((game_rules, reasoning_prompt, verifier_prompt, action_prompt)).encode()
+).hexdigest()[:16]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+# Drops the least recently used answers beyond the first `max_bytes`, newest first
+_EVICT = """
+DELETE FROM responses WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS kept FROM responses
+    ) WHERE kept > ?
+)
+"""
+
+
+class CacheStats(NamedTuple):
+    entries: int
+    size: int
+    hits: int
+    misses: int
+
+
+def _canonical_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _canonical_state(game_state: Union[str, Dict[str, str]]) -> str:
+    if isinstance(game_state, dict):
+        return json.dumps(game_state, sort_keys=True, separators=(",", ":"))
+    return _canonical_text(game_state)
+
+
+def decision_key(
+    model: str,
+    player_name: str,
+    available_actions: str,
+    game_state: Union[str, Dict[str, str]],
+    history: str,
+    notes: str,
+    message: str,
+) -> str:
+    """The cache key of a decision, from what the agents are shown for it"""
+    context = [
+        TEMPLATE_ID,
+        model,
+        player_name,
+        _canonical_text(available_actions),
+        _canonical_state(game_state),
+        _canonical_text(history),
+        _canonical_text(notes),
+        _canonical_text(message),
+    ]
+    return hashlib.sha256(json.dumps(context).encode()).hexdigest()
+
+
+class ResponseCache:
+    """Size bounded, least recently used cache of responses in a SQLite database. It can be
+    shared by the threads of a process and by several processes"""
+
+    def __init__(self, path: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # One connection for the process, the challenge and counter polls ask from threads
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, len(key) + len(value.encode()), time.time()),
+            )
+            self._connection.execute(_EVICT, (self.max_bytes,))
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return CacheStats(entries, size, self.hits, self.misses)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The cache set up from the environment, None if it's turned off"""
+    global _cache
+
+    path = os.environ.get("LLM_CACHE_PATH", str(DEFAULT_PATH))
+    if not path:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            max_bytes = int(os.environ.get("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            _cache = ResponseCache(path, max_bytes)
+    return _cache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Statistics of the LLM response cache")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached response")
+    args = parser.parse_args()
+
+    cache = get_response_cache()
+    if cache is None:
+        print("The response cache is turned off (LLM_CACHE_PATH is empty)")
+        return
+
+    if args.clear:
+        cache.clear()
+    stats = cache.stats()
+    print(
+        f"{cache.path}: {stats.entries} responses, {stats.size / 1024:.1f} KiB "
+        f"of {cache.max_bytes / 1024 / 1024:.0f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 from src.models.action import Action
 from src.models.card import Card
@@ -10,15 +10,18 @@ from src.utils.print import (
     print_texts,
     print_tree,
 )
+from src.utils.round_history import RoundHistory
 
 
 class HumanPlayer(BasePlayer):
-    is_ai: bool = False
+    __slots__ = ()
+
+    is_ai = False
 
     def _choose_action(
         self, other_players: List[BasePlayer]
     ) -> Tuple[Action, Optional[BasePlayer]]:
-        available_actions = self.available_actions()
+        available_actions = self.legal_actions(other_players)
 
         print_tree(
             "You have the following actions available:",
@@ -50,7 +53,12 @@ class HumanPlayer(BasePlayer):
 
         return target_action, target_player
 
-    def choose_action(self, other_players: List[BasePlayer]) -> Tuple[Action, Optional[BasePlayer]]:
+    def choose_action(
+        self,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> Tuple[Action, Optional[BasePlayer]]:
         """Choose the next action to perform"""
 
         target_action, target_player = self._choose_action(other_players)
@@ -63,19 +71,33 @@ class HumanPlayer(BasePlayer):
 
         return target_action, target_player
 
-    def determine_challenge(self, player: BasePlayer) -> bool:
+    def determine_challenge(
+        self,
+        player_being_challenged: BasePlayer,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
         """Choose whether to challenge the current player"""
 
-        challenge = print_confirm(f"Do you wish to challenge {str(player)}?")
+        challenge = print_confirm(f"Do you wish to challenge {str(player_being_challenged)}?")
         return challenge
 
-    def determine_counter(self, player: BasePlayer) -> bool:
+    def determine_counter(
+        self,
+        player_being_challenged: BasePlayer,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
         """Choose whether to counter the current player's action"""
 
-        challenge = print_confirm(f"Do you wish to counter {str(player)}?")
+        challenge = print_confirm(f"Do you wish to counter {str(player_being_challenged)}?")
         return challenge
 
-    def remove_card(self) -> None:
+    def remove_card(
+        self, round_history: RoundHistory, current_game_state: Union[str, Dict[str, str]]
+    ) -> str:
         """Choose a card and remove it from your hand"""
 
         print_text("Unfortunately you have to discard a card...")
@@ -103,8 +125,14 @@ class HumanPlayer(BasePlayer):
             (f"{discarded_card}", discarded_card.style),
             " card",
         )
-
-    def choose_exchange_cards(self, exchange_cards: list[Card]) -> Tuple[Card, Card]:
+        return f"{self} discarded their {discarded_card} card"
+
+    def choose_exchange_cards(
+        self,
+        exchange_cards: List[Card],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> Tuple[Card, Card]:
         """Perform the exchange action. Pick which 2 cards to send back to the deck"""
 
         print_text("You drew 2 cards from the deck, but you have to give 2 back...")
@@ -0,0 +1,497 @@
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from src.engine.compact import (
+    ACTIONS_BY_CODE,
+    NO_PLAYER,
+    NO_TARGET,
+    NUMBER_OF_CARD_TYPES,
+    TOTAL_COINS,
+    AfterDiscard,
+    CompactGame,
+    Phase,
+    decode_action,
+    decode_kept_cards,
+    random_move,
+)
+from src.engine.tablebase import SCORES, Tablebase
+from src.models.action import Action
+from src.models.card import CARD_CODES, DECK_COMPOSITION, HANDS, Card
+from src.models.legal_actions import ACCEPT
+from src.models.players.ai import AIPlayer
+from src.models.players.base import BasePlayer
+from src.utils.beliefs import BeliefTracker
+from src.utils.event_log import Event, EventType
+from src.utils.print import print_text, print_texts
+from src.utils.round_history import RoundHistory
+
+# Index in `HANDS` of the hands of every size, with the copies of every card they hold
+_HANDS_BY_SIZE: Dict[int, Tuple[Tuple[int, Tuple[Tuple[int, int], ...]], ...]] = {
+    size: tuple(
+        (index, tuple((card, hand.count(card)) for card in sorted(set(hand))))
+        for index, hand in enumerate(HANDS)
+        if len(hand) == size
+    )
+    for size in (1, 2)
+}
+
+
+class _Node:
+    __slots__ = ("children", "player", "visits", "reward", "avails")
+
+    def __init__(self, player: int = NO_PLAYER):
+        self.children: Dict[int, "_Node"] = {}
+        # The player who made the move leading to this node
+        self.player = player
+        self.visits = 0
+        self.reward = 0.0
+        self.avails = 1
+
+
+class ISMCTSPlayer(AIPlayer):
+    """Bot playing with information set Monte Carlo tree search.
+
+    For every decision the hidden cards (the opponents' hands and the deck) are determinized
+    from public information: everything except the player's own hand and the discarded cards
+    is dealt at random, the opponents' hands weighted by a `BeliefTracker` following the game
+    from our seat (uniformly with `use_beliefs=False`). Every iteration searches one
+    determinization on the compact engine, the iterations share one tree keyed by moves, and
+    games are played out with the same random moves as `AIPlayer`. A search stops after
+    `iterations` iterations or `time_limit` seconds, whichever comes first. Given a
+    `tablebase`, playouts stop once two players remain and are scored with the value of the
+    endgame.
+
+    The opponents are only observed through what the game shows: coins, the number of cards in
+    their hands and the round history. Decisions where the public state can't be reconstructed
+    fall back to `AIPlayer`'s random choices.
+    """
+
+    __slots__ = (
+        "iterations",
+        "time_limit",
+        "exploration",
+        "max_rollout_turns",
+        "tablebase",
+        "use_beliefs",
+        "_table",
+        "_beliefs",
+        "_hand_weights",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        iterations: int = 200,
+        time_limit: Optional[float] = 0.04,
+        exploration: float = 0.7,
+        max_rollout_turns: Optional[int] = None,
+        tablebase: Optional[Tablebase] = None,
+        use_beliefs: bool = True,
+        **kwargs,
+    ):
+        super().__init__(name, **kwargs)
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.max_rollout_turns = max_rollout_turns
+        self.tablebase = tablebase
+        self.use_beliefs = use_beliefs
+        # The players seen so far, by name. The handler keeps the same players between games
+        self._table: Dict[str, BasePlayer] = {}
+        # Beliefs about the hands from our seat, started on the first decision of a game, and
+        # the probabilities of every hand of every player at the decision being searched
+        self._beliefs: Optional[BeliefTracker] = None
+        self._hand_weights: Optional[List[List[float]]] = None
+
+    def reset_player(self):
+        super().reset_player()
+        self._beliefs = None
+
+    def choose_action(
+        self,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> Tuple[Action, Optional[BasePlayer]]:
+        """Choose the next action to perform"""
+
+        print_text(f"[bold magenta]{self}[/] is thinking...", with_markup=True)
+
+        self._see(other_players)
+        game = self._observe(round_history)
+        if game is None:
+            return super().choose_action(other_players, round_history, current_game_state)
+
+        game.phase = Phase.action
+        game.to_move = game.current = self._seat(round_history)
+
+        action_code, target = decode_action(self._search(game))
+        target_player = None
+        if target != NO_TARGET:
+            target_player = self._table[round_history.player_names[target]]
+
+        return ACTIONS_BY_CODE[action_code], target_player
+
+    def determine_challenge(
+        self,
+        player_being_challenged: BasePlayer,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
+        """Choose whether to challenge the current player"""
+
+        self._see(other_players, (player_being_challenged,))
+        game = self._observe(round_history)
+        events = round_history.turn_events()
+        if game is None or not events:
+            return super().determine_challenge(
+                player_being_challenged, other_players, round_history, current_game_state
+            )
+
+        last = events[-1]
+        seat = self._seat(round_history)
+        self._set_action(game, events[0])
+        if last.event_type == EventType.counter:
+            game.counterer = last.actor
+            self._set_poll(game, Phase.counter_challenge, game.other_active_seats(last.actor), seat)
+        else:
+            self._set_poll(game, Phase.challenge, game.other_active_seats(game.current), seat)
+
+        return self._search(game) == ACCEPT
+
+    def determine_counter(
+        self,
+        player_being_challenged: BasePlayer,
+        other_players: List[BasePlayer],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> bool:
+        """Choose whether to counter the current player's action"""
+
+        self._see(other_players, (player_being_challenged,))
+        game = self._observe(round_history)
+        events = round_history.turn_events()
+        if game is None or not events:
+            return super().determine_counter(
+                player_being_challenged, other_players, round_history, current_game_state
+            )
+
+        self._set_action(game, events[0])
+        seat = self._seat(round_history)
+        self._set_poll(game, Phase.counter, game.other_active_seats(game.current), seat)
+
+        return self._search(game) == ACCEPT
+
+    def remove_card(
+        self, round_history: RoundHistory, current_game_state: Union[str, Dict[str, str]]
+    ) -> str:
+        """Choose a card and remove it from your hand"""
+
+        events = round_history.turn_events()
+        # A challenge we lost: the revealed card is swapped once we discarded
+        revealed = None
+        if events and events[-1].event_type == EventType.challenge_lost:
+            revealed = next(event for event in events if event.event_type == EventType.reveal)
+
+        known_cards = (revealed.arg,) if revealed else ()
+        game = self._observe(round_history, *known_cards)
+        if game is None or not events or len(self.cards) == 1:
+            return super().remove_card(round_history, current_game_state)
+
+        seat = self._seat(round_history)
+        self._set_action(game, events[0])
+        countered = any(event.event_type == EventType.counter for event in events)
+        if countered:
+            game.counterer = next(
+                event.actor for event in events if event.event_type == EventType.counter
+            )
+
+        last = events[-1].event_type
+        if revealed:
+            game.revealed_card = revealed.arg
+            game.revealed_by = revealed.actor
+            game.after_discard = (
+                AfterDiscard.execute_countered if countered else AfterDiscard.execute
+            )
+        elif last == EventType.bluff_caught and countered and game.counterer == seat:
+            # Our counter was a bluff, the action goes through
+            game.after_discard = AfterDiscard.execute
+        else:
+            game.after_discard = AfterDiscard.end_turn
+
+        game.phase = Phase.discard
+        game.to_move = seat
+
+        card_code = self._search(game)
+        discarded_card = self.cards.pop(
+            next(
+                index
+                for index, card in enumerate(self.cards)
+                if CARD_CODES[card.card_type] == card_code
+            )
+        )
+        print_texts(
+            f"{self} discards their ",
+            (f"{discarded_card}", discarded_card.style),
+            " card",
+        )
+        return f"{self} discards their {discarded_card} card"
+
+    def choose_exchange_cards(
+        self,
+        exchange_cards: List[Card],
+        round_history: RoundHistory,
+        current_game_state: Union[str, Dict[str, str]],
+    ) -> Tuple[Card, Card]:
+        """Perform the exchange action. Pick which 2 cards to send back to the deck"""
+
+        game = self._observe(round_history, *exchange_cards)
+        events = round_history.turn_events()
+        if game is None or not events:
+            return super().choose_exchange_cards(exchange_cards, round_history, current_game_state)
+
+        self._set_action(game, events[0])
+        game.phase = Phase.exchange
+        game.to_move = game.current
+        game.exchange_cards = [CARD_CODES[card.card_type] for card in exchange_cards]
+
+        cards = self.cards + exchange_cards
+        self.cards = []
+        for card_code in decode_kept_cards(self._search(game)):
+            index = next(
+                index for index, card in enumerate(cards) if CARD_CODES[card.card_type] == card_code
+            )
+            self.cards.append(cards.pop(index))
+
+        print_text(f"{self} exchanges 2 cards")
+        return cards[0], cards[1]
+
+    # Observing the game
+
+    def _see(self, *players: Iterable[BasePlayer]) -> None:
+        self._table[self.name] = self
+        for group in players:
+            for player in group:
+                self._table[player.name] = player
+
+    def _seat(self, round_history: RoundHistory) -> int:
+        return round_history.player_names.index(self.name)
+
+    def _observe(
+        self, round_history: RoundHistory, *known_cards: Union[Card, int]
+    ) -> Optional[CompactGame]:
+        """The public state of the game from our point of view, with our own hand. The hidden
+        cards are left out, `_determinize` deals them. Cards known to be out of the hidden cards
+        (revealed or drawn for an exchange) are left out of the deck."""
+        names = round_history.player_names
+        if self.name not in names:
+            return None
+
+        game = CompactGame(len(names))
+        hand_sizes = [0] * len(names)
+        for seat, name in enumerate(names):
+            player = self._table.get(name)
+            if player is None:
+                return None
+
+            game.coins[seat] = player.coins
+            game.active[seat] = player.is_active
+            hand_sizes[seat] = len(player.cards)
+
+        seat = names.index(self.name)
+        game.hands[seat] = [CARD_CODES[card.card_type] for card in self.cards]
+        game.treasury = TOTAL_COINS - sum(game.coins)
+
+        # The cards we can't see: everything but our own hand and the dead and known cards
+        unseen = [0] * NUMBER_OF_CARD_TYPES
+        for card_type in DECK_COMPOSITION:
+            unseen[CARD_CODES[card_type]] += 1
+        for card in game.hands[seat]:
+            unseen[card] -= 1
+        for event in round_history.events():
+            if event.event_type == EventType.discard:
+                unseen[event.arg] -= 1
+                game.revealed[event.arg] += 1
+        for card in known_cards:
+            unseen[card if isinstance(card, int) else CARD_CODES[card.card_type]] -= 1
+
+        hidden = sum(hand_sizes) - hand_sizes[seat]
+        if min(unseen) < 0 or sum(unseen) < hidden:
+            return None
+
+        if self.use_beliefs:
+            beliefs = self._beliefs
+            if beliefs is None or beliefs.number_of_players != len(names):
+                beliefs = self._beliefs = BeliefTracker(len(names), viewer=seat)
+            beliefs.sync(round_history.log, game.hands[seat])
+            self._hand_weights = beliefs.probabilities_of_hands().tolist()
+
+        # The unseen cards are parked in the deck until they're dealt, with the hand sizes
+        game.deck = unseen
+        game.hands = [
+            game.hands[seat] if other == seat else [-1] * hand_sizes[other]
+            for other in range(len(names))
+        ]
+        return game
+
+    @staticmethod
+    def _set_action(game: CompactGame, action: Event) -> None:
+        game.current = action.actor
+        game.action = action.arg
+        game.target = action.target
+
+    @staticmethod
+    def _set_poll(game: CompactGame, phase: Phase, pollers: Tuple[int, ...], seat: int) -> None:
+        # Everyone polled before us passed
+        game.phase = phase
+        game.pollers = pollers
+        game.poll_index = pollers.index(seat)
+        game.to_move = seat
+
+    # Search
+
+    def _determinize(self, game: CompactGame) -> CompactGame:
+        """Deal the hidden cards of a copy of the observed game at random"""
+        game = game.copy()
+        hand_weights = self._hand_weights if self.use_beliefs else None
+        for seat, hand in enumerate(game.hands):
+            if not hand or hand[0] >= 0:
+                continue
+            if hand_weights is not None and self._deal_believed_hand(
+                game, hand, hand_weights[seat]
+            ):
+                continue
+            for index in range(len(hand)):
+                hand[index] = game.draw(self._rng)
+        return game
+
+    def _deal_believed_hand(self, game: CompactGame, hand: List[int], weights: List[float]) -> bool:
+        """Deal a hand drawn with the probabilities we believe the player holds it, out of the
+        hands the cards left in the deck can make. False if there's none"""
+        deck = game.deck
+        indices = []
+        cum_weights = []
+        total = 0.0
+        for index, counts in _HANDS_BY_SIZE[len(hand)]:
+            weight = weights[index]
+            if weight > 0 and all(deck[card] >= count for card, count in counts):
+                total += weight
+                indices.append(index)
+                cum_weights.append(total)
+
+        if not indices:
+            return False
+
+        for slot, card in enumerate(HANDS[self._rng.choices(indices, cum_weights=cum_weights)[0]]):
+            hand[slot] = card
+            deck[card] -= 1
+        return True
+
+    def _search(self, root_game: CompactGame) -> int:
+        moves = root_game.legal_moves()
+        if len(moves) == 1:
+            return moves[0]
+
+        rng = self._rng
+        root = _Node()
+        deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        for iteration in range(self.iterations):
+            if deadline and iteration and time.perf_counter() > deadline:
+                break
+
+            game = self._determinize(root_game)
+            node = root
+            path = []
+
+            # Selection and expansion
+            while not game.is_over:
+                legal_moves = game.legal_moves()
+                if len(legal_moves) == 1:
+                    game.apply(legal_moves[0], rng)
+                    continue
+
+                player = game.to_move
+                untried = [move for move in legal_moves if move not in node.children]
+                if untried:
+                    move = untried[rng.randrange(len(untried))]
+                    node.children[move] = node = _Node(player)
+                    game.apply(move, rng)
+                    path.append(node)
+                    break
+
+                move = self._select(node, legal_moves)
+                node = node.children[move]
+                game.apply(move, rng)
+                path.append(node)
+
+            # Simulation
+            stop = None
+            if self.max_rollout_turns is not None:
+                stop = root_game.turns + self.max_rollout_turns
+            rewards = None
+            while not game.is_over and (stop is None or game.turns < stop):
+                if self.tablebase is not None and game.phase == Phase.action:
+                    rewards = self._endgame_rewards(game)
+                    if rewards is not None:
+                        break
+                game.apply(random_move(game, rng), rng)
+
+            # Backpropagation
+            rewards = rewards or _rewards(game)
+            for node in path:
+                node.visits += 1
+                node.reward += rewards[node.player]
+
+        return max(
+            (move for move in moves if move in root.children),
+            key=lambda move: root.children[move].visits,
+        )
+
+    def _endgame_rewards(self, game: CompactGame) -> Optional[List[float]]:
+        """The value of a heads-up game in the tablebase, the hands are known once determinized"""
+        seat = game.current
+        opponents = game.other_active_seats(seat)
+        if len(opponents) != 1:
+            return None
+
+        opponent = opponents[0]
+        entry = self.tablebase.probe(
+            game.coins[seat], game.coins[opponent], game.hands[seat], game.hands[opponent]
+        )
+        rewards = [0.0] * game.number_of_players
+        rewards[seat] = SCORES[entry.outcome]
+        rewards[opponent] = 1.0 - rewards[seat]
+        return rewards
+
+    def _select(self, node: _Node, legal_moves: Sequence[int]) -> int:
+        """UCB1 over the children available in this determinization"""
+        best_move = legal_moves[0]
+        best_score = -math.inf
+        for move in legal_moves:
+            child = node.children[move]
+            score = child.reward / child.visits + self.exploration * math.sqrt(
+                math.log(child.avails) / child.visits
+            )
+            child.avails += 1
+            if score > best_score:
+                best_move = move
+                best_score = score
+
+        return best_move
+
+
+def _rewards(game: CompactGame) -> List[float]:
+    """1 for the winner. For unfinished games, a share of 1 by cards in hand and coins"""
+    if game.is_over:
+        rewards = [0.0] * game.number_of_players
+        rewards[game.winner] = 1.0
+        return rewards
+
+    strengths = [
+        len(hand) + min(coins, 10) / 10 if active else 0.0
+        for hand, coins, active in zip(game.hands, game.coins, game.active)
+    ]
+    total = sum(strengths)
+    return [strength / total for strength in strengths]
@@ -0,0 +1,207 @@
+"""Load test for the game server: many clients playing random moves at once.
+
+    python -m src.server.load_test --clients 400 --players 4 --bots 2 --in-process
+
+Every client joins a table, answers every decision with a random option and joins a new table
+after every game until it played `--games` games, games are counted once per table. The
+response time is measured from sending an answer to receiving the client's next message.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from src.server.protocol import connect_websocket, http_request
+from src.server.server import GameServer
+
+# How often random clients challenge or counter
+CHALLENGE_PROBABILITY = 0.1
+
+
+class LoadTestSummary(BaseModel):
+    clients: int = 0
+    games: int = 0
+    decisions: int = 0
+    errors: int = 0
+    response_times: List[float] = []
+    elapsed_seconds: float = 0.0
+
+    def percentile(self, fraction: float) -> float:
+        if not self.response_times:
+            return 0.0
+        response_times = sorted(self.response_times)
+        return response_times[min(int(fraction * len(response_times)), len(response_times) - 1)]
+
+    def report(self) -> str:
+        elapsed = self.elapsed_seconds or 1.0
+        return (
+            f"{self.clients} clients played {self.games} games in {self.elapsed_seconds:.2f}s "
+            f"({self.games / elapsed:,.1f} games/s, {self.decisions / elapsed:,.0f} decisions/s), "
+            f"response time p50 {self.percentile(0.5) * 1000:.1f}ms, "
+            f"p99 {self.percentile(0.99) * 1000:.1f}ms, {self.errors} errors"
+        )
+
+
+def random_answer(rng: random.Random, decision: Dict[str, Any]) -> Any:
+    if decision["decision"] in ("challenge", "counter"):
+        return rng.random() < CHALLENGE_PROBABILITY
+    return rng.choice(decision["options"])
+
+
+class _Player:
+    """One load test client, the messages it gets are handled the same for both transports"""
+
+    def __init__(self, summary: LoadTestSummary, join: Dict[str, Any], games: int, seed: int):
+        self.summary = summary
+        self.join = join
+        self.games = games
+        self.played = 0
+        self.seat = 0
+        self.rng = random.Random(seed)
+        self.answered_at: Optional[float] = None
+
+    def handle(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The answer to send back, if any"""
+        if self.answered_at is not None:
+            self.summary.response_times.append(time.perf_counter() - self.answered_at)
+            self.answered_at = None
+
+        match message["type"]:
+            case "decision":
+                self.summary.decisions += 1
+                self.answered_at = time.perf_counter()
+                return {"id": message["id"], "answer": random_answer(self.rng, message)}
+            case "joined":
+                self.seat = message["seat"]
+            case "game_over":
+                self.played += 1
+                # Every table has a client in the first seat, who counts its games
+                if self.seat == 0:
+                    self.summary.games += 1
+            case "error" | "disconnected":
+                self.summary.errors += 1
+        return None
+
+    @property
+    def done(self) -> bool:
+        return self.played >= self.games
+
+
+async def _play_over_websocket(host: str, port: int, player: _Player) -> None:
+    websocket = await connect_websocket(host, port)
+    join = json.dumps({"type": "join", **player.join})
+    await websocket.send(join)
+    while not player.done:
+        message = json.loads(await websocket.receive())
+        answer = player.handle(message)
+        if answer is not None:
+            await websocket.send(json.dumps({"type": "answer", **answer}))
+        elif message["type"] == "game_over" and not player.done:
+            await websocket.send(join)
+
+    await websocket.send(json.dumps({"type": "leave"}))
+    await websocket.close()
+
+
+async def _play_over_http(host: str, port: int, player: _Player) -> None:
+    _, joined = await http_request(host, port, "POST", "/join", player.join)
+    client_id = joined["client"]
+    while not player.done:
+        _, body = await http_request(host, port, "GET", f"/poll?client={client_id}")
+        for message in body["messages"]:
+            answer = player.handle(message)
+            if answer is not None:
+                await http_request(host, port, "POST", "/answer", {"client": client_id, **answer})
+            elif message["type"] == "game_over" and not player.done:
+                await http_request(host, port, "POST", "/leave", {"client": client_id})
+                _, joined = await http_request(host, port, "POST", "/join", player.join)
+                client_id = joined["client"]
+            elif message["type"] == "disconnected":
+                return
+
+    await http_request(host, port, "POST", "/leave", {"client": client_id})
+
+
+async def run_load_test(
+    host: str,
+    port: int,
+    clients: int,
+    number_of_players: int = 4,
+    bots: int = 0,
+    games: int = 1,
+    transport: str = "ws",
+    seed: int = 0,
+) -> LoadTestSummary:
+    summary = LoadTestSummary(clients=clients)
+    play = _play_over_websocket if transport == "ws" else _play_over_http
+    join = {"name": "Load", "players": number_of_players, "bots": bots}
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            play(
+                host, port, _Player(summary, {**join, "name": f"Load {index}"}, games, seed + index)
+            )
+            for index in range(clients)
+        )
+    )
+    summary.elapsed_seconds = time.perf_counter() - start
+    return summary
+
+
+async def _main(args: argparse.Namespace) -> None:
+    server = None
+    port = args.port
+    if args.in_process:
+        server = GameServer(args.host, 0, max_tables=args.clients)
+        await server.start()
+        port = server.port
+
+    try:
+        summary = await run_load_test(
+            args.host,
+            port,
+            args.clients,
+            args.players,
+            args.bots,
+            args.games,
+            args.transport,
+            args.seed,
+        )
+        print(summary.report())
+        _, stats = await http_request(args.host, port, "GET", "/stats")
+        print(f"Server: {stats}")
+    finally:
+        if server is not None:
+            await server.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--players", type=int, default=4, help="Players per table")
+    parser.add_argument("--bots", type=int, default=2, help="Bots per table")
+    parser.add_argument("--games", type=int, default=1, help="Games per client")
+    parser.add_argument("--transport", choices=("ws", "http"), default="ws")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--in-process", action="store_true", help="Start a server in this process to test"
+    )
+    args = parser.parse_args()
+
+    seats = args.players - args.bots
+    if seats < 1 or args.clients % seats:
+        parser.error(f"--clients has to be a multiple of the {seats} remote seats per table")
+
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
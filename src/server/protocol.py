@@ -0,0 +1,298 @@
+"""Just enough HTTP/1.1 and WebSocket (RFC 6455) on asyncio streams for the game server.
+
+The server only talks to clients on localhost, so this supports what they need and nothing
+more: requests with a Content-Length body (no chunked encoding, no keep-alive) and text
+WebSocket messages. Sizes are bounded so a misbehaving client can't make the server buffer
+without limit.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+MAX_MESSAGE_BYTES = 64 * 1024
+
+# WebSocket opcodes
+CONTINUATION = 0x0
+TEXT = 0x1
+BINARY = 0x2
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+
+STATUS_TEXTS = {
+    101: "Switching Protocols",
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class ProtocolError(Exception):
+    """The peer sent something we can't make sense of, the connection is dropped"""
+
+
+class ConnectionClosed(Exception):
+    """The peer closed the WebSocket"""
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Dict[str, Any]:
+        """The body as a JSON object, every request body is one"""
+        if not self.body:
+            return {}
+        try:
+            body = json.loads(self.body)
+        except ValueError as error:
+            raise ProtocolError(f"Invalid JSON body: {error}") from error
+        if not isinstance(body, dict):
+            raise ProtocolError("The body must be a JSON object")
+        return body
+
+    @property
+    def is_websocket(self) -> bool:
+        return self.headers.get("upgrade", "").lower() == "websocket"
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Read one request, None if the client closed the connection before sending one"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as error:
+        if not error.partial:
+            return None
+        raise ProtocolError("Incomplete request") from error
+    except asyncio.LimitOverrunError as error:
+        raise ProtocolError("Request headers are too large") from error
+    if len(head) > MAX_HEADER_BYTES:
+        raise ProtocolError("Request headers are too large")
+
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = request_line.split(" ", 2)
+    except ValueError as error:
+        raise ProtocolError(f"Invalid request line {request_line!r}") from error
+
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    length = _content_length(headers)
+    body = await reader.readexactly(length) if length else b""
+
+    url = urlsplit(target)
+    return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body)
+
+
+def _content_length(headers: Dict[str, str]) -> int:
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError as error:
+        raise ProtocolError("Invalid Content-Length") from error
+    if length < 0:
+        raise ProtocolError("Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise ProtocolError("Request body is too large")
+    return length
+
+
+def encode_response(status: int, payload: Any) -> bytes:
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXTS.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+def websocket_accept_key(key: str) -> str:
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()
+    return base64.b64encode(digest).decode()
+
+
+def encode_handshake_response(request: Request) -> bytes:
+    key = request.headers.get("sec-websocket-key")
+    if not key:
+        raise ProtocolError("Missing Sec-WebSocket-Key")
+
+    return (
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {websocket_accept_key(key)}\r\n\r\n"
+    ).encode()
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = False) -> bytes:
+    """A single final frame. Clients have to mask their frames, servers must not"""
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        head = struct.pack("!BB", 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, mask_bit | 127, length)
+
+    if not mask:
+        return head + payload
+
+    key = os.urandom(4)
+    return head + key + _apply_mask(payload, key)
+
+
+def _apply_mask(payload: bytes, key: bytes) -> bytes:
+    # XOR with the key repeated over the payload, on integers rather than byte by byte
+    repeated = (key * (len(payload) // 4 + 1))[: len(payload)]
+    masked = int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")
+    return masked.to_bytes(len(payload), "big")
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[bool, int, bytes]:
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", await reader.readexactly(8))
+    if length > MAX_MESSAGE_BYTES:
+        raise ProtocolError("WebSocket frame is too large")
+
+    key = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if key:
+        payload = _apply_mask(payload, key)
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocket:
+    """A WebSocket over a pair of streams, after the handshake"""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, is_client: bool = False
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.is_client = is_client
+        self.closed = False
+
+    async def receive(self) -> str:
+        """The next text message. Pings are answered on the way"""
+        message = b""
+        opcode = None
+        while True:
+            try:
+                final, frame_opcode, payload = await _read_frame(self.reader)
+            except (asyncio.IncompleteReadError, ConnectionError) as error:
+                self.closed = True
+                raise ConnectionClosed() from error
+
+            if frame_opcode == CLOSE:
+                await self.close()
+                raise ConnectionClosed()
+            if frame_opcode == PING:
+                await self._send_frame(PONG, payload)
+                continue
+            if frame_opcode == PONG:
+                continue
+
+            if frame_opcode != CONTINUATION:
+                opcode = frame_opcode
+            message += payload
+            if len(message) > MAX_MESSAGE_BYTES:
+                raise ProtocolError("WebSocket message is too large")
+            if final:
+                break
+
+        if opcode != TEXT:
+            raise ProtocolError("Only text messages are supported")
+        return message.decode()
+
+    async def send(self, message: str) -> None:
+        await self._send_frame(TEXT, message.encode())
+
+    async def _send_frame(self, opcode: int, payload: bytes) -> None:
+        if self.closed:
+            raise ConnectionClosed()
+        self.writer.write(encode_frame(opcode, payload, mask=self.is_client))
+        await self.writer.drain()
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.writer.write(encode_frame(CLOSE, b"", mask=self.is_client))
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+async def connect_websocket(host: str, port: int, path: str = "/") -> WebSocket:
+    """Open a client WebSocket, for the load test client"""
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_HEADER_BYTES)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(
+        (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode()
+    )
+    await writer.drain()
+
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    if not head.startswith("HTTP/1.1 101") or websocket_accept_key(key) not in head:
+        writer.close()
+        raise ProtocolError(f"WebSocket handshake failed: {head.splitlines()[0]}")
+    return WebSocket(reader, writer, is_client=True)
+
+
+async def http_request(
+    host: str, port: int, method: str, path: str, payload: Any = None
+) -> Tuple[int, Any]:
+    """Send a JSON request and return the status and JSON body, for the load test client"""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    head = (
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+    head, _, response_body = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return status, json.loads(response_body) if response_body else None
@@ -0,0 +1,682 @@
+"""An asyncio server hosting many games at once for remote players on localhost.
+
+Every table is a coroutine stepping its own game handler through its pending decisions: bots
+answer right away with their callbacks, remote players are sent the decision and the table
+waits for their answer without blocking the other tables. A remote player who doesn't answer in
+time, or whose connection drops, is played by the bot of their seat.
+
+Players connect over a WebSocket or with plain HTTP requests, exchanging JSON messages:
+
+    WebSocket   send {"type": "join", "name": ..., "players": 4, "bots": 3} first, then
+                {"type": "answer", "id": ..., "answer": ...} for every decision
+    HTTP        POST /join with the same body returns a client id, GET /poll?client=<id> returns
+                the queued messages (waiting for one if there are none) and POST /answer takes
+                {"client": <id>, "id": ..., "answer": ...}. GET /stats describes the server
+
+Clients get "joined", "start", "events", "decision", "error" and "game_over" messages. A client
+gets "joined" again with its new seat when someone before it leaves a table that hasn't started
+yet. Answers are {"action": <action>, "target": <seat or null>} for an action, true or false
+for a challenge or a counter, a card name for a discard and a list of two card names for an
+exchange, one of the decision's "options".
+
+Messages for a client wait in a bounded queue: a client that lets it fill up is disconnected
+rather than have the server buffer messages for it without limit.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import secrets
+from contextlib import suppress
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from src.handler.game_handler import Decision, ResistanceCoupGameHandler
+from src.models.card import CARDS, CardType
+from src.models.legal_actions import ACTIONS, DecisionType
+from src.models.players.ai import AIPlayer
+from src.models.players.base import BasePlayer
+from src.server.protocol import (
+    ConnectionClosed,
+    ProtocolError,
+    Request,
+    WebSocket,
+    encode_handshake_response,
+    encode_response,
+    read_request,
+)
+from src.utils.event_log import NO_SEAT, EventType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+# Messages waiting for a client before it's disconnected
+QUEUE_SIZE = 256
+# Seconds a remote player has to answer a decision before their seat's bot answers it
+DECISION_TIMEOUT = 30.0
+# Invalid answers to a decision before the seat's bot answers it
+MAX_INVALID_ANSWERS = 3
+# Seconds a poll waits for a message, and that an HTTP client can go without polling
+POLL_TIMEOUT = 20.0
+SESSION_TIMEOUT = 60.0
+MAX_TABLES = 1000
+
+ACTIONS_BY_NAME = {action.action_type.name: action for action in ACTIONS}
+
+
+class Client:
+    """A remote player, connected over a WebSocket or polling over HTTP"""
+
+    __slots__ = (
+        "client_id",
+        "name",
+        "outbox",
+        "connected",
+        "table",
+        "seat",
+        "decision_id",
+        "answer",
+        "polling",
+        "last_seen",
+    )
+
+    def __init__(self, client_id: str, name: str, queue_size: int = QUEUE_SIZE):
+        self.client_id = client_id
+        self.name = name
+        self.outbox: asyncio.Queue = asyncio.Queue(queue_size)
+        self.connected = True
+        self.table: Optional["Table"] = None
+        self.seat = NO_SEAT
+        self.decision_id = 0
+        # Set with the answer to the decision the client is asked, or None if there won't be one
+        self.answer: Optional[asyncio.Future] = None
+        # HTTP clients poll for their messages, and are dropped once they stop polling
+        self.polling = False
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        if not self.connected:
+            return
+
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Disconnecting %s, who isn't reading their messages", self.name)
+            self.disconnect()
+
+    def disconnect(self) -> None:
+        if not self.connected:
+            return
+
+        self.connected = False
+        if self.answer is not None and not self.answer.done():
+            self.answer.set_result(None)
+
+        # Whoever waits for the client's messages gets None instead
+        while not self.outbox.empty():
+            self.outbox.get_nowait()
+        self.outbox.put_nowait(None)
+
+    def receive_answer(self, decision_id: Any, answer: Any) -> None:
+        if decision_id != self.decision_id or self.answer is None or self.answer.done():
+            self.send({"type": "error", "message": f"No decision {decision_id} is pending"})
+            return
+        self.answer.set_result(answer)
+
+
+class Table:
+    """A game with remote players in some seats and bots in the others"""
+
+    __slots__ = ("table_id", "number_of_players", "bots", "clients", "handler", "task")
+
+    def __init__(self, table_id: int, number_of_players: int, bots: int):
+        self.table_id = table_id
+        self.number_of_players = number_of_players
+        self.bots = bots
+        self.clients: List[Client] = []
+        self.handler: Optional[ResistanceCoupGameHandler] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.clients) + self.bots == self.number_of_players
+
+    def broadcast(self, message: Dict[str, Any]) -> None:
+        for client in self.clients:
+            client.send(message)
+
+
+def _seat_or_none(seat: int) -> Optional[int]:
+    return None if seat == NO_SEAT else seat
+
+
+def _card_names(cards) -> List[str]:
+    return [card.card_type.name for card in cards]
+
+
+def decision_options(handler: ResistanceCoupGameHandler, decision: Decision) -> List[Any]:
+    """Every legal answer to the decision, as sent to clients"""
+    player = decision.player
+    players = handler.players
+    match decision.decision_type:
+        case DecisionType.action:
+            options = []
+            for action in player.legal_actions(decision.other_players):
+                targets = (
+                    player.legal_targets(action, decision.other_players)
+                    if action.requires_target
+                    else [None]
+                )
+                for target in targets:
+                    options.append(
+                        {
+                            "action": action.action_type.name,
+                            "target": None if target is None else players.index(target),
+                        }
+                    )
+            return options
+        case DecisionType.challenge | DecisionType.counter:
+            return [True, False]
+        case DecisionType.discard:
+            return sorted(set(_card_names(player.cards)))
+        case DecisionType.exchange:
+            cards = _card_names(player.cards) + _card_names(decision.cards)
+            return sorted(
+                {tuple(sorted(pair)) for pair in itertools.combinations(cards, 2)},
+            )
+
+
+def parse_answer(handler: ResistanceCoupGameHandler, decision: Decision, answer: Any) -> Any:
+    """A client's answer as the game handler takes it. Raises ValueError, KeyError or TypeError
+    for answers that don't make sense, `step` checks whether they're legal"""
+    match decision.decision_type:
+        case DecisionType.action:
+            target = answer.get("target")
+            return (
+                ACTIONS_BY_NAME[answer["action"]],
+                None if target is None else handler.players[int(target)],
+            )
+        case DecisionType.challenge | DecisionType.counter:
+            if not isinstance(answer, bool):
+                raise ValueError("Expected true or false")
+            return answer
+        case DecisionType.discard:
+            return CARDS[CardType[answer]]
+        case DecisionType.exchange:
+            first_card, second_card = answer
+            return CARDS[CardType[first_card]], CARDS[CardType[second_card]]
+
+
+class GameServer:
+    """Hosts tables for remote players, see the module docstring"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        bot_class: Type[BasePlayer] = AIPlayer,
+        max_tables: int = MAX_TABLES,
+        queue_size: int = QUEUE_SIZE,
+        decision_timeout: float = DECISION_TIMEOUT,
+        seed: Optional[int] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.bot_class = bot_class
+        self.max_tables = max_tables
+        self.queue_size = queue_size
+        self.decision_timeout = decision_timeout
+        self.seed = seed
+
+        self._tables: Dict[int, Table] = {}
+        # Tables waiting for players, by number of players and bots
+        self._waiting: Dict[Tuple[int, int], Table] = {}
+        self._clients: Dict[str, Client] = {}
+        self._table_ids = itertools.count()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._reaper: Optional[asyncio.Task] = None
+        # Open connections, by the task serving them
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+        self.games_finished = 0
+        self.decisions = 0
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, backlog=1024
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._reaper = asyncio.create_task(self._reap_sessions())
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._reaper:
+            self._reaper.cancel()
+        if self._server:
+            self._server.close()
+
+        tables = [table.task for table in self._tables.values() if table.task]
+        for task in tables:
+            task.cancel()
+        for client in list(self._clients.values()):
+            client.disconnect()
+        # Closing the connections ends the tasks serving them
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*tables, *self._connections, return_exceptions=True)
+
+        if self._server:
+            await self._server.wait_closed()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tables": len(self._tables) - len(self._waiting),
+            "waiting_tables": len(self._waiting),
+            "clients": len(self._clients),
+            "games_finished": self.games_finished,
+            "decisions": self.decisions,
+        }
+
+    # Tables
+
+    def join(self, name: str, number_of_players: int, bots: int) -> Client:
+        """Seat a new client at a table, which starts once all its seats are taken"""
+        if not 2 <= number_of_players <= 6:
+            raise ValueError("Games are played with 2 to 6 players")
+        if not 0 <= bots < number_of_players:
+            raise ValueError(
+                f"A game with {number_of_players} players has 0 to " f"{number_of_players - 1} bots"
+            )
+
+        key = (number_of_players, bots)
+        table = self._waiting.get(key)
+        if table is None:
+            if len(self._tables) >= self.max_tables:
+                raise OverflowError("The server is full")
+            table = Table(next(self._table_ids), number_of_players, bots)
+            self._tables[table.table_id] = table
+            self._waiting[key] = table
+
+        client = Client(secrets.token_hex(8), str(name)[:32], self.queue_size)
+        client.table = table
+        client.seat = len(table.clients)
+        table.clients.append(client)
+        self._clients[client.client_id] = client
+        self._send_joined(client)
+
+        if table.is_full:
+            del self._waiting[key]
+            table.task = asyncio.create_task(self._play(table))
+        return client
+
+    def leave(self, client: Client) -> None:
+        client.disconnect()
+        self._clients.pop(client.client_id, None)
+
+        table = client.table
+        if table is not None and table.task is None:
+            # Nobody took the seat yet, the table waits for someone else
+            table.clients.remove(client)
+            for seat, other_client in enumerate(table.clients):
+                if other_client.seat != seat:
+                    # The clients after the one who left move up a seat, and are told so
+                    other_client.seat = seat
+                    self._send_joined(other_client)
+            if not table.clients:
+                del self._waiting[(table.number_of_players, table.bots)]
+                del self._tables[table.table_id]
+
+    @staticmethod
+    def _send_joined(client: Client) -> None:
+        client.send(
+            {
+                "type": "joined",
+                "client": client.client_id,
+                "table": client.table.table_id,
+                "seat": client.seat,
+            }
+        )
+
+    def _new_handler(self, table: Table) -> ResistanceCoupGameHandler:
+        names = []
+        for client in table.clients:
+            name = client.name or "Player"
+            # Players are told apart by name
+            names.append(name if name not in names else f"{name} ({len(names) + 1})")
+        names += [f"Bot {seat + 1}" for seat in range(len(names), table.number_of_players)]
+
+        return ResistanceCoupGameHandler(
+            table.number_of_players,
+            player_class=self.bot_class,
+            headless=True,
+            seed=None if self.seed is None else f"{self.seed}:{table.table_id}",
+            player_names=names,
+        )
+
+    async def _play(self, table: Table) -> None:
+        try:
+            table.handler = handler = self._new_handler(table)
+            handler.setup_game()
+            table.broadcast(
+                {
+                    "type": "start",
+                    "table": table.table_id,
+                    "players": [player.name for player in handler.players],
+                }
+            )
+
+            position = 0
+            while (decision := handler.pending_decision) is not None:
+                position = self._broadcast_events(table, position)
+                seat = handler.players.index(decision.player)
+                if seat < len(table.clients) and table.clients[seat].connected:
+                    await self._ask_client(table, table.clients[seat], decision)
+                else:
+                    handler.step(handler.ask(decision))
+                    # Let the other tables play between bot decisions
+                    await asyncio.sleep(0)
+                self.decisions += 1
+
+            self._broadcast_events(table, position)
+            table.broadcast(
+                {"type": "game_over", "winner": handler.players.index(handler.remaining_player)}
+            )
+            self.games_finished += 1
+        except Exception:
+            # A broken game only takes its own table down
+            logger.exception("Table %s failed", table.table_id)
+            table.broadcast({"type": "error", "message": "The game failed"})
+        finally:
+            if table.handler is not None:
+                table.handler.close()
+            del self._tables[table.table_id]
+            for client in table.clients:
+                client.table = None
+
+    def _broadcast_events(self, table: Table, position: int) -> int:
+        log = table.handler.round_history.log
+        if position < len(log):
+            table.broadcast(
+                {
+                    "type": "events",
+                    "events": [
+                        {
+                            "event": EventType(event.event_type).name,
+                            "actor": _seat_or_none(event.actor),
+                            "target": _seat_or_none(event.target),
+                            "arg": event.arg,
+                        }
+                        for event in log.events(position)
+                    ],
+                }
+            )
+        return len(log)
+
+    def _decision_message(self, table: Table, client: Client, decision: Decision) -> Dict:
+        handler = table.handler
+        players = handler.players
+        return {
+            "type": "decision",
+            "id": client.decision_id,
+            "decision": decision.decision_type.name,
+            "opponent": None if decision.opponent is None else players.index(decision.opponent),
+            "cards": _card_names(decision.cards),
+            "options": decision_options(handler, decision),
+            "state": {
+                "hand": _card_names(decision.player.cards),
+                "coins": [player.coins for player in players],
+                "influence": [len(player.cards) for player in players],
+                "current": players.index(handler.current_player),
+                "revealed": list(handler.revealed_cards),
+            },
+        }
+
+    async def _ask_client(self, table: Table, client: Client, decision: Decision) -> None:
+        handler = table.handler
+        loop = asyncio.get_running_loop()
+        for _ in range(MAX_INVALID_ANSWERS):
+            client.decision_id += 1
+            client.answer = loop.create_future()
+            client.send(self._decision_message(table, client, decision))
+            try:
+                answer = await asyncio.wait_for(client.answer, self.decision_timeout)
+            except asyncio.TimeoutError:
+                client.send({"type": "error", "message": "Too late, your bot answered"})
+                break
+            finally:
+                client.answer = None
+
+            # The client disconnected
+            if answer is None:
+                break
+
+            try:
+                decision.answer = parse_answer(handler, decision, answer)
+                handler.step(decision)
+                return
+            except (ValueError, KeyError, TypeError, IndexError, AttributeError) as error:
+                client.send({"type": "error", "message": f"Invalid answer: {error}"})
+
+        decision.answer = None
+        handler.step(handler.ask(decision))
+
+    # Connections
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._connections[asyncio.current_task()] = writer
+        try:
+            await self._serve_connection(reader, writer)
+        finally:
+            del self._connections[asyncio.current_task()]
+            writer.close()
+
+    async def _serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await read_request(reader)
+            if request is None:
+                return
+            if request.is_websocket:
+                writer.write(encode_handshake_response(request))
+                await writer.drain()
+                await self._serve_websocket(WebSocket(reader, writer))
+                return
+
+            status, payload = await self._route(request)
+        except ProtocolError as error:
+            status, payload = 400, {"error": str(error)}
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+
+        with suppress(ConnectionError):
+            writer.write(encode_response(status, payload))
+            await writer.drain()
+
+    async def _route(self, request: Request) -> Tuple[int, Any]:
+        match (request.method, request.path):
+            case ("GET", "/stats"):
+                return 200, self.stats()
+            case ("POST", "/join"):
+                body = request.json()
+                try:
+                    client = self.join(
+                        body.get("name", ""), int(body.get("players", 4)), int(body.get("bots", 0))
+                    )
+                except (ValueError, TypeError) as error:
+                    return 400, {"error": str(error)}
+                except OverflowError as error:
+                    return 503, {"error": str(error)}
+                client.polling = True
+                return 200, {
+                    "client": client.client_id,
+                    "table": client.table.table_id,
+                    "seat": client.seat,
+                }
+            case ("GET", "/poll"):
+                client = self._clients.get(request.query.get("client", ""))
+                if client is None:
+                    return 404, {"error": "Unknown client"}
+                return 200, {"messages": await self._poll(client)}
+            case ("POST", "/answer"):
+                body = request.json()
+                client = self._client(body)
+                if client is None:
+                    return 404, {"error": "Unknown client"}
+                client.last_seen = asyncio.get_running_loop().time()
+                client.receive_answer(body.get("id"), body.get("answer"))
+                return 200, {}
+            case ("POST", "/leave"):
+                client = self._client(request.json())
+                if client is not None:
+                    self.leave(client)
+                return 200, {}
+            case (_, "/stats" | "/join" | "/poll" | "/answer" | "/leave"):
+                return 405, {"error": f"{request.method} isn't supported for {request.path}"}
+        return 404, {"error": f"Nothing at {request.path}"}
+
+    def _client(self, body: Dict[str, Any]) -> Optional[Client]:
+        """The client a request body is from, if it's still known"""
+        client_id = body.get("client", "")
+        if not isinstance(client_id, str):
+            raise ProtocolError("The client id must be a string")
+        return self._clients.get(client_id)
+
+    async def _poll(self, client: Client) -> List[Dict]:
+        """The client's queued messages, waiting for the first one if there are none yet"""
+        client.last_seen = asyncio.get_running_loop().time()
+        try:
+            message = await asyncio.wait_for(client.outbox.get(), POLL_TIMEOUT)
+        except asyncio.TimeoutError:
+            return []
+
+        messages = []
+        while message is not None:
+            messages.append(message)
+            if client.outbox.empty():
+                break
+            message = client.outbox.get_nowait()
+
+        if message is None:
+            # Disconnected, the session is over once the last messages are read
+            self._clients.pop(client.client_id, None)
+            messages.append({"type": "disconnected"})
+        client.last_seen = asyncio.get_running_loop().time()
+        return messages
+
+    async def _serve_websocket(self, websocket: WebSocket) -> None:
+        client: Optional[Client] = None
+        sender: Optional[asyncio.Task] = None
+        try:
+            while True:
+                try:
+                    message = json.loads(await websocket.receive())
+                    message_type = message["type"]
+                except (ValueError, KeyError, TypeError):
+                    await websocket.send(
+                        json.dumps({"type": "error", "message": "Invalid message"})
+                    )
+                    continue
+
+                if message_type == "join":
+                    if client is not None and client.table is not None:
+                        client.send({"type": "error", "message": "Already at a table"})
+                        continue
+                    if client is not None:
+                        # Playing another game on the same connection
+                        sender.cancel()
+                        self._clients.pop(client.client_id, None)
+                    client = await self._join_over_websocket(websocket, message)
+                    if client is not None:
+                        sender = asyncio.create_task(self._send_messages(websocket, client))
+                elif message_type == "answer" and client is not None:
+                    client.receive_answer(message.get("id"), message.get("answer"))
+                elif message_type == "leave":
+                    break
+        except (ConnectionClosed, ProtocolError, ConnectionError):
+            pass
+        finally:
+            if client is not None:
+                self.leave(client)
+            if sender is not None:
+                sender.cancel()
+            await websocket.close()
+
+    async def _join_over_websocket(
+        self, websocket: WebSocket, message: Dict[str, Any]
+    ) -> Optional[Client]:
+        try:
+            return self.join(
+                message.get("name", ""),
+                int(message.get("players", 4)),
+                int(message.get("bots", 0)),
+            )
+        except (ValueError, TypeError, OverflowError) as error:
+            await websocket.send(json.dumps({"type": "error", "message": str(error)}))
+            return None
+
+    async def _send_messages(self, websocket: WebSocket, client: Client) -> None:
+        with suppress(ConnectionClosed, ConnectionError):
+            while (message := await client.outbox.get()) is not None:
+                await websocket.send(json.dumps(message))
+        await websocket.close()
+
+    async def _reap_sessions(self) -> None:
+        """Drop HTTP clients that stopped polling"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(SESSION_TIMEOUT / 4)
+            deadline = loop.time() - SESSION_TIMEOUT
+            for client in list(self._clients.values()):
+                if client.polling and client.last_seen < deadline:
+                    self.leave(client)
+
+
+def serve(server: GameServer) -> None:
+    """Run the server until interrupted"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    async def run():
+        await server.start()
+        logger.info("Serving games on %s:%s", server.host, server.port)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    with suppress(KeyboardInterrupt):
+        asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Host Coup games for remote players")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--tables", type=int, default=MAX_TABLES, help="Maximum number of tables")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--decision-timeout", type=float, default=DECISION_TIMEOUT)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    serve(
+        GameServer(
+            args.host,
+            args.port,
+            max_tables=args.tables,
+            queue_size=args.queue_size,
+            decision_timeout=args.decision_timeout,
+            seed=args.seed,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
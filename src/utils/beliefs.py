@@ -0,0 +1,270 @@
+"""Bayesian beliefs about the hidden hands.
+
+For every player the tracker keeps a probability distribution over the hands in `HANDS`, kept as
+a prior times a likelihood:
+
+    prior:       the chance of being dealt the hand from the cards nobody has seen (the deck
+                 minus the discarded cards, and minus the viewer's own hand for a player's own
+                 tracker). Recomputed whenever the unseen cards change.
+    likelihood:  what the events of the game say about the hand. A claim is `bluff_likelihood`
+                 times as likely without the card, a revealed or discarded card was in the hand
+                 and a caught bluff wasn't.
+
+Cards leaving or entering a hand (a discard, a revealed card swapped for a new one) move the
+posterior through a transition matrix, and an exchange forgets what was known about the hand.
+Players are tracked independently, which is an approximation when several of them could hold the
+last copies of a card.
+
+The tracker follows the typed event log: `sync` applies the events appended since the last call.
+The probabilities that a player holds a card are kept in an array, so `probability` is a
+single lookup.
+"""
+
+from math import comb
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from src.models.action import ACTION_CODES, get_counter_action
+from src.models.card import (
+    CARD_CODES,
+    CARD_TYPES,
+    DECK_COMPOSITION,
+    HAND_INDEX,
+    HANDS,
+    NUMBER_OF_HANDS,
+)
+from src.models.legal_actions import ACTIONS
+from src.utils.event_log import Event, EventLog, EventType
+
+NUMBER_OF_CARD_TYPES = len(CARD_TYPES)
+NO_CARD = -1
+
+# How much less likely a claim is without the card
+BLUFF_LIKELIHOOD = 0.4
+
+# Copies of every card type in every hand
+HAND_COUNTS = np.array(
+    [[hand.count(card) for card in range(NUMBER_OF_CARD_TYPES)] for hand in HANDS], dtype=np.intp
+)
+HAND_SIZES = HAND_COUNTS.sum(axis=1)
+HAS_CARD = (HAND_COUNTS > 0).astype(np.float64)
+
+DECK_COUNTS = np.bincount(
+    [CARD_CODES[card_type] for card_type in DECK_COMPOSITION], minlength=NUMBER_OF_CARD_TYPES
+)
+_MAX_COPIES = int(DECK_COUNTS.max())
+# Ways to pick n copies out of u unseen ones, indexed [u, n]
+_COMBINATIONS = np.array([[comb(u, n) for n in range(3)] for u in range(_MAX_COPIES + 1)])
+
+# Transitions between hands, indexed [card, hand before, hand after]
+_REMOVE_CARD = np.zeros((NUMBER_OF_CARD_TYPES, NUMBER_OF_HANDS, NUMBER_OF_HANDS))
+_ADD_CARD = np.zeros((NUMBER_OF_CARD_TYPES, NUMBER_OF_HANDS, NUMBER_OF_HANDS))
+for _index, _hand in enumerate(HANDS):
+    for _card in range(NUMBER_OF_CARD_TYPES):
+        if len(_hand) == 2 and _card in _hand:
+            _rest = list(_hand)
+            _rest.remove(_card)
+            _REMOVE_CARD[_card, _index, HAND_INDEX[tuple(_rest)]] = 1.0
+        if len(_hand) == 1:
+            _ADD_CARD[_card, _index, HAND_INDEX[tuple(sorted(_hand + (_card,)))]] = 1.0
+
+_CLAIMED_CARD = {
+    ACTION_CODES[action.action_type]: CARD_CODES[action.associated_card_type]
+    for action in ACTIONS
+    if action.associated_card_type
+}
+_COUNTER_CARD = {
+    ACTION_CODES[action.action_type]: CARD_CODES[
+        get_counter_action(action.action_type).associated_card_type
+    ]
+    for action in ACTIONS
+    if action.can_be_countered
+}
+
+
+class BeliefTracker:
+    """Beliefs about every player's hand, from the point of view of `viewer` (a seat) or of an
+    observer who sees no hand at all"""
+
+    def __init__(
+        self,
+        number_of_players: int,
+        viewer: Optional[int] = None,
+        bluff_likelihood: float = BLUFF_LIKELIHOOD,
+    ):
+        self.number_of_players = number_of_players
+        self.viewer = viewer
+        self.bluff_likelihood = bluff_likelihood
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything, for a new game"""
+        self._hand_sizes = np.full(self.number_of_players, 2)
+        self._likelihoods = np.ones((self.number_of_players, NUMBER_OF_HANDS))
+        self._discarded = np.zeros(NUMBER_OF_CARD_TYPES, dtype=np.intp)
+        self._viewer_hand = np.zeros(NUMBER_OF_CARD_TYPES, dtype=np.intp)
+        # The card of the claim a caught bluff is about, and the cards revealed until they're
+        # swapped
+        self._claimed_card = NO_CARD
+        self._revealed = [NO_CARD] * self.number_of_players
+        self._position = 0
+        self._stale = False
+        self._update_priors()
+
+    def invalidate(self) -> None:
+        """Forget everything on the next sync, for a log that was rolled back. Cheaper than
+        `reset` when the log is rolled back again and again before the beliefs are read"""
+        self._stale = True
+
+    # Queries
+
+    def probability(self, seat: int, card: int) -> float:
+        """Probability that the player holds at least one card of a type (a card code)"""
+        if self._dirty:
+            self._refresh()
+        return float(self._marginals[seat, card])
+
+    def probabilities(self) -> np.ndarray:
+        """Probability that each player holds each card type, indexed [seat, card code]"""
+        if self._dirty:
+            self._refresh()
+        return self._marginals
+
+    def hand_probabilities(self, seat: int) -> np.ndarray:
+        """Probability of every hand in `HANDS` for the player"""
+        if self._dirty:
+            self._refresh()
+        return self._beliefs[seat]
+
+    def probabilities_of_hands(self) -> np.ndarray:
+        """Probability of every hand in `HANDS` for every player, indexed [seat, hand]"""
+        if self._dirty:
+            self._refresh()
+        return self._beliefs
+
+    # Updates
+
+    def set_viewer_hand(self, cards: Sequence[int]) -> None:
+        """The viewer's own hand, as card codes"""
+        hand = np.bincount(np.asarray(cards, dtype=np.intp), minlength=NUMBER_OF_CARD_TYPES)
+        self._hand_sizes[self.viewer] = len(cards)
+        if not np.array_equal(hand, self._viewer_hand):
+            self._viewer_hand = hand
+            self._update_priors()
+
+    def sync(self, log: EventLog, viewer_hand: Optional[Sequence[int]] = None) -> None:
+        """Apply the events appended to the log since the last sync, then set the viewer's
+        current hand if given. A log that was cleared, or rolled back (see `invalidate`), is
+        replayed from its oldest event"""
+        if self._stale or len(log) < self._position:
+            self.reset()
+
+        self.observe(log.events(self._position))
+        self._position = len(log)
+        if viewer_hand is not None:
+            self.set_viewer_hand(viewer_hand)
+
+    def observe(self, events: Iterable[Event]) -> None:  # noqa: C901
+        """Update the beliefs with events of the game, in order"""
+        for event in events:
+            event_type = event.event_type
+            seat = event.actor
+            if event_type == EventType.action:
+                self._claim(seat, _CLAIMED_CARD.get(event.arg, NO_CARD))
+            elif event_type == EventType.counter:
+                self._claim(seat, _COUNTER_CARD[event.arg])
+            elif event_type == EventType.reveal:
+                self._revealed[seat] = event.arg
+                self._condition(seat, HAS_CARD[:, event.arg])
+            elif event_type == EventType.bluff_caught:
+                if self._claimed_card != NO_CARD:
+                    self._condition(seat, 1.0 - HAS_CARD[:, self._claimed_card])
+            elif event_type == EventType.card_swapped:
+                self._swap(seat)
+            elif event_type == EventType.discard:
+                self._discard(seat, event.arg)
+            elif event_type == EventType.exchange:
+                self._likelihoods[seat] = 1.0
+            elif event_type == EventType.elimination:
+                self._hand_sizes[seat] = 0
+            else:
+                continue
+            self._dirty = True
+
+    def _claim(self, seat: int, card: int) -> None:
+        self._claimed_card = card
+        if card != NO_CARD:
+            self._likelihoods[seat] *= np.where(HAS_CARD[:, card] > 0, 1.0, self.bluff_likelihood)
+
+    def _condition(self, seat: int, likelihood: np.ndarray) -> None:
+        self._likelihoods[seat] *= likelihood
+
+    def _posterior(self, seat: int) -> np.ndarray:
+        return self._priors[self._hand_sizes[seat]] * self._likelihoods[seat]
+
+    def _transition(self, seat: int, posterior: np.ndarray, hand_size: int) -> None:
+        # Keep the posterior as prior times likelihood for the new hand size
+        self._hand_sizes[seat] = hand_size
+        prior = self._priors[hand_size]
+        self._likelihoods[seat] = np.divide(
+            posterior, prior, out=np.zeros_like(posterior), where=prior > 0
+        )
+
+    def _swap(self, seat: int) -> None:
+        """The revealed card goes back to the deck and a new card is drawn"""
+        card = self._revealed[seat]
+        self._revealed[seat] = NO_CARD
+        if card == NO_CARD or seat == self.viewer:
+            return
+
+        unseen = self._unseen()
+        draw = unseen / unseen.sum()
+        posterior = self._posterior(seat) @ _REMOVE_CARD[card]
+        self._transition(seat, posterior @ np.tensordot(draw, _ADD_CARD, axes=1), 2)
+
+    def _discard(self, seat: int, card: int) -> None:
+        self._discarded[card] += 1
+        if seat == self.viewer:
+            # Our own card was already out of the unseen cards
+            self._viewer_hand[card] = max(self._viewer_hand[card] - 1, 0)
+            self._hand_sizes[seat] -= 1
+            self._update_priors()
+            return
+
+        hand_size = self._hand_sizes[seat]
+        posterior = np.zeros(NUMBER_OF_HANDS)
+        if hand_size == 2:
+            posterior = (self._posterior(seat) * HAS_CARD[:, card]) @ _REMOVE_CARD[card]
+
+        self._update_priors()
+        self._transition(seat, posterior, hand_size - 1)
+
+    def _unseen(self) -> np.ndarray:
+        return np.maximum(DECK_COUNTS - self._discarded - self._viewer_hand, 0)
+
+    def _update_priors(self) -> None:
+        """Priors per hand size (0, 1 and 2 cards) for hands dealt from the unseen cards"""
+        ways = _COMBINATIONS[self._unseen()[None, :], HAND_COUNTS].prod(axis=1)
+        self._priors = np.where(HAND_SIZES[None, :] == np.arange(3)[:, None], ways, 0.0)
+        self._dirty = True
+
+    def _refresh(self) -> None:
+        beliefs = self._priors[self._hand_sizes] * self._likelihoods
+        totals = beliefs.sum(axis=1, keepdims=True)
+        # Contradicting evidence (a player acting against the odds) falls back to the prior
+        contradicted = (totals[:, 0] == 0) & (self._hand_sizes > 0)
+        beliefs[contradicted] = self._priors[self._hand_sizes[contradicted]]
+        totals[contradicted] = beliefs[contradicted].sum(axis=1, keepdims=True)
+        self._beliefs = np.divide(beliefs, totals, out=np.zeros_like(beliefs), where=totals > 0)
+
+        if self.viewer is not None and self._hand_sizes[self.viewer]:
+            hand = tuple(
+                card for card in range(NUMBER_OF_CARD_TYPES) for _ in range(self._viewer_hand[card])
+            )
+            self._beliefs[self.viewer] = 0.0
+            if hand in HAND_INDEX:
+                self._beliefs[self.viewer, HAND_INDEX[hand]] = 1.0
+
+        self._marginals = self._beliefs @ HAS_CARD
+        self._dirty = False
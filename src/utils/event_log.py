@@ -0,0 +1,161 @@
+"""Compact typed log of everything that happens in a game.
+
+Every event is packed into a single unsigned 32 bit integer: its type, the seat of the player
+performing it, the seat of the player it's aimed at and one small argument (an action code, a
+card code or a number of coins). Events are stored in a fixed size ring buffer, so appending is
+O(1) and the memory used by a game is bounded however long it runs.
+"""
+
+from array import array
+from enum import IntEnum
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+
+class EventType(IntEnum):
+    # arg: action code
+    action = 0
+    challenge = 1
+    # arg: card code
+    reveal = 2
+    challenge_lost = 3
+    card_swapped = 4
+    bluff_caught = 5
+    # arg: code of the action being countered
+    counter = 6
+    # arg: number of coins
+    coins_gained = 7
+    coup = 8
+    assassination = 9
+    # arg: number of coins
+    steal = 10
+    exchange = 11
+    # arg: card code
+    discard = 12
+    elimination = 13
+    round_concluded = 14
+
+
+NO_SEAT = 0xF
+
+_TYPE_BITS = 5
+_SEAT_BITS = 4
+_ACTOR_SHIFT = _TYPE_BITS
+_TARGET_SHIFT = _ACTOR_SHIFT + _SEAT_BITS
+_ARG_SHIFT = _TARGET_SHIFT + _SEAT_BITS
+_TYPE_MASK = (1 << _TYPE_BITS) - 1
+_SEAT_MASK = (1 << _SEAT_BITS) - 1
+MAX_ARG = (1 << (32 - _ARG_SHIFT)) - 1
+
+
+class Event(NamedTuple):
+    event_type: EventType
+    actor: int
+    target: int = NO_SEAT
+    arg: int = 0
+
+    @property
+    def has_target(self) -> bool:
+        return self.target != NO_SEAT
+
+
+def encode_event(event_type: EventType, actor: int, target: int = NO_SEAT, arg: int = 0) -> int:
+    return event_type | actor << _ACTOR_SHIFT | target << _TARGET_SHIFT | arg << _ARG_SHIFT
+
+
+def decode_event(code: int) -> Event:
+    return Event(
+        EventType(code & _TYPE_MASK),
+        code >> _ACTOR_SHIFT & _SEAT_MASK,
+        code >> _TARGET_SHIFT & _SEAT_MASK,
+        code >> _ARG_SHIFT,
+    )
+
+
+def decode_fields(code: int) -> Tuple[int, int, int, int]:
+    """The event type, actor, target and argument of an encoded event as plain ints, cheaper
+    than `decode_event` where the types don't matter"""
+    return (
+        code & _TYPE_MASK,
+        code >> _ACTOR_SHIFT & _SEAT_MASK,
+        code >> _TARGET_SHIFT & _SEAT_MASK,
+        code >> _ARG_SHIFT,
+    )
+
+
+class EventLog:
+    """Append-only ring buffer of encoded events.
+
+    Events are numbered from 0 in the order they were appended. Once the buffer is full the
+    oldest events are overwritten, `first_sequence` is the number of the oldest event still held.
+    """
+
+    __slots__ = ("_buffer", "_capacity", "_length")
+
+    def __init__(self, capacity: int = 4096):
+        self._capacity = capacity
+        self._buffer = array("I", bytes(4 * capacity))
+        self._length = 0
+
+    def clear(self) -> None:
+        self._length = 0
+
+    def copy(self) -> "EventLog":
+        log = EventLog(0)
+        log._capacity = self._capacity
+        log._buffer = array("I", self._buffer)
+        log._length = self._length
+        return log
+
+    def truncate(self, length: int) -> None:
+        """Drop the events appended after the first `length` ones"""
+        self._length = min(length, self._length)
+
+    def load(self, codes: array, length: int) -> None:
+        """Replace the events with the encoded events of another log (as from `to_array`), the
+        last of which is event `length - 1`"""
+        if len(codes) > min(length, self._capacity):
+            raise ValueError(f"Expected at most {min(length, self._capacity)} events")
+
+        # The events held are contiguous up to the end of the buffer and wrap around from there
+        start = (length - len(codes)) % self._capacity
+        split = len(codes) - max(0, start + len(codes) - self._capacity)
+        stop = start + split
+        self._buffer[start:stop] = codes[:split]
+        self._buffer[: len(codes) - split] = codes[split:]
+        self._length = length
+
+    def append(self, event_type: EventType, actor: int, target: int = NO_SEAT, arg: int = 0) -> int:
+        """Append an event and return its sequence number"""
+        sequence = self._length
+        # Same as encode_event, inlined as this is called for every event
+        self._buffer[sequence % self._capacity] = (
+            event_type | actor << _ACTOR_SHIFT | target << _TARGET_SHIFT | arg << _ARG_SHIFT
+        )
+        self._length = sequence + 1
+        return sequence
+
+    def __len__(self) -> int:
+        """The number of events appended so far, including the ones overwritten"""
+        return self._length
+
+    @property
+    def first_sequence(self) -> int:
+        return max(0, self._length - self._capacity)
+
+    def to_array(self) -> array:
+        """The encoded events still held, oldest first"""
+        if self._length <= self._capacity:
+            return self._buffer[: self._length]
+
+        start = self._length % self._capacity
+        return self._buffer[start:] + self._buffer[:start]
+
+    def codes(self, start: int = 0, stop: Optional[int] = None) -> Iterator[int]:
+        """The encoded events in [start, stop) that are still held"""
+        stop = self._length if stop is None else min(stop, self._length)
+        for sequence in range(max(start, self.first_sequence), stop):
+            yield self._buffer[sequence % self._capacity]
+
+    def events(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Event]:
+        """The decoded events in [start, stop) that are still held"""
+        return map(decode_event, self.codes(start, stop))
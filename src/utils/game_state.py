@@ -1,22 +1,31 @@
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Sequence, Union
 
 from rich.panel import Panel
 from rich.table import Column, Table
 from rich.text import Text
 
-from src.models.card import Card
+from src.models.card import CARD_TYPES
+from src.models.deck import Deck
 from src.models.players.human import BasePlayer
 
 
 def generate_state_panel(
-    deck: List[Card], treasury_coins: int, current_player: BasePlayer, rich: bool = True
-) -> Union[Panel, Dict[str, Union[int, str]]]:
-    """Generate a panel or dictionary showing game information"""
+    deck: Deck,
+    treasury_coins: int,
+    current_player: BasePlayer,
+    rich: bool = True,
+    revealed_cards: Sequence[int] = (),
+) -> Union[Panel, Dict[str, Union[int, str, Dict[str, int]]]]:
+    """Generate a panel or dictionary showing game information. `revealed_cards` are the counts
+    of the cards lost so far, indexed by card code"""
+    revealed = {CARD_TYPES[code].value: count for code, count in enumerate(revealed_cards) if count}
     if rich:
+        revealed_text = ", ".join(f"{card} x{count}" for card, count in revealed.items())
         return Panel(
             f"""
 :game_die: Deck: {len(deck)} cards
 :moneybag: Treasury: {treasury_coins} coins
+:skull: Revealed: {revealed_text or "none"}
 :person_tipping_hand: Current Player: [bold magenta]{current_player}
 """,
             width=50,
@@ -25,10 +34,33 @@ def generate_state_panel(
         return {
             "deck_size": len(deck),
             "treasury_coins": treasury_coins,
+            "revealed_cards": revealed,
             "current_player": str(current_player),
         }
 
 
+def generate_player_info(
+    player: BasePlayer, is_currently_going: bool, cards_visible: bool
+) -> Dict[str, Union[str, int, bool, List[str]]]:
+    """Generate the dictionary of a single player, as seen by another player"""
+    player_info = {
+        "name": str(player),
+        "is_currently_going": is_currently_going,
+        "coins": player.coins,
+        "eliminated": not player.is_active,
+    }
+
+    if player.is_active:
+        if cards_visible:
+            player_info["cards"] = [str(card) for card in player.cards]
+        else:
+            player_info["cards"] = ["<Secret...>"] * len(player.cards)
+    else:
+        player_info["cards"] = ["<Eliminated>"]
+
+    return player_info
+
+
 def generate_players_table(
     players: List[BasePlayer],
     current_player_index: int,
@@ -71,22 +103,9 @@ def generate_players_table(
                 is_currently_going = player == challenged_player
             else:
                 is_currently_going = ind == current_player_index
-            player_info = {
-                "name": str(player),
-                "is_currently_going": is_currently_going,
-                "coins": player.coins,
-                "eliminated": not player.is_active,
-            }
-
-            if player.is_active:
-                # remove the ind != current_player_index check if back to using humans
-                if player.is_ai and ind != current_player_index:
-                    player_info["cards"] = ["<Secret...>"] * len(player.cards)
-                else:
-                    player_info["cards"] = [str(card) for card in player.cards]
-            else:
-                player_info["cards"] = ["<Eliminated>"]
-
+            # remove the ind != current_player_index check if back to using humans
+            cards_visible = not player.is_ai or ind == current_player_index
+            player_info = generate_player_info(player, is_currently_going, cards_visible)
             players_info.append(player_info)
 
         return players_info
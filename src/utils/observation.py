@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.models.deck import Deck
+from src.models.players.base import BasePlayer
+from src.utils.game_state import generate_player_info, generate_state_panel
+
+
+class ObservationCache:
+    """The game state as seen by each player, rendered to the strings handed to the players.
+
+    The same observation is asked for many times a turn (once per player that gets to challenge
+    or counter, and again while resolving the action) without anything changing in between.
+    Observations are cached per game state version and viewer. The handler invalidates a player
+    whenever their coins, cards or active flag change, which bumps the version and drops only
+    that player's rendered rows, so the other rows are reused as they are.
+    """
+
+    __slots__ = ("_players", "_indices", "_version", "_rows", "_observations")
+
+    def __init__(self, players: List[BasePlayer]):
+        self._players = players
+        self._indices: Dict[int, int] = {}
+        self._version = 0
+        # Rendered rows per player, keyed by (is currently going, cards visible)
+        self._rows: List[Dict[Tuple[bool, bool], str]] = []
+        self._observations: Dict[tuple, Dict[str, str]] = {}
+        self.reset()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def reset(self) -> None:
+        """Drop everything, e.g. when a new game is set up"""
+        self._version += 1
+        self._indices = {id(player): index for index, player in enumerate(self._players)}
+        self._rows = [{} for _ in self._players]
+        self._observations.clear()
+
+    def invalidate(self, *players: BasePlayer) -> None:
+        """Mark the players' coins, cards or active flag as changed"""
+        self._version += 1
+        for player in players:
+            self._rows[self._indices[id(player)]].clear()
+        self._observations.clear()
+
+    def _render_row(self, index: int, is_currently_going: bool, cards_visible: bool) -> str:
+        rows = self._rows[index]
+        key = (is_currently_going, cards_visible)
+        if (row := rows.get(key)) is None:
+            row = rows[key] = str(
+                generate_player_info(self._players[index], is_currently_going, cards_visible)
+            )
+
+        return row
+
+    def observe(
+        self,
+        viewer: BasePlayer,
+        deck: Deck,
+        treasury_coins: int,
+        current_player: BasePlayer,
+        challenged_player: Optional[BasePlayer] = None,
+        revealed_cards: Sequence[int] = (),
+    ) -> Dict[str, str]:
+        """The game state as seen by the viewer, the same as rendering `generate_players_table`
+        and `generate_state_panel` with `rich=False`. The returned dict is shared, don't modify
+        it"""
+        viewer_index = self._indices[id(viewer)]
+        key = (
+            viewer_index,
+            None if challenged_player is None else self._indices[id(challenged_player)],
+            len(deck),
+            treasury_coins,
+            self._indices[id(current_player)],
+            tuple(revealed_cards),
+        )
+        if (observation := self._observations.get(key)) is not None:
+            return observation
+
+        rows = []
+        for index, player in enumerate(self._players):
+            # if there's a challenged player, don't leak information incorrectly
+            if challenged_player:
+                is_currently_going = player is challenged_player
+            else:
+                is_currently_going = index == viewer_index
+            cards_visible = not player.is_ai or index == viewer_index
+            rows.append(self._render_row(index, is_currently_going, cards_visible))
+
+        observation = self._observations[key] = {
+            # Same as the str() of the list of player dicts
+            "players": f"[{', '.join(rows)}]",
+            "game_state": str(
+                generate_state_panel(
+                    deck, treasury_coins, current_player, rich=False, revealed_cards=revealed_cards
+                )
+            ),
+        }
+        return observation
@@ -1,4 +1,7 @@
 import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Union
 
 from rich.console import Console, JustifyMethod
 from rich.highlighter import Highlighter
@@ -13,6 +16,21 @@ from src.models.players.base import BasePlayer
 
 console = Console()
 
+# When quiet, none of the print helpers below write (or render) anything. Used by headless game
+# handlers, where the game is played bot-vs-bot and only the final summary matters. The flag is
+# per context (thread or asyncio task), so a headless game never silences anyone else
+_quiet: ContextVar[bool] = ContextVar("quiet", default=False)
+
+
+@contextmanager
+def quiet() -> Iterator[None]:
+    """Print nothing in the current context until the block ends"""
+    token = _quiet.set(True)
+    try:
+        yield
+    finally:
+        _quiet.reset(token)
+
 
 class RainbowHighlighter(Highlighter):
     def highlight(self, text):
@@ -21,10 +39,16 @@ class RainbowHighlighter(Highlighter):
 
 
 def print_blank():
+    if _quiet.get():
+        return
+
     console.print()
 
 
 def print_text(content: str, style: str = "", rainbow: bool = False, with_markup: bool = False):
+    if _quiet.get():
+        return
+
     print_blank()
 
     text = Text(content)
@@ -42,6 +66,9 @@ def print_text(content: str, style: str = "", rainbow: bool = False, with_markup
 
 
 def print_texts(*parts):
+    if _quiet.get():
+        return
+
     print_blank()
 
     text = Text.assemble(*parts)
@@ -50,6 +77,9 @@ def print_texts(*parts):
 
 
 def print_tree(root: str, content: list[str]):
+    if _quiet.get():
+        return
+
     print_blank()
 
     tree = Tree(root)
@@ -59,12 +89,18 @@ def print_tree(root: str, content: list[str]):
 
 
 def print_table(table: Table, justify: JustifyMethod = "center"):
+    if _quiet.get():
+        return
+
     print_blank()
 
     console.print(table, justify=justify)
 
 
 def print_panel(panel: Panel, justify: JustifyMethod = "center"):
+    if _quiet.get():
+        return
+
     print_blank()
 
     console.print(panel, justify=justify)
@@ -83,7 +119,7 @@ def print_confirm(content: str) -> bool:
 
 
 def build_action_report_string(
-    player: BasePlayer, action: Action, target_player: BasePlayer
+    player: Union[BasePlayer, str], action: Action, target_player: Union[BasePlayer, str, None]
 ) -> str:
     action_report_string = f"{player} chose to "
     match action.action_type:
@@ -92,13 +128,13 @@ def build_action_report_string(
         case ActionType.foreignaid:
             action_report_string += "take foreign aid."
         case ActionType.coup:
-            action_report_string += f"perform a coup against {target_player.name}."
+            action_report_string += f"perform a coup against {target_player}."
         case ActionType.tax:
             action_report_string += "take tax."
         case ActionType.assassinate:
-            action_report_string += f"assassinate {target_player.name}."
+            action_report_string += f"assassinate {target_player}."
         case ActionType.steal:
-            action_report_string += f"steal coin from {target_player.name}"
+            action_report_string += f"steal coin from {target_player}"
         case ActionType.exchange:
             action_report_string += "perform an exchange."
 
@@ -106,7 +142,9 @@ def build_action_report_string(
 
 
 def build_counter_report_string(
-    target_player: BasePlayer, counter: CounterAction, countering_player: BasePlayer
+    target_player: Union[BasePlayer, str],
+    counter: CounterAction,
+    countering_player: Union[BasePlayer, str],
 ) -> str:
     counter_report_string = f"{countering_player} chose to "
     match counter.counter_type:
@@ -0,0 +1,196 @@
+"""Compact binary game records.
+
+A replay file is a fixed header followed by one record per game. A game record is a fixed game
+header followed by the game's events, packed the same way as in the `EventLog` (one unsigned 32
+bit integer each). Everything is little-endian and every record is 4 byte aligned, so the events
+of a game can be read straight out of a memory-mapped file as an array of integers.
+
+    file header:  magic, version, number of players, run seed, player names (32 bytes each)
+    game header:  game number, number of events, number of turns, winner seat, flags
+    events:       number of events * uint32
+
+Run `python -m src.utils.replay <file>` for a summary of a replay file.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from types import TracebackType
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+from src.utils.event_log import Event, EventLog, decode_event
+
+MAGIC = b"COUPRPLY"
+VERSION = 1
+PLAYER_NAME_SIZE = 32
+
+FILE_HEADER = struct.Struct("<8sHBxq")
+# The run seed is stored as a signed 64 bit integer
+SEED_RANGE = range(-(2**63), 2**63)
+GAME_HEADER = struct.Struct("<IIHBB")
+
+# The oldest events of the game were overwritten in the event log before it was written
+FLAG_TRUNCATED = 1
+
+_EVENT_SIZE = 4
+_NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+class GameRecord(NamedTuple):
+    game_number: int
+    turns: int
+    winner: int
+    flags: int
+    # The encoded events, see `decode_event`. A view into the replay file, nothing is copied
+    events: Sequence[int]
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.flags & FLAG_TRUNCATED)
+
+    def decoded_events(self) -> Iterator[Event]:
+        return map(decode_event, self.events)
+
+
+class ReplayWriter:
+    """Append games to a replay file"""
+
+    def __init__(self, path: str, player_names: Sequence[str], seed: int = 0):
+        if seed not in SEED_RANGE:
+            raise ValueError(f"The seed {seed} doesn't fit in a signed 64 bit integer")
+
+        self._file: BinaryIO = open(path, "wb")
+        self._games_written = 0
+
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, len(player_names), seed))
+        for name in player_names:
+            # Cut on a character boundary, a split UTF-8 sequence wouldn't decode
+            encoded_name = name.encode()[:PLAYER_NAME_SIZE].decode(errors="ignore").encode()
+            self._file.write(encoded_name.ljust(PLAYER_NAME_SIZE, b"\0"))
+
+    @property
+    def games_written(self) -> int:
+        return self._games_written
+
+    def write_game(self, log: EventLog, turns: int, winner: int) -> None:
+        """Write every event still held by the log as the next game"""
+        events = log.to_array()
+        if not _NATIVE_LITTLE_ENDIAN:
+            events.byteswap()
+
+        flags = FLAG_TRUNCATED if log.first_sequence else 0
+        self._file.write(
+            GAME_HEADER.pack(self._games_written, len(events), min(turns, 0xFFFF), winner, flags)
+        )
+        events.tofile(self._file)
+        self._games_written += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ReplayWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+class ReplayReader:
+    """Memory-maps a replay file and yields its games lazily.
+
+    Records are views into the mapped file, so scanning a file doesn't load it into memory or
+    build Python objects for the events. Drop the records before closing the reader.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, number_of_players, self.seed = FILE_HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported replay file version {version}")
+
+        offset = FILE_HEADER.size
+        self.player_names: List[str] = []
+        for _ in range(number_of_players):
+            end = offset + PLAYER_NAME_SIZE
+            self.player_names.append(self._mmap[offset:end].rstrip(b"\0").decode(errors="ignore"))
+            offset = end
+
+        self._games_offset = offset
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        offset = self._games_offset
+        size = len(self._mmap)
+        while offset < size:
+            game_number, number_of_events, turns, winner, flags = GAME_HEADER.unpack_from(
+                self._mmap, offset
+            )
+            offset += GAME_HEADER.size
+            end = offset + number_of_events * _EVENT_SIZE
+
+            events = self._view[offset:end]
+            if _NATIVE_LITTLE_ENDIAN:
+                events = events.cast("I")
+            else:
+                events = array("I", events)
+                events.byteswap()
+
+            yield GameRecord(game_number, turns, winner, flags, events)
+            offset = end
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "ReplayReader":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def summarize(reader: ReplayReader) -> Tuple[int, int, int, List[int]]:
+    """Number of games, turns, events and wins per seat of a replay file"""
+    games = 0
+    total_turns = 0
+    total_events = 0
+    wins_per_seat = [0] * len(reader.player_names)
+    for record in reader:
+        games += 1
+        total_turns += record.turns
+        total_events += len(record.events)
+        wins_per_seat[record.winner] += 1
+
+    return games, total_turns, total_events, wins_per_seat
+
+
+def main():
+    with ReplayReader(sys.argv[1]) as reader:
+        games, total_turns, total_events, wins_per_seat = summarize(reader)
+
+    print(f"{games:,} games, seed {reader.seed}")
+    if games:
+        print(f"turns per game:  {total_turns / games:.1f}")
+        print(f"events per game: {total_events / games:.1f}")
+        for name, wins in zip(reader.player_names, wins_per_seat):
+            print(f"{name:<32} {wins:>10,} wins ({wins / games:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,70 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.models.action import ACTION_CODES, Action, get_counter_action
+from src.models.card import CARD_TYPES
+from src.models.legal_actions import ACTIONS
+from src.utils.event_log import NO_SEAT, Event, EventLog, EventType
+from src.utils.print import build_action_report_string, build_counter_report_string
+
+_ACTIONS_BY_CODE: Dict[int, Action] = {
+    ACTION_CODES[action.action_type]: action for action in ACTIONS
+}
+
+
 class RoundHistory:
-    def __init__(self):
-        self.current_round = ["Start"]
-        self.previous_round = []
+    """History of the game, as typed events.
+
+    Events are kept in a bounded `EventLog` and only rendered to text when the history is read.
+    The players see the current and the previous round, the full log is available from
+    `events()`.
+    """
+
+    def __init__(self, player_names: Sequence[str] = (), capacity: int = 4096):
+        self.log = EventLog(capacity)
+        self._player_names = tuple(player_names)
+        self._current_round_start = 0
+        self._previous_round_start: Optional[int] = None
+
+    @property
+    def player_names(self) -> Tuple[str, ...]:
+        """The names of the players, in seat order"""
+        return self._player_names
+
+    @player_names.setter
+    def player_names(self, player_names: Sequence[str]) -> None:
+        self._player_names = tuple(player_names)
+
+    def record(
+        self, event_type: EventType, actor: int, target: int = NO_SEAT, arg: int = 0
+    ) -> None:
+        """Record a new event in the current round history."""
+        self.log.append(event_type, actor, target, arg)
+
+    @property
+    def current_round(self) -> List[str]:
+        return ["Start"] + self._render(self._current_round_start, None)
 
-    def append(self, entry: str) -> None:
-        """Append a new entry to the current round history."""
-        self.current_round.append(entry)
+    @property
+    def previous_round(self) -> List[str]:
+        if self._previous_round_start is None:
+            return []
+        return ["Start"] + self._render(self._previous_round_start, self._current_round_start)
 
     def conclude_round(self) -> str:
         """Mark the current round as concluded and prepare for the next round."""
-        if len(self.current_round) > 1:  # More than just "Start"
-            self.previous_round = self.current_round
-            self.current_round = ["Start"]
+        if len(self.log) > self._current_round_start:  # More than just "Start"
+            self.log.append(EventType.round_concluded, NO_SEAT)
+            self._previous_round_start = self._current_round_start
+            self._current_round_start = len(self.log)
             return "Round concluded. Starting new round."
         return "Round concluded with no additional entries."
 
     def __str__(self) -> str:
         """Return a string representation of the round history."""
+        previous_round = self.previous_round
         previous = (
-            "Previous Round:\n" + "\n".join(self.previous_round)
-            if self.previous_round
+            "Previous Round:\n" + "\n".join(previous_round)
+            if previous_round
             else "No previous round"
         )
         current = "Current Round:\n" + "\n".join(self.current_round)
@@ -29,6 +74,82 @@ class RoundHistory:
         """Return the full history including both previous and current rounds."""
         return self.previous_round + self.current_round
 
+    def events(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Event]:
+        """All the events of the game still held by the log, in order"""
+        return self.log.events(start, stop)
+
+    def turn_events(self) -> List[Event]:
+        """The events of the turn being played, starting with its action"""
+        events = list(self.log.events(self._current_round_start))
+        for index in range(len(events) - 1, -1, -1):
+            if events[index].event_type == EventType.action:
+                return events[index:]
+
+        return []
+
+    def snapshot(self) -> Tuple[int, int, Optional[int]]:
+        return len(self.log), self._current_round_start, self._previous_round_start
+
+    def restore(self, snapshot: Tuple[int, int, Optional[int]]) -> None:
+        """Roll back to a snapshot. Only events still held by the log can be rolled back to"""
+        length, self._current_round_start, self._previous_round_start = snapshot
+        self.log.truncate(length)
+
+    def copy(self) -> "RoundHistory":
+        """A copy the events recorded from now on don't change"""
+        history = RoundHistory(self._player_names, capacity=0)
+        history.log = self.log.copy()
+        history._current_round_start = self._current_round_start
+        history._previous_round_start = self._previous_round_start
+        return history
+
     def reset(self):
         """Reset the round history."""
-        self.__init__()
+        self.log.clear()
+        self._current_round_start = 0
+        self._previous_round_start = None
+
+    def _render(self, start: int, stop: Optional[int]) -> List[str]:
+        return [
+            self.render_event(event)
+            for event in self.log.events(start, stop)
+            if event.event_type != EventType.round_concluded
+        ]
+
+    def render_event(self, event: Event) -> str:
+        """Render an event to the line shown to the players"""
+        actor = self._player_names[event.actor] if event.actor != NO_SEAT else None
+        target = self._player_names[event.target] if event.has_target else None
+
+        match event.event_type:
+            case EventType.action:
+                return build_action_report_string(actor, _ACTIONS_BY_CODE[event.arg], target)
+            case EventType.challenge:
+                return f"{actor} is challenging {target}!"
+            case EventType.reveal:
+                return f"{actor} reveals their {CARD_TYPES[event.arg].value} card!"
+            case EventType.challenge_lost:
+                return f"{actor} loses the challenge"
+            case EventType.card_swapped:
+                return f"{actor} gets a new card"
+            case EventType.bluff_caught:
+                return f"{actor} bluffed! They do not have the required card!"
+            case EventType.counter:
+                counter = get_counter_action(_ACTIONS_BY_CODE[event.arg].action_type)
+                return build_counter_report_string(target, counter, actor)
+            case EventType.coins_gained:
+                return f"{actor}'s coins are increased by {event.arg}"
+            case EventType.coup:
+                return f"{actor} pays 7 coins and performs the coup against {target}"
+            case EventType.assassination:
+                return f"{actor} assassinates {target}"
+            case EventType.steal:
+                return f"{actor} steals {event.arg} coins from {target}"
+            case EventType.exchange:
+                return f"{actor} exchanges 2 cards"
+            case EventType.discard:
+                return f"{actor} discards their {CARD_TYPES[event.arg].value} card"
+            case EventType.elimination:
+                return f"{actor} was defeated!!!"
+            case EventType.round_concluded:
+                return "Round concluded"